@@ -0,0 +1,226 @@
+"""
+Пакетный подбор автомобилей по множеству профилей критериев (рассылки, офлайн-расчёты).
+Один снимок каталога загружается один раз и разделяется между процессами
+ProcessPoolExecutor: при запуске через fork дочерние процессы получают каталог
+и его индексы копированием при записи, иначе — копию при инициализации процесса
+(каталог из снимка snapshot.py каждый процесс отображает в память сам).
+Профили обрабатываются пачками, результаты отдаются потоково в исходном порядке.
+Текстовые запросы профилей разбираются по полнотекстовому индексу БД в основном процессе,
+исполнителям передаются уже найденные id.
+
+Запуск из командной строки:
+    python batch.py profiles.jsonl [--output results.jsonl] [--workers 4] [--limit 20]
+"""
+import argparse
+import copy
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from decision_tree import CarDecisionTree, parse_order_by
+from importer import chunked, read_jsonl
+from snapshot import open_catalog
+
+# Количество профилей в одной задаче процесса
+DEFAULT_CHUNK_SIZE = 500
+# Сколько пачек на процесс держать в работе одновременно
+PENDING_CHUNKS_PER_WORKER = 2
+
+# Каталог и дерево решений процесса-исполнителя
+_catalog = None
+_tree = None
+
+
+class BatchReport:
+    """Итоги пакетного подбора: число профилей и скорость обработки."""
+
+    def __init__(self):
+        self.profiles = 0
+        self.workers = 0
+        self.seconds = 0.0
+
+    @property
+    def profiles_per_second(self):
+        return self.profiles / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        rate = f"{self.profiles_per_second:,.0f}".replace(",", " ")
+        return (f"Обработано {self.profiles} профилей за {self.seconds:.2f} с "
+                f"({rate} профилей/с, процессов: {self.workers})")
+
+
+def _init_worker(catalog):
+    """
+    Инициализация процесса без fork: каталог передаётся копией,
+    а каталог из снимка — путём к файлу, который процесс отображает сам.
+    """
+    global _catalog, _tree
+    _catalog = open_catalog(catalog) if isinstance(catalog, str) else catalog
+    _tree = CarDecisionTree()
+
+
+def _recommend_chunk(chunk, field, descending, limit):
+    """
+    Подобрать автомобили для пачки профилей в процессе-исполнителе.
+
+    Returns:
+        список пар (номер профиля, номера строк каталога в порядке сортировки)
+    """
+    results = []
+    for number, criteria in chunk:
+        rows = _tree.evaluate_rows(_catalog, criteria)
+        if rows:
+            rows = _catalog.order_rows(rows, field, descending, limit=limit)
+        results.append((number, list(rows)))
+    return results
+
+
+def _resolve_profiles(expert_system, profiles):
+    """
+    Профили с разобранным текстовым запросом (ExpertSystem.resolve_text): процессы-исполнители
+    не обращаются к БД и получают TextMatch с готовыми id.
+
+    Raises:
+        ValueError: профиль не словарь или текстовый запрос не строка
+    """
+    for number, criteria in enumerate(profiles):
+        if not isinstance(criteria, dict):
+            reason = getattr(criteria, "reason", "профиль должен быть объектом")
+            raise ValueError(f"профиль {number}: {reason}")
+        text = criteria.get("text")
+        if text is not None and not isinstance(text, str):
+            raise ValueError(f"профиль {number}: текстовый запрос должен быть строкой")
+        criteria = expert_system.resolve_text(criteria)
+        if criteria.get("text") is not None:
+            criteria["text"] = criteria["text"].detached()
+        yield number, criteria
+
+
+def _detached(catalog):
+    """Копия каталога для передачи в другой процесс (без загрузчика описаний и индексов)."""
+    detached = copy.copy(catalog)
+    detached.description_loader = None
+    detached._index = None
+    detached._rows_by_id = None
+    return detached
+
+
+def recommend_batch(expert_system, profiles, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                    limit=None, order_by="price", report=None, progress=None):
+    """
+    Подобрать автомобили для каждого профиля критериев.
+    Все профили считаются по одному снимку каталога (режим "catalog" независимо
+    от режима ExpertSystem); снимок не должен меняться до конца обработки.
+
+    Args:
+        expert_system: ExpertSystem, каталог которого используется
+        profiles: итерируемое словарей критериев (читается потоково)
+        workers: число процессов (None — по числу ядер, 1 — в текущем процессе)
+        chunk_size: количество профилей в одной задаче
+        limit: сколько автомобилей вернуть на профиль (None — все)
+        order_by: порядок сортировки, как в ExpertSystem.recommend
+        report: BatchReport для учёта количества и скорости
+        progress: функция (profiles, profiles_per_second) -> None, вызывается после каждой пачки
+
+    Yields:
+        пачки результатов в порядке профилей: списки пар (номер профиля, список CarRecord)
+    """
+    global _catalog, _tree
+    field, descending = parse_order_by(order_by)
+    report = report if report is not None else BatchReport()
+    catalog = expert_system.get_catalog()
+    catalog.index  # индексы строятся до запуска процессов и разделяются ими
+    workers = workers or os.cpu_count() or 1
+    report.workers = workers
+    started = time.perf_counter()
+
+    def finish(results):
+        report.profiles += len(results)
+        report.seconds = time.perf_counter() - started
+        if progress:
+            progress(report.profiles, report.profiles_per_second)
+        return [(number, catalog.to_records(rows)) for number, rows in results]
+
+    chunks = chunked(_resolve_profiles(expert_system, profiles), chunk_size)
+    if workers == 1:
+        tree = CarDecisionTree()
+        for chunk in chunks:
+            results = []
+            for number, criteria in chunk:
+                rows = tree.evaluate_rows(catalog, criteria)
+                if rows:
+                    rows = catalog.order_rows(rows, field, descending, limit=limit)
+                results.append((number, rows))
+            yield finish(results)
+        return
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        # Дочерние процессы наследуют каталог и индексы без копирования
+        _catalog, _tree = catalog, CarDecisionTree()
+        executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+    else:
+        shared = catalog.snapshot.path if catalog.read_only else _detached(catalog)
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shared,))
+    try:
+        with executor:
+            # Ограниченное окно задач: профили читаются по мере обработки
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_recommend_chunk, chunk, field, descending,
+                                               limit))
+                if len(pending) >= workers * PENDING_CHUNKS_PER_WORKER:
+                    yield finish(pending.popleft().result())
+            while pending:
+                yield finish(pending.popleft().result())
+    finally:
+        _catalog = _tree = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный подбор автомобилей по профилям")
+    parser.add_argument("path", help="файл JSONL с профилями критериев (один объект на строку)")
+    parser.add_argument("--output", help="файл JSONL для результатов (по умолчанию stdout)")
+    parser.add_argument("--db", help="путь к базе данных (по умолчанию cars.db приложения)")
+    parser.add_argument("--workers", type=int, help="число процессов (по умолчанию — по ядрам)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--limit", type=int, help="автомобилей на профиль")
+    parser.add_argument("--order-by", default="price")
+    args = parser.parse_args(argv)
+
+    from database import Database
+    from expert_system import ExpertSystem
+
+    def progress(done, rate):
+        rate = f"{rate:,.0f}".replace(",", " ")
+        print(f"\r{done} профилей, {rate} профилей/с", end="", file=sys.stderr)
+
+    report = BatchReport()
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        db_path = os.path.abspath(args.db) if args.db else "cars.db"
+        with Database(db_path) as db:
+            results = recommend_batch(ExpertSystem(db), read_jsonl(args.path), args.workers,
+                                      args.chunk_size, args.limit, args.order_by, report,
+                                      progress)
+            for chunk in results:
+                for number, cars in chunk:
+                    output.write(json.dumps({"profile": number, "cars": [car.id for car in cars]})
+                                 + "\n")
+    except (OSError, ValueError, ConnectionError, SQLAlchemyError) as e:
+        print(f"\nОшибка пакетного подбора: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"\n{report}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
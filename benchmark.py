@@ -0,0 +1,328 @@
+"""
+Замеры производительности подбора на синтетических каталогах.
+Генерирует каталоги заданного размера с неравномерным распределением марок и типов кузова
+во временный файл SQLite и замеряет слой БД, узлы дерева решений, ExpertSystem.recommend
+и заполнение таблицы результатов в окне (без экрана, QT_QPA_PLATFORM=offscreen),
+а также пропускную способность поиска в SQL при нескольких одновременных читателях.
+Результат — JSON; при указании --baseline медианы сравниваются с сохранёнными.
+
+Запуск:
+    python benchmark.py --sizes 10000,100000 --output bench.json
+    python benchmark.py --baseline bench.json --threshold 0.2
+    python benchmark.py --sizes 100000 --readers 1,4 --no-gui
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from database import Database
+from decision_tree import CarDecisionTree
+from expert_system import ExpertSystem
+from importer import import_cars
+from similarity import SimilarityIndex
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+DEFAULT_REPEAT = 5
+DEFAULT_SEED = 42
+# Число потоков-читателей для замера одновременных запросов к БД
+DEFAULT_READERS = (1, 4)
+# Сколько ждать открытия каталога в окне приложения (с)
+GUI_STARTUP_TIMEOUT = 120
+
+BRANDS = [
+    "Lada", "Kia", "Hyundai", "Toyota", "Volkswagen", "Skoda", "Renault", "Haval",
+    "Chery", "Geely", "Nissan", "Mazda", "BMW", "Mercedes-Benz", "Audi", "Ford",
+    "Honda", "Mitsubishi", "Subaru", "Volvo", "Lexus", "Porsche", "Jaguar", "Ferrari",
+]
+BODY_TYPES = ["Седан", "Внедорожник", "Хэтчбек", "Универсал", "Купе", "Минивэн", "Пикап"]
+BODY_TYPE_WEIGHTS = [40, 30, 15, 6, 4, 3, 2]
+
+# Запросы, которые замеряются на каждом каталоге
+QUERIES = {
+    "any": {},
+    "body_type": {"body_type": "Седан"},
+    "price_band": {"min_price": 2_000_000, "max_price": 3_000_000},
+    "rare_brand": {"brand": "Ferrari"},
+    "combined": {"body_type": "Внедорожник", "min_price": 3_000_000, "max_price": 5_000_000,
+                 "brand": "Toyota", "min_power": 150, "max_power": 300},
+}
+# Текстовые запросы (FTS5): по началу слова, с фильтром и с опечаткой
+TEXT_QUERIES = {
+    "prefix": {"text": "toyo"},
+    "prefix_filtered": {"text": "toyo", "body_type": "Купе", "max_price": 3_000_000},
+    "fuzzy": {"text": "Toyta"},
+}
+
+
+def generate_cars(count, seed=DEFAULT_SEED):
+    """
+    Синтетические строки каталога: марки распределены по закону Ципфа,
+    цена зависит от «класса» марки, мощность — от цены.
+    """
+    rng = random.Random(seed)
+    brand_weights = [1 / (rank + 1) for rank in range(len(BRANDS))]
+    brands = rng.choices(BRANDS, brand_weights, k=count)
+    body_types = rng.choices(BODY_TYPES, BODY_TYPE_WEIGHTS, k=count)
+    for i in range(count):
+        tier = 1 + BRANDS.index(brands[i]) / 6
+        price = int(rng.lognormvariate(14.2 + tier * 0.3, 0.45)) // 10_000 * 10_000
+        power = max(60, int(price ** 0.5 / 12 * rng.uniform(0.8, 1.2)))
+        yield {
+            "brand": brands[i],
+            "model": f"Модель {i}",
+            "body_type": body_types[i],
+            "price": price,
+            "power": power,
+            "description": f"Синтетический автомобиль {i}",
+        }
+
+
+def measure(func, repeat):
+    """Время выполнения func (секунды): минимум и медиана по repeat запускам."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return {"min": min(timings), "median": statistics.median(timings)}
+
+
+def bench_database(db, tree, repeat):
+    results = {"get_all_cars": measure(db.get_all_cars, repeat)}
+    for name, criteria in QUERIES.items():
+        results[f"get_cars[{name}]"] = measure(lambda: db.get_cars(criteria, tree), repeat)
+    return results
+
+
+def bench_readers(db, tree, readers, repeat):
+    """
+    Запросов в секунду к БД из нескольких потоков одновременно:
+    каждый поток берёт своё соединение из пула читателей (Database.session).
+    """
+    queries = list(QUERIES.values()) * repeat
+
+    def reader(part):
+        try:
+            for criteria in part:
+                db.get_cars(criteria, tree, limit=20)
+        finally:
+            db.session.remove()
+
+    # Соединение сессии текущего потока возвращается в пул, чтобы его хватило всем читателям
+    db.session.remove()
+    results = {}
+    for count in readers:
+        parts = [queries[i::count] for i in range(count)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            list(executor.map(reader, parts))
+        seconds = time.perf_counter() - started
+        results[f"readers[{count}].queries_per_second"] = len(queries) / seconds
+    return results
+
+
+def bench_tree(db, tree, repeat):
+    """Узлы дерева над списком записей, скомпилированный предикат и дерево над каталогом."""
+    results = {}
+    cars = db.get_all_cars()
+    catalog = db.load_catalog()
+    catalog.index  # индексы строятся один раз, как в приложении
+    adaptive = CarDecisionTree()
+    adaptive.analyze(cars)
+    for name, criteria in QUERIES.items():
+        node_timings = {}
+        for _ in range(repeat):
+            node, rows = tree.root, cars
+            while node:
+                started = time.perf_counter()
+                rows = node.filter_func(rows, criteria)
+                node_timings.setdefault(node.name, []).append(time.perf_counter() - started)
+                node = node.next_node
+        for node_name, timings in node_timings.items():
+            results[f"evaluate[{name}].{node_name}"] = {
+                "min": min(timings), "median": statistics.median(timings)
+            }
+        results[f"evaluate.compiled[{name}]"] = measure(
+            lambda: tree.evaluate(cars, criteria), repeat
+        )
+        results[f"evaluate.adaptive[{name}]"] = measure(
+            lambda: adaptive.evaluate(cars, criteria), repeat
+        )
+        results[f"evaluate_rows[{name}]"] = measure(
+            lambda: tree.evaluate_rows(catalog, criteria), repeat
+        )
+    return results
+
+
+def bench_expert_system(db, repeat):
+    """recommend() от критериев до записей, без кэша результатов."""
+    results = {}
+    for mode in ExpertSystem.MODES:
+        expert_system = ExpertSystem(db, mode=mode, cache_size=0)
+        expert_system.get_catalog()
+        for name, criteria in QUERIES.items():
+            results[f"recommend.{mode}[{name}]"] = measure(
+                lambda: expert_system.recommend(criteria), repeat
+            )
+            results[f"recommend.{mode}.top20[{name}]"] = measure(
+                lambda: expert_system.recommend(criteria, limit=20), repeat
+            )
+        # Без кэша каждый запрос заново разбирается и загружает id кандидатов из индекса
+        for name, criteria in TEXT_QUERIES.items():
+            results[f"recommend.{mode}.top20[text.{name}]"] = measure(
+                lambda: expert_system.recommend(criteria, limit=20), repeat
+            )
+    # Ранжирование по оценке (scoring.py) считается по каталогу в памяти в обоих режимах
+    for name, criteria in QUERIES.items():
+        results[f"rank.top20[{name}]"] = measure(
+            lambda: expert_system.rank(criteria, limit=20), repeat
+        )
+    # Похожие автомобили: построение сеточного индекса и запрос 10 ближайших соседей
+    catalog = expert_system.get_catalog()
+    results["similar.build_index"] = measure(lambda: SimilarityIndex(catalog), 1)
+    index = expert_system.similarity_index()
+    rows = range(0, len(catalog), max(len(catalog) // 100, 1))
+    results["similar.nearest10"] = measure(lambda: [index.nearest(row, 10) for row in rows],
+                                           repeat)
+    results["similar.nearest10"] = {key: value / len(rows)
+                                    for key, value in results["similar.nearest10"].items()}
+    return results
+
+
+def bench_gui(db_path, repeat):
+    """
+    Заполнение таблицы результатов в CarSelectionApp без экрана.
+    Если каталог не открылся (ошибка или GUI_STARTUP_TIMEOUT), замеры пропускаются,
+    а причина попадает в отчёт как gui.error.
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from main import CarSelectionApp
+
+    class HeadlessApp(CarSelectionApp):
+        """Окно без модального сообщения об ошибке открытия БД (оно блокирует прогон)."""
+
+        startup_error = None
+
+        def on_database_failed(self, error_msg):
+            self.startup_error = error_msg
+
+    app = QApplication.instance() or QApplication([])
+    window = HeadlessApp(db_path=db_path)
+    window.show()
+    window.startup_pool.waitForDone()
+    deadline = time.monotonic() + GUI_STARTUP_TIMEOUT
+    while window.expert_system is None and window.startup_error is None:
+        if time.monotonic() > deadline:
+            window.startup_error = f"каталог не открылся за {GUI_STARTUP_TIMEOUT} с"
+            break
+        app.processEvents()
+        time.sleep(0.01)
+    if window.startup_error is not None:
+        window.close()
+        return {"gui.error": window.startup_error}
+    results = {}
+    for name, criteria in QUERIES.items():
+        cars = window.expert_system.recommend(criteria)
+
+        def populate():
+            window.show_results(cars)
+            app.processEvents()
+
+        results[f"gui.show_results[{name}]"] = measure(populate, repeat)
+    window.close()
+    return results
+
+
+def run(sizes, repeat, seed, gui=True, readers=DEFAULT_READERS):
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            db_path = os.path.join(tmp, f"bench_{size}.db")
+            db = Database(db_path, reader_pool_size=max(readers, default=1))
+            load = import_cars(db, generate_cars(size, seed), replace=True)
+            tree = CarDecisionTree()
+            results = {"import.rows_per_second": load.rows_per_second}
+            results.update(bench_database(db, tree, repeat))
+            results.update(bench_tree(db, tree, repeat))
+            results.update(bench_expert_system(db, repeat))
+            results.update(bench_readers(db, tree, readers, repeat))
+            if gui:
+                results.update(bench_gui(db_path, repeat))
+            db.close()
+            report["results"][str(size)] = results
+            print(f"✓ {size} строк", file=sys.stderr)
+    return report
+
+
+def compare(report, baseline, threshold):
+    """
+    Сравнить медианы с базовым прогоном.
+
+    Returns:
+        список строк с регрессиями (медиана выросла больше чем на threshold)
+    """
+    regressions = []
+    for size, results in report["results"].items():
+        for name, current in results.items():
+            previous = baseline.get("results", {}).get(size, {}).get(name)
+            if not isinstance(current, dict) or not isinstance(previous, dict):
+                continue
+            if previous["median"] and current["median"] > previous["median"] * (1 + threshold):
+                ratio = current["median"] / previous["median"]
+                regressions.append(f"{size} {name}: {previous['median'] * 1000:.3f} → "
+                                   f"{current['median'] * 1000:.3f} мс (×{ratio:.2f})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности подбора")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="размеры каталогов через запятую")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--readers", default=",".join(map(str, DEFAULT_READERS)),
+                        help="числа одновременных потоков-читателей через запятую")
+    parser.add_argument("--no-gui", action="store_true", help="не замерять окно приложения")
+    parser.add_argument("--output", help="файл для JSON-отчёта (по умолчанию stdout)")
+    parser.add_argument("--baseline", help="JSON-отчёт предыдущего прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="допустимый рост медианы (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    readers = [int(count) for count in args.readers.split(",") if count]
+    report = run(sizes, args.repeat, args.seed, gui=not args.no_gui, readers=readers)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"Регрессия: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
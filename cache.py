@@ -0,0 +1,89 @@
+"""
+LRU-кэш результатов подбора.
+Записи привязаны к версии каталога: при изменении данных в БД кэш сбрасывается.
+Версии только растут: запрос, начатый до замены каталога, не возвращает кэш к прежней
+версии и не сохраняет в нём результат по прежнему каталогу.
+Кэш общий для потоков поиска и фасетов, поэтому операции выполняются под блокировкой.
+"""
+from collections import OrderedDict
+import threading
+
+
+class RecommendationCache:
+    """Ограниченный по размеру LRU-кэш со счётчиками попаданий и промахов."""
+
+    def __init__(self, maxsize=256):
+        """
+        Args:
+            maxsize: максимальное количество записей (0 — кэш отключён)
+        """
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """
+        Найти результат по ключу для текущей версии каталога.
+
+        Returns:
+            сохранённый результат или None
+        """
+        with self._lock:
+            if version != self.version:
+                if self.version is not None and version < self.version:
+                    # Запрос начат до смены версии: его результат уже устарел
+                    self.misses += 1
+                    return None
+                self._entries.clear()
+                self.version = version
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, version, result):
+        """Сохранить результат, вытеснив самую давнюю запись при переполнении."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self, version=None):
+        """
+        Сбросить все записи (счётчики сохраняются).
+
+        Args:
+            version: новая версия каталога — результаты, посчитанные для прежней,
+                после сброса не сохраняются
+        """
+        with self._lock:
+            self._entries.clear()
+            if version is not None:
+                self.version = version
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Счётчики кэша для отображения."""
+        with self._lock:
+            hits, misses, size = self.hits, self.misses, len(self._entries)
+        total = hits + misses
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
@@ -0,0 +1,364 @@
+"""
+Колоночный снимок каталога автомобилей в памяти.
+Числовые поля хранятся в массивах array, марка и тип кузова — в виде кодов словаря.
+Узлы дерева решений работают над массивами номеров строк, а не над списками словарей.
+Для выборок по индексам строится CatalogIndex: списки строк по марке и типу кузова
+и отсортированные индексы цены и мощности для поиска диапазонов через bisect.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+import heapq
+from itertools import compress, repeat
+
+from records import CarRecord, UNLOADED
+
+
+class CarCatalog:
+    """
+    Снимок таблицы cars в колоночном виде.
+    Загружается один раз и используется для всех последующих запросов.
+    """
+
+    def __init__(self):
+        self.ids = array("q")
+        self.prices = array("q")
+        self.powers = array("q")
+        self.brand_codes = array("l")
+        self.body_type_codes = array("l")
+        self.models = []
+        self.descriptions = []
+        # Словари кодирования: код → строка и строка → код
+        self.brands = []
+        self.body_types = []
+        self._brand_codes = {}
+        self._body_type_codes = {}
+        self._index = None
+        self._rows_by_id = None
+        # Функция (id) -> description для строк, загруженных без описания
+        self.description_loader = None
+        # Снимок (snapshot.CatalogSnapshot), из которого отображены колонки
+        self.snapshot = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Построить каталог из последовательности строк.
+
+        Args:
+            rows: итерируемое кортежей (id, brand, model, body_type, price, power[, description])
+
+        Returns:
+            CarCatalog
+        """
+        catalog = cls()
+        for row in rows:
+            catalog.append(*row)
+        return catalog
+
+    def append(self, car_id, brand, model, body_type, price, power, description=UNLOADED):
+        """Добавить одну строку в конец каталога."""
+        self._check_writable()
+        self._index = None
+        self._rows_by_id = None
+        self.ids.append(car_id)
+        self.brand_codes.append(self._encode(brand, self.brands, self._brand_codes))
+        self.models.append(model)
+        self.body_type_codes.append(
+            self._encode(body_type, self.body_types, self._body_type_codes)
+        )
+        self.prices.append(price)
+        self.powers.append(power)
+        self.descriptions.append(description)
+
+    @staticmethod
+    def _encode(value, values, codes):
+        code = codes.get(value)
+        if code is None:
+            code = len(values)
+            values.append(value)
+            codes[value] = code
+        return code
+
+    @property
+    def read_only(self):
+        """Каталог, отображённый из файла снимка, изменять нельзя."""
+        return self.snapshot is not None
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ValueError("Каталог открыт из снимка только для чтения")
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def index(self):
+        """Индексы каталога (строятся при первом обращении)."""
+        if self._index is None:
+            self._index = CatalogIndex(self)
+        return self._index
+
+    def brand_code(self, brand):
+        """Код марки или None, если такой марки в каталоге нет."""
+        return self._brand_codes.get(brand)
+
+    def body_type_code(self, body_type):
+        """Код типа кузова или None, если такого типа в каталоге нет."""
+        return self._body_type_codes.get(body_type)
+
+    def row_of(self, car_id):
+        """Номер строки по id автомобиля (или None)."""
+        if self._rows_by_id is None:
+            self._rows_by_id = {car_id: row for row, car_id in enumerate(self.ids)}
+        return self._rows_by_id.get(car_id)
+
+    def with_changes(self, changes):
+        """
+        Новый каталог с изменениями синхронизации (sync.ChangeSet) без перезагрузки из БД.
+        Текущий каталог не меняется — его продолжают читать другие потоки, пока новый
+        не заменит его (копирование при записи). Индексы нового каталога строятся
+        при первом обращении.
+
+        Returns:
+            CarCatalog
+        """
+        self._check_writable()
+        catalog = CarCatalog()
+        catalog.description_loader = self.description_loader
+        catalog.brands = list(self.brands)
+        catalog.body_types = list(self.body_types)
+        catalog._brand_codes = dict(self._brand_codes)
+        catalog._body_type_codes = dict(self._body_type_codes)
+        columns = ("ids", "prices", "powers", "brand_codes", "body_type_codes")
+        if changes.deleted:
+            deleted = set(changes.deleted)
+            keep = [car_id not in deleted for car_id in self.ids]
+            for name in columns:
+                column = getattr(self, name)
+                setattr(catalog, name, array(column.typecode, compress(column, keep)))
+            catalog.models = list(compress(self.models, keep))
+            catalog.descriptions = list(compress(self.descriptions, keep))
+        else:
+            for name in columns:
+                column = getattr(self, name)
+                setattr(catalog, name, array(column.typecode, column))
+            catalog.models = list(self.models)
+            catalog.descriptions = list(self.descriptions)
+        for car in changes.updated:
+            row = catalog.row_of(car.id)
+            if row is None:
+                continue
+            catalog.models[row] = car.model
+            catalog.prices[row] = car.price
+            catalog.powers[row] = car.power
+            catalog.descriptions[row] = car.description
+        # Новые строки получают большие id — порядок строк по возрастанию id сохраняется
+        for car in changes.inserted:
+            catalog.append(car.id, car.brand, car.model, car.body_type, car.price, car.power,
+                           car.description)
+        return catalog
+
+    def select(self, rows, column, op, value):
+        """
+        Отобрать строки, для которых op(column[row], value) истинно.
+        Маска вычисляется через map/compress без Python-цикла по строкам.
+
+        Args:
+            rows: массив номеров строк или None (все строки каталога)
+            column: колонка каталога (prices, powers, brand_codes, ...)
+            op: функция сравнения из модуля operator
+            value: значение для сравнения
+
+        Returns:
+            array номеров строк
+        """
+        if rows is None:
+            rows = range(len(column))
+            values = column
+        else:
+            values = map(column.__getitem__, rows)
+        return array("l", compress(rows, map(op, values, repeat(value))))
+
+    def order_rows(self, rows, field="price", descending=False, limit=None, offset=0,
+                   after=None):
+        """
+        Упорядочить строки по полю (при равенстве — по id) и выбрать страницу.
+        При заданном limit используется частичная сортировка heapq — O(n log k).
+
+        Args:
+            rows: номера строк
+            field: "price" или "power"
+            descending: сортировка по убыванию
+            limit: размер страницы (None — все строки)
+            offset: сколько строк пропустить
+            after: пара (значение, id) последней строки предыдущей страницы
+                   для постраничного вывода по ключу (keyset)
+
+        Returns:
+            список номеров строк
+        """
+        column = self.prices if field == "price" else self.powers
+        ids = self.ids
+        if descending:
+            def key(row):
+                return -column[row], ids[row]
+        else:
+            def key(row):
+                return column[row], ids[row]
+        if after is not None:
+            boundary = (-after[0] if descending else after[0], after[1])
+            rows = [row for row in rows if key(row) > boundary]
+        if limit is None:
+            return sorted(rows, key=key)[offset:]
+        return heapq.nsmallest(offset + limit, rows, key=key)[offset:]
+
+    def ordered_chunks(self, field="price", descending=False, low=None, high=None,
+                       chunk_size=1000):
+        """
+        Номера строк в порядке поля (при равенстве — по id) пачками: обходится готовый
+        отсортированный индекс, вся выборка не сортируется и не копируется.
+        Строки каталога идут по возрастанию id, поэтому порядок строк внутри равных
+        значений в индексе (устойчивая сортировка) совпадает с порядком order_rows.
+
+        Args:
+            field: "price" или "power"
+            descending: по убыванию значения
+            low, high: границы значения поля (None — без границы)
+            chunk_size: размер пачки
+
+        Yields:
+            массивы номеров строк
+        """
+        index = self.index
+        if field == "price":
+            order, values = index.price_order, index.price_sorted
+        else:
+            order, values = index.power_order, index.power_sorted
+        start = 0 if low is None else bisect_left(values, low)
+        stop = len(values) if high is None else bisect_right(values, high)
+        if not descending:
+            for begin in range(start, stop, chunk_size):
+                yield array("l", order[begin:min(begin + chunk_size, stop)])
+            return
+        # По убыванию значения; серия равных значений обходится вперёд (по возрастанию id)
+        chunk = array("l")
+        end = stop
+        while end > start:
+            begin = bisect_left(values, values[end - 1], start, end)
+            for part in range(begin, end, chunk_size):
+                chunk.extend(order[part:min(part + chunk_size, end)])
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = array("l")
+            end = begin
+        if chunk:
+            yield chunk
+
+    def record(self, row):
+        """Строка каталога в виде CarRecord (описание — лениво)."""
+        return CarRecord(
+            self.ids[row],
+            self.brands[self.brand_codes[row]],
+            self.models[row],
+            self.body_types[self.body_type_codes[row]],
+            self.prices[row],
+            self.powers[row],
+            self.descriptions[row],
+            self.description_loader,
+        )
+
+    def to_records(self, rows):
+        """Материализовать выбранные строки в список CarRecord."""
+        return [self.record(row) for row in rows]
+
+
+class Postings:
+    """Срез массива номеров строк без копирования: длина известна до материализации."""
+
+    __slots__ = ("source", "start", "stop", "row_ordered")
+
+    def __init__(self, source, start=0, stop=None, row_ordered=True):
+        self.source = source
+        self.start = start
+        self.stop = len(source) if stop is None else stop
+        self.row_ordered = row_ordered
+
+    def __len__(self):
+        return max(self.stop - self.start, 0)
+
+    def rows(self):
+        """Номера строк по возрастанию."""
+        rows = self.source[self.start:self.stop]
+        if self.row_ordered:
+            return rows
+        return array("l", sorted(rows))
+
+
+EMPTY_POSTINGS = Postings(array("l"))
+
+
+class CatalogIndex:
+    """
+    Инвертированные индексы колоночного каталога.
+    Марка и тип кузова → отсортированные номера строк;
+    цена и мощность → номера строк, упорядоченные по значению, для поиска диапазонов.
+    """
+
+    def __init__(self, catalog):
+        self.brand_postings = self._build_postings(catalog.brand_codes, len(catalog.brands))
+        self.body_type_postings = self._build_postings(
+            catalog.body_type_codes, len(catalog.body_types)
+        )
+        self.price_order, self.price_sorted = self._build_sorted(catalog.prices)
+        self.power_order, self.power_sorted = self._build_sorted(catalog.powers)
+
+    @classmethod
+    def from_parts(cls, brand_postings, body_type_postings, price_order, price_sorted,
+                   power_order, power_sorted):
+        """Индекс из готовых массивов (например, отображённых из снимка) без построения."""
+        index = cls.__new__(cls)
+        index.brand_postings = brand_postings
+        index.body_type_postings = body_type_postings
+        index.price_order, index.price_sorted = price_order, price_sorted
+        index.power_order, index.power_sorted = power_order, power_sorted
+        return index
+
+    @staticmethod
+    def _build_postings(codes, size):
+        postings = [array("l") for _ in range(size)]
+        for row, code in enumerate(codes):
+            postings[code].append(row)
+        return postings
+
+    @staticmethod
+    def _build_sorted(column):
+        order = array("l", sorted(range(len(column)), key=column.__getitem__))
+        return order, array("q", map(column.__getitem__, order))
+
+    @staticmethod
+    def _lookup(postings, code):
+        if code is None:
+            return EMPTY_POSTINGS
+        return Postings(postings[code])
+
+    @staticmethod
+    def _range(order, values, low, high):
+        start = 0 if low is None else bisect_left(values, low)
+        stop = len(values) if high is None else bisect_right(values, high)
+        return Postings(order, start, stop, row_ordered=False)
+
+    def brand(self, code):
+        """Строки с маркой code."""
+        return self._lookup(self.brand_postings, code)
+
+    def body_type(self, code):
+        """Строки с типом кузова code."""
+        return self._lookup(self.body_type_postings, code)
+
+    def price_range(self, low=None, high=None):
+        """Строки с ценой в диапазоне [low, high] (None — без границы)."""
+        return self._range(self.price_order, self.price_sorted, low, high)
+
+    def power_range(self, low=None, high=None):
+        """Строки с мощностью в диапазоне [low, high] (None — без границы)."""
+        return self._range(self.power_order, self.power_sorted, low, high)
@@ -4,6 +4,57 @@
 # Путь к базе данных (по умолчанию 'cars.db' в той же директории)
 DB_PATH = 'cars.db'
 
+# Количество запомненных результатов подбора (LRU-кэш ExpertSystem, 0 — отключить)
+RECOMMENDATION_CACHE_SIZE = 256
+
+# Настройки соединений SQLite (PRAGMA), применяются к каждому новому соединению:
+# journal_mode=WAL — чтение не блокируется записью; mmap_size — сколько байт файла БД
+# читается через отображение в память; cache_size < 0 — кэш страниц в КиБ на соединение;
+# temp_store=MEMORY — временные таблицы и сортировки в памяти; busy_timeout — ожидание
+# блокировки (мс). Пустой словарь — настройки SQLite по умолчанию
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -32 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+# Соединения только для чтения (PRAGMA query_only) для поиска и счётчиков в фоновых потоках;
+# запись (импорт, синхронизация) идёт через одно отдельное соединение
+SQLITE_READER_POOL_SIZE = 4
+
+# Сколько близких вариантов показывать, если под критерии не подходит ни один автомобиль
+# (критерии ослабляются, варианты ранжируются по оценке, см. scoring.py)
+RELAXED_RESULTS_LIMIT = 50
+
+# Сколько похожих автомобилей показывать по команде «Показать похожие» (similarity.py)
+SIMILAR_CARS_LIMIT = 20
+
+# Варианты диапазонов цены и мощности в выпадающих списках: (название, min, max),
+# None — без границы, границы включаются
+PRICE_OPTIONS = [
+    ("Любая", None, None),
+    ("до 1 млн", None, 1_000_000),
+    ("1 – 2 млн", 1_000_000, 2_000_000),
+    ("2 – 3 млн", 2_000_000, 3_000_000),
+    ("3 – 5 млн", 3_000_000, 5_000_000),
+    ("5 – 10 млн", 5_000_000, 10_000_000),
+    ("10+ млн", 10_000_000, None),
+]
+POWER_OPTIONS = [
+    ("Любая", None, None),
+    ("до 100 л.с.", None, 100),
+    ("100 – 150 л.с.", 100, 150),
+    ("150 – 200 л.с.", 150, 200),
+    ("200 – 300 л.с.", 200, 300),
+    ("300+ л.с.", 300, None),
+]
+
+# Файл снимка каталога для отображения в память (snapshot.py), рядом с базой данных.
+# Если файла нет или он устарел, каталог загружается из БД
+CATALOG_SNAPSHOT_PATH = 'cars.snapshot'
+
 # Примечание:
 # Приложение автоматически создаст файл cars.db в той же директории,
 # где находится исполняемый файл или скрипт Python
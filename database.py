@@ -1,15 +1,30 @@
 import sys
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Text
+from array import array
+from sqlalchemy import (create_engine, event, inspect, select, and_, or_, func, literal,
+                        union_all, column, table, Column, Integer, String, Text, Index)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import sessionmaker, scoped_session, Session
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from catalog import CarCatalog
+from config import SQLITE_PRAGMAS, SQLITE_READER_POOL_SIZE
+from decision_tree import CarDecisionTree, parse_order_by, without_node
+from facets import FacetCounts
+from records import CarRecord
 
 Base = declarative_base()
 
 class Car(Base):
     """Модель автомобиля для SQLAlchemy"""
     __tablename__ = 'cars'
+    __table_args__ = (
+        # Индексы под запросы дерева решений: фильтр + сортировка по цене
+        Index('ix_cars_body_type_price', 'body_type', 'price'),
+        Index('ix_cars_brand_price', 'brand', 'price'),
+        Index('ix_cars_power', 'power'),
+        # Естественный ключ строки каталога — для синхронизации (sync.py)
+        Index('ux_cars_natural_key', 'brand', 'model', 'body_type', unique=True),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     brand = Column(String(100), nullable=False)
@@ -31,14 +46,123 @@ class Car(Base):
             'description': self.description
         }
 
+cars_table = Car.__table__
+
+# Колонки естественного ключа строки каталога
+NATURAL_KEY = ('brand', 'model', 'body_type')
+
+# Колонки для выборок через Core select() — без описания, оно загружается лениво
+RECORD_COLUMNS = (
+    cars_table.c.id, cars_table.c.brand, cars_table.c.model,
+    cars_table.c.body_type, cars_table.c.price, cars_table.c.power,
+)
+
+# Полнотекстовый индекс FTS5 по марке, модели и описанию. Содержимое не дублируется
+# (content='cars'), индекс синхронизируется с таблицей триггерами; префиксные индексы
+# на 2 и 3 символа ускоряют поиск по началу слова
+TEXT_INDEX_TABLE = 'cars_fts'
+TEXT_INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS cars_fts USING fts5("
+    "brand, model, description, content='cars', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    # Словарь индекса (слово → число автомобилей) для исправления опечаток
+    "CREATE VIRTUAL TABLE IF NOT EXISTS cars_fts_vocab USING fts5vocab(cars_fts, 'row')",
+)
+TEXT_INDEX_TRIGGERS = {
+    'cars_fts_insert': (
+        "CREATE TRIGGER IF NOT EXISTS cars_fts_insert AFTER INSERT ON cars BEGIN "
+        "INSERT INTO cars_fts(rowid, brand, model, description) "
+        "VALUES (new.id, new.brand, new.model, new.description); END"
+    ),
+    'cars_fts_delete': (
+        "CREATE TRIGGER IF NOT EXISTS cars_fts_delete AFTER DELETE ON cars BEGIN "
+        "INSERT INTO cars_fts(cars_fts, rowid, brand, model, description) "
+        "VALUES ('delete', old.id, old.brand, old.model, old.description); END"
+    ),
+    'cars_fts_update': (
+        "CREATE TRIGGER IF NOT EXISTS cars_fts_update "
+        "AFTER UPDATE OF brand, model, description ON cars BEGIN "
+        "INSERT INTO cars_fts(cars_fts, rowid, brand, model, description) "
+        "VALUES ('delete', old.id, old.brand, old.model, old.description); "
+        "INSERT INTO cars_fts(rowid, brand, model, description) "
+        "VALUES (new.id, new.brand, new.model, new.description); END"
+    ),
+}
+# Таблица FTS5 для запросов через Core (скрытая колонка с именем таблицы — для MATCH)
+text_index_table = table(TEXT_INDEX_TABLE, column('rowid'), column(TEXT_INDEX_TABLE))
+
+
+def create_text_index(conn, rebuild=False):
+    """
+    Создать полнотекстовый индекс и триггеры синхронизации, если их нет.
+
+    Args:
+        conn: соединение SQLAlchemy (в транзакции)
+        rebuild: переиндексировать все строки cars (после пакетной загрузки без триггеров)
+    """
+    for ddl in TEXT_INDEX_DDL:
+        conn.exec_driver_sql(ddl)
+    if rebuild:
+        conn.exec_driver_sql("INSERT INTO cars_fts(cars_fts) VALUES ('rebuild')")
+    for ddl in TEXT_INDEX_TRIGGERS.values():
+        conn.exec_driver_sql(ddl)
+
+
+def drop_text_triggers(conn):
+    """Удалить триггеры индекса (пакетная загрузка); затем create_text_index(rebuild=True)."""
+    for name in TEXT_INDEX_TRIGGERS:
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def text_match_clause(id_column, expression):
+    """
+    SQL-условие «id входит в результат полнотекстового запроса».
+
+    Args:
+        id_column: колонка id таблицы cars
+        expression: запрос FTS5 MATCH (см. text_search.match_expression)
+    """
+    fts = text_index_table
+    return id_column.in_(select(fts.c.rowid).where(fts.c[TEXT_INDEX_TABLE].match(expression)))
+
+
+def apply_pragmas(engine, pragmas):
+    """
+    Выполнять PRAGMA из словаря при каждом новом соединении engine.
+
+    Args:
+        engine: Engine SQLAlchemy для SQLite
+        pragmas: словарь имя → значение (см. SQLITE_PRAGMAS в config.py)
+    """
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
 class Database:
-    def __init__(self, db_path='cars.db'):
+    def __init__(self, db_path='cars.db', pragmas=None, reader_pool_size=SQLITE_READER_POOL_SIZE,
+                 populate=True):
         """
         Инициализация базы данных SQLite через SQLAlchemy.
         Использует файл cars.db в той же директории, что и приложение.
+        Запись идёт через одно соединение (engine), чтение — через пул соединений
+        только для чтения (reader_engine), из которого сессии потоков (session) берут
+        по соединению, поэтому фоновые поиски выполняются параллельно.
         
         Args:
             db_path: путь к файлу базы данных (по умолчанию 'cars.db')
+            pragmas: настройки соединений (по умолчанию SQLITE_PRAGMAS из config.py)
+            reader_pool_size: число соединений только для чтения
+            populate: заполнить пустую базу демонстрационным каталогом (False — только
+                создать схему, например перед импортом или синхронизацией фида)
         """
         # Определяем путь к базе данных относительно исполняемого файла
         if getattr(sys, 'frozen', False):
@@ -49,37 +173,75 @@ class Database:
             base_path = os.path.dirname(os.path.abspath(__file__))
         
         self.db_path = os.path.join(base_path, db_path)
+        self.pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+        self.reader_pool_size = reader_pool_size
+        self.populate = populate
         self.engine = None
+        self.reader_engine = None
         self.SessionLocal = None
         self.session = None
+        # Версия каталога: увеличивается при каждой записи в таблицу cars
+        self.catalog_version = 0
+        # Есть ли полнотекстовый индекс (SQLite может быть собран без FTS5)
+        self.text_index = False
         self._connect()
     
     def _connect(self):
         """Подключение к SQLite базе данных через SQLAlchemy"""
         try:
-            # Создаем engine для SQLite
+            # Создаем engine для SQLite: одно соединение для записи
             database_url = f"sqlite:///{self.db_path}"
             self.engine = create_engine(
                 database_url,
                 echo=False,  # Установите True для отладки SQL запросов
-                connect_args={"check_same_thread": False}  # Для SQLite
+                connect_args={"check_same_thread": False},  # Для SQLite
+                pool_size=1,
+                max_overflow=0,
             )
+            apply_pragmas(self.engine, self.pragmas)
+            # Пул соединений только для чтения; journal_mode уже задан соединением записи
+            self.reader_engine = create_engine(
+                database_url,
+                echo=False,
+                connect_args={"check_same_thread": False},
+                pool_size=self.reader_pool_size,
+                max_overflow=0,
+            )
+            reader_pragmas = {name: value for name, value in self.pragmas.items()
+                              if name != "journal_mode"}
+            apply_pragmas(self.reader_engine, dict(reader_pragmas, query_only="ON"))
             
-            # Создаем фабрику сессий
+            # Создаем фабрику сессий (запись)
             self.SessionLocal = sessionmaker(
                 autocommit=False,
                 autoflush=False,
                 bind=self.engine
             )
             
-            # Создаем сессию
-            self.session = self.SessionLocal()
+            # Сессия для чтения: у каждого потока (например, фонового поиска) — своя,
+            # со своим соединением из пула читателей
+            self.session = scoped_session(sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                bind=self.reader_engine
+            ))
             
             # Создаем таблицы, если их нет
             Base.metadata.create_all(bind=self.engine)
+            # create_all не добавляет индексы к уже существующей таблице
+            existing = {index['name'] for index in inspect(self.engine).get_indexes('cars')}
+            for index in Car.__table__.indexes:
+                if index.name not in existing:
+                    try:
+                        index.create(bind=self.engine)
+                    except IntegrityError as e:
+                        # В старых файлах могут быть дубликаты естественного ключа
+                        print(f"Предупреждение: индекс {index.name} не создан: {e}")
+            self._ensure_text_index()
             
             # Инициализируем базу данных
-            self._init_database()
+            if self.populate:
+                self._init_database()
             
         except SQLAlchemyError as e:
             error_msg = (
@@ -91,14 +253,26 @@ class Database:
             )
             raise ConnectionError(error_msg)
     
+    def _ensure_text_index(self):
+        """Создать полнотекстовый индекс; для уже заполненной таблицы — проиндексировать её."""
+        try:
+            with self.engine.begin() as conn:
+                exists = conn.exec_driver_sql(
+                    "SELECT 1 FROM sqlite_master WHERE name = ?", (TEXT_INDEX_TABLE,)
+                ).first()
+                create_text_index(conn, rebuild=exists is None)
+            self.text_index = True
+        except SQLAlchemyError as e:
+            print(f"Предупреждение: полнотекстовый поиск недоступен: {e}")
+
     def _init_database(self):
         """Проверка и заполнение базы данных, если она пустая"""
         try:
-            # Проверяем количество записей
-            count = self.session.query(Car).count()
+            # Проверяем, есть ли хотя бы одна запись (без подсчёта всей таблицы)
+            first = self.session.query(Car.id).first()
             
             # Если база пустая, заполняем данными
-            if count == 0:
+            if first is None:
                 self._populate_database()
         except SQLAlchemyError as e:
             print(f"Предупреждение при инициализации базы: {e}")
@@ -233,31 +407,69 @@ class Database:
         ]
         
         try:
-            # Добавляем все записи
-            self.session.add_all(cars_data)
-            self.session.commit()
+            # Добавляем все записи через соединение записи
+            with self.SessionLocal.begin() as session:
+                session.add_all(cars_data)
+            self.bump_catalog_version()
             print(f"✓ Добавлено {len(cars_data)} автомобилей в базу данных")
         except SQLAlchemyError as e:
-            self.session.rollback()
             print(f"Ошибка при заполнении базы данных: {e}")
 
+    def bump_catalog_version(self):
+        """Отметить изменение данных: кэши и каталоги в памяти будут перечитаны."""
+        self.catalog_version += 1
+        try:
+            # Версия данных в файле БД видна и другим процессам (снимки каталога, snapshot.py)
+            with self.engine.begin() as conn:
+                data_version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+                conn.exec_driver_sql(f"PRAGMA user_version = {int(data_version) + 1}")
+        except SQLAlchemyError as e:
+            print(f"Ошибка при обновлении версии данных: {e}")
+        return self.catalog_version
+
+    def get_data_version(self):
+        """Версия данных, сохранённая в файле БД (PRAGMA user_version)."""
+        # Соединение сессии потока, а не второе из пула читателей: потоки, уже держащие
+        # соединение сессии, иначе ждали бы друг друга, когда пул исчерпан
+        return int(self.session.connection().exec_driver_sql("PRAGMA user_version").scalar())
+
     def get_all_cars(self):
         """
         Получить все автомобили без фильтрации (для дерева решений).
+        Строки читаются через Core select() без ORM-объектов.
 
         Returns:
-            список словарей с данными автомобилей
+            список CarRecord
         """
         try:
-            cars = self.session.query(Car).all()
-            return [car.to_dict() for car in cars]
+            rows = self.session.execute(select(*RECORD_COLUMNS).order_by(cars_table.c.id))
+            return [CarRecord(*row, loader=self.get_description) for row in rows]
         except SQLAlchemyError as e:
             print(f"Ошибка при получении автомобилей: {e}")
             return []
 
-    def get_cars(self, criteria):
+    def load_catalog(self):
+        """
+        Загрузить все автомобили в колоночный каталог (без создания ORM-объектов).
+
+        Returns:
+            CarCatalog
         """
-        Гибкий поиск автомобилей по опциональным критериям
+        try:
+            rows = self.session.execute(select(*RECORD_COLUMNS).order_by(cars_table.c.id))
+            catalog = CarCatalog.from_rows(rows)
+            catalog.description_loader = self.get_description
+            return catalog
+        except SQLAlchemyError as e:
+            print(f"Ошибка при загрузке каталога: {e}")
+            return CarCatalog()
+
+    def get_cars(self, criteria, decision_tree=None, limit=None, offset=0, order_by="price",
+                 after=None):
+        """
+        Гибкий поиск автомобилей по опциональным критериям.
+        Цепочка узлов дерева решений компилируется в один параметризованный
+        SQL-запрос с сортировкой по цене (используются индексы таблицы cars).
         
         Args:
             criteria: словарь с опциональными ключами:
@@ -267,40 +479,197 @@ class Database:
                 - 'min_price': минимальная цена
                 - 'min_power': минимальная мощность
                 - 'max_power': максимальная мощность
+            decision_tree: CarDecisionTree (по умолчанию — стандартное дерево)
+            limit: размер страницы (LIMIT), None — без ограничения
+            offset: сколько строк пропустить (OFFSET)
+            order_by: "price", "-price", "power" или "-power" (при равенстве — по id)
+            after: пара (значение, id) последней строки предыдущей страницы —
+                   постраничный вывод по ключу вместо OFFSET
         
         Returns:
-            список словарей с данными автомобилей
+            список CarRecord в заданном порядке
         """
+        field, descending = parse_order_by(order_by)
+        column = cars_table.c[field]
+        id_column = cars_table.c.id
         try:
-            query = self.session.query(Car)
-            
-            # Применяем фильтры
-            if criteria.get('brand'):
-                query = query.filter(Car.brand == criteria['brand'])
-            
-            if criteria.get('body_type'):
-                query = query.filter(Car.body_type == criteria['body_type'])
-            
-            if criteria.get('max_price'):
-                query = query.filter(Car.price <= criteria['max_price'])
-            
-            if criteria.get('min_price'):
-                query = query.filter(Car.price >= criteria['min_price'])
-            
-            if criteria.get('min_power'):
-                query = query.filter(Car.power >= criteria['min_power'])
-            
-            if criteria.get('max_power'):
-                query = query.filter(Car.power <= criteria['max_power'])
+            query = self._cars_query(RECORD_COLUMNS, criteria, decision_tree, order_by)
+            if after is not None:
+                value, car_id = after
+                beyond = column < value if descending else column > value
+                query = query.where(or_(beyond, and_(column == value, id_column > car_id)))
+            if limit is not None:
+                query = query.limit(limit)
+            if offset:
+                query = query.offset(offset)
             
-            # Выполняем запрос и преобразуем в словари
-            cars = query.all()
-            return [car.to_dict() for car in cars]
+            # Выполняем запрос без ORM-объектов
+            rows = self.session.execute(query)
+            return [CarRecord(*row, loader=self.get_description) for row in rows]
             
         except SQLAlchemyError as e:
             print(f"Ошибка при поиске автомобилей: {e}")
             return []
     
+    @staticmethod
+    def _cars_query(columns, criteria, decision_tree=None, order_by="price"):
+        """SELECT columns по критериям дерева решений с сортировкой (при равенстве — по id)."""
+        tree = decision_tree or CarDecisionTree()
+        field, descending = parse_order_by(order_by)
+        column = cars_table.c[field]
+        return (
+            select(*columns)
+            .where(*tree.compile_sql(cars_table.c, criteria))
+            .order_by(column.desc() if descending else column, cars_table.c.id)
+        )
+
+    def iter_cars(self, criteria, decision_tree=None, order_by="price", batch_size=1000):
+        """
+        Потоковая выборка строк по критериям вместе с описанием (для выгрузки).
+        Строки читаются курсором пачками по batch_size (stream_results/yield_per),
+        в памяти одновременно находится только одна пачка.
+
+        Raises:
+            SQLAlchemyError: ошибка запроса (выгрузка не должна молча оборваться)
+
+        Yields:
+            кортежи (id, brand, model, body_type, price, power, description)
+        """
+        query = self._cars_query(RECORD_COLUMNS + (cars_table.c.description,), criteria,
+                                 decision_tree, order_by)
+        result = self.session.execute(
+            query, execution_options={"stream_results": True, "yield_per": batch_size}
+        )
+        try:
+            for row in result:
+                yield tuple(row)
+        finally:
+            result.close()
+
+    def get_facet_counts(self, criteria, price_options, power_options, decision_tree=None):
+        """
+        Счётчики вариантов выпадающих списков одним SQL-запросом (UNION ALL).
+        Для марки и типа кузова — GROUP BY без собственного критерия списка,
+        для каждого диапазона цены и мощности — COUNT с этим диапазоном вместо выбранного.
+
+        Args:
+            criteria: текущие критерии
+            price_options, power_options: варианты диапазонов (название, min, max)
+            decision_tree: CarDecisionTree (по умолчанию — стандартное дерево)
+
+        Returns:
+            FacetCounts
+        """
+        tree = decision_tree or CarDecisionTree()
+        columns = cars_table.c
+        count = func.count().label('count')
+        queries = [
+            select(literal('total').label('facet'), literal('').label('value'), count)
+            .select_from(cars_table)
+            .where(*tree.compile_sql(columns, criteria))
+        ]
+        for facet in ('body_type', 'brand'):
+            queries.append(
+                select(literal(facet), columns[facet], count)
+                .where(*tree.compile_sql(columns, without_node(criteria, facet)))
+                .group_by(columns[facet])
+            )
+        for facet, options in (('price', price_options), ('power', power_options)):
+            others = without_node(criteria, facet)
+            for number, (_, low, high) in enumerate(options):
+                band = dict(others, **{f'min_{facet}': low, f'max_{facet}': high})
+                queries.append(
+                    select(literal(facet), literal(str(number)), count)
+                    .select_from(cars_table)
+                    .where(*tree.compile_sql(columns, band))
+                )
+
+        facets = FacetCounts()
+        facets.price = [0] * len(price_options)
+        facets.power = [0] * len(power_options)
+        try:
+            for facet, value, number in self.session.execute(union_all(*queries)):
+                if facet == 'total':
+                    facets.total = number
+                elif facet in ('body_type', 'brand'):
+                    getattr(facets, facet)[value] = number
+                else:
+                    getattr(facets, facet)[int(value)] = number
+        except SQLAlchemyError as e:
+            print(f"Ошибка при подсчёте вариантов: {e}")
+        return facets
+
+    def get_description(self, car_id):
+        """Описание автомобиля по id (для ленивой загрузки в CarRecord)."""
+        try:
+            return self.session.execute(
+                select(cars_table.c.description).where(cars_table.c.id == car_id)
+            ).scalar()
+        except SQLAlchemyError as e:
+            print(f"Ошибка при получении описания: {e}")
+            return None
+
+    def get_descriptions(self, car_ids):
+        """
+        Описания автомобилей одним запросом: словарь id → описание.
+
+        Raises:
+            SQLAlchemyError: ошибка запроса (выгрузка не должна молча записать пустые описания)
+        """
+        rows = self.session.execute(
+            select(cars_table.c.id, cars_table.c.description)
+            .where(cars_table.c.id.in_(list(car_ids)))
+        )
+        return dict(rows.all())
+
+    def match_text_ids(self, expression):
+        """
+        id автомобилей, подходящих под полнотекстовый запрос.
+
+        Args:
+            expression: запрос FTS5 MATCH
+
+        Raises:
+            sqlite3.Error: ошибка запроса (пустой результат не должен её скрывать)
+
+        Returns:
+            array id по возрастанию
+        """
+        # Курсор DBAPI: на десятках тысяч id обёртки строк SQLAlchemy дороже самого запроса
+        cursor = self.session.connection().connection.cursor()
+        try:
+            cursor.execute(
+                f"SELECT rowid FROM {TEXT_INDEX_TABLE} WHERE {TEXT_INDEX_TABLE} MATCH ? "
+                f"ORDER BY rowid", (expression,)
+            )
+            return array('q', [row[0] for row in cursor.fetchall()])
+        finally:
+            cursor.close()
+
+    def has_text_match(self, expression):
+        """Есть ли хотя бы один автомобиль под полнотекстовый запрос (без выборки всех id)."""
+        fts = text_index_table
+        row = self.session.execute(
+            select(fts.c.rowid).where(fts.c[TEXT_INDEX_TABLE].match(expression)).limit(1)
+        ).first()
+        return row is not None
+
+    def get_text_vocabulary(self):
+        """
+        Словарь полнотекстового индекса: слова и число автомобилей с ними.
+        Слова, начинающиеся с цифры (номера, годы), отсекаются условием по диапазону,
+        которое fts5vocab выполняет без перебора всех слов.
+
+        Returns:
+            список пар (слово, число автомобилей)
+        """
+        term = column('term')
+        rows = self.session.execute(
+            select(term, column('doc')).select_from(table('cars_fts_vocab'))
+            .where(term >= ':')  # ':' следует за '9'
+        )
+        return rows.all()
+
     def get_unique_brands(self):
         """Получить список уникальных марок автомобилей"""
         try:
@@ -322,7 +691,9 @@ class Database:
     def close(self):
         """Закрытие соединения с базой данных"""
         if self.session:
-            self.session.close()
+            self.session.remove()
+        if self.reader_engine:
+            self.reader_engine.dispose()
         if self.engine:
             self.engine.dispose()
     
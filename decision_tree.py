@@ -1,22 +1,114 @@
 """
 Дерево решений для подбора автомобилей.
-Фильтры применяются последовательно в порядке: тип кузова → цена → марка → мощность.
+Фильтры применяются последовательно в порядке: тип кузова → цена → марка → мощность → текст.
+Текстовый фильтр получает готовое множество id кандидатов (text_search.TextMatch).
+Каждый узел умеет работать как со списком словарей, так и с колоночным каталогом (catalog.py).
+Над каталогом узлы выполняются в порядке селективности: первым берётся самый короткий
+список строк из индекса, остальные узлы лишь проверяют отобранные строки.
+Над списком порядок выбирается по статистике кардинальностей (planner.py), если она собрана,
+а заданные фильтры компилируются в один предикат, проверяющий каждую запись один раз.
+Цепочку узлов также можно скомпилировать в условия одного SQL-запроса (compile_sql).
+К дереву можно подключить хуки (add_hook), получающие NodeEvent после каждого узла.
 """
+from itertools import count
+import operator
+import time
+
+from instrumentation import NodeEvent
+from planner import SelectivityStatistics
+
+# Ключи критериев в порядке узлов дерева
+CRITERIA_KEYS = ("body_type", "min_price", "max_price", "brand", "min_power", "max_power",
+                 "text")
+
+
+def normalize_criteria(criteria):
+    """
+    Каноническая форма критериев для ключей кэша и сравнения запросов.
+    Пустые значения отбрасываются, строки очищаются от пробелов по краям,
+    текстовый запрос приводится к нижнему регистру с одиночными пробелами.
+
+    Returns:
+        кортеж пар (ключ, значение) в порядке CRITERIA_KEYS
+    """
+    items = []
+    for key in CRITERIA_KEYS:
+        value = criteria.get(key)
+        if key in ("body_type", "brand"):
+            if not value:
+                continue
+            value = value.strip()
+        elif key == "text":
+            # Исходный запрос или уже разобранный TextMatch
+            value = " ".join(getattr(value, "text", value or "").casefold().split())
+            if not value:
+                continue
+        elif value is None:
+            continue
+        items.append((key, value))
+    return tuple(items)
+
+
+def narrows(previous, criteria):
+    """
+    True, если критерии criteria не шире previous: каждый автомобиль, подходящий
+    под criteria, подходит и под previous (добавлен фильтр или сужен диапазон).
+    Тогда новый результат можно получить фильтрацией предыдущего.
+    """
+    previous = dict(normalize_criteria(previous))
+    criteria = dict(normalize_criteria(criteria))
+    for key in ("body_type", "brand", "text"):
+        if key in previous and criteria.get(key) != previous[key]:
+            return False
+    for low, high in (("min_price", "max_price"), ("min_power", "max_power")):
+        if low in previous and (low not in criteria or criteria[low] < previous[low]):
+            return False
+        if high in previous and (high not in criteria or criteria[high] > previous[high]):
+            return False
+    return True
+
+
+# Поля, по которым можно упорядочивать результаты (при равенстве — по id)
+ORDER_FIELDS = ("price", "power")
+
+
+def parse_order_by(order_by):
+    """
+    Разобрать порядок сортировки: "price", "-price" (по убыванию), "power", "-power".
+
+    Returns:
+        пара (поле, по_убыванию)
+    """
+    descending = order_by.startswith("-")
+    field = order_by.lstrip("-")
+    if field not in ORDER_FIELDS:
+        raise ValueError(f"Неизвестный порядок сортировки: {order_by}")
+    return field, descending
 
 
 class FilterNode:
     """Узел дерева решений — один фильтр с переходом к следующему узлу."""
 
-    def __init__(self, name, filter_func, next_node=None):
+    def __init__(self, name, filter_func, next_node=None, rows_func=None, index_func=None,
+                 sql_func=None, estimate_func=None):
         """
         Args:
             name: название фильтра (для отладки и отображения)
             filter_func: функция (cars, criteria) -> filtered_cars
             next_node: следующий узел в дереве (FilterNode или None)
+            rows_func: функция (catalog, rows, criteria) -> rows для колоночного каталога
+            index_func: функция (catalog, criteria) -> Postings или None, если фильтр не задан
+            sql_func: функция (car, criteria) -> список SQL-условий над колонками модели car
+            estimate_func: функция (statistics, criteria) -> оценка доли оставшихся строк
+                или None, если фильтр не задан
         """
         self.name = name
         self.filter_func = filter_func
         self.next_node = next_node
+        self.rows_func = rows_func
+        self.index_func = index_func
+        self.sql_func = sql_func
+        self.estimate_func = estimate_func
 
     def evaluate(self, cars, criteria):
         """
@@ -34,6 +126,23 @@ class FilterNode:
             return filtered
         return self.next_node.evaluate(filtered, criteria)
 
+    def evaluate_rows(self, catalog, rows, criteria):
+        """
+        То же, что evaluate, но над номерами строк колоночного каталога.
+
+        Args:
+            catalog: CarCatalog
+            rows: массив номеров строк или None (все строки каталога)
+            criteria: словарь критериев от пользователя
+
+        Returns:
+            массив номеров строк или None, если ни один фильтр не сработал
+        """
+        filtered = self.rows_func(catalog, rows, criteria)
+        if self.next_node is None:
+            return filtered
+        return self.next_node.evaluate_rows(catalog, filtered, criteria)
+
 
 def _filter_body_type(cars, criteria):
     """Фильтр по типу кузова."""
@@ -75,44 +184,578 @@ def _filter_power(cars, criteria):
     return result
 
 
+def _text_match(criteria):
+    """
+    Разобранный текстовый запрос (text_search.TextMatch) или None, если он не задан.
+    Строку запроса дерево разобрать не может — это делает ExpertSystem.resolve_text.
+    """
+    match = criteria.get("text")
+    if isinstance(match, str):
+        if not match.strip():
+            return None
+        raise ValueError("Текстовый запрос не разобран: используйте ExpertSystem.resolve_text")
+    return match
+
+
+def _filter_text(cars, criteria):
+    """Фильтр по множеству id, найденных текстовым поиском."""
+    match = _text_match(criteria)
+    if match is None:
+        return cars
+    ids = match.ids
+    return [c for c in cars if c.get("id") in ids]
+
+
+def _is_in(value, values):
+    return value in values
+
+
+def _rows_body_type(catalog, rows, criteria):
+    """Фильтр по типу кузова над колонкой кодов."""
+    if not criteria.get("body_type"):
+        return rows
+    code = catalog.body_type_code(criteria["body_type"].strip())
+    if code is None:
+        return []
+    return catalog.select(rows, catalog.body_type_codes, operator.eq, code)
+
+
+def _rows_price(catalog, rows, criteria):
+    """Фильтр по диапазону цены над колонкой цен."""
+    if criteria.get("min_price") is not None:
+        rows = catalog.select(rows, catalog.prices, operator.ge, criteria["min_price"])
+    if criteria.get("max_price") is not None:
+        rows = catalog.select(rows, catalog.prices, operator.le, criteria["max_price"])
+    return rows
+
+
+def _rows_brand(catalog, rows, criteria):
+    """Фильтр по марке над колонкой кодов."""
+    if not criteria.get("brand"):
+        return rows
+    code = catalog.brand_code(criteria["brand"].strip())
+    if code is None:
+        return []
+    return catalog.select(rows, catalog.brand_codes, operator.eq, code)
+
+
+def _rows_power(catalog, rows, criteria):
+    """Фильтр по диапазону мощности над колонкой мощностей."""
+    if criteria.get("min_power") is not None:
+        rows = catalog.select(rows, catalog.powers, operator.ge, criteria["min_power"])
+    if criteria.get("max_power") is not None:
+        rows = catalog.select(rows, catalog.powers, operator.le, criteria["max_power"])
+    return rows
+
+
+def _rows_text(catalog, rows, criteria):
+    """Фильтр по множеству id текстового поиска над колонкой id."""
+    match = _text_match(criteria)
+    if match is None:
+        return rows
+    return catalog.select(rows, catalog.ids, _is_in, match.ids)
+
+
+def _index_body_type(catalog, criteria):
+    """Строки выбранного типа кузова из инвертированного индекса."""
+    if not criteria.get("body_type"):
+        return None
+    return catalog.index.body_type(catalog.body_type_code(criteria["body_type"].strip()))
+
+
+def _index_price(catalog, criteria):
+    """Строки из диапазона цены по отсортированному индексу."""
+    low, high = criteria.get("min_price"), criteria.get("max_price")
+    if low is None and high is None:
+        return None
+    return catalog.index.price_range(low, high)
+
+
+def _index_brand(catalog, criteria):
+    """Строки выбранной марки из инвертированного индекса."""
+    if not criteria.get("brand"):
+        return None
+    return catalog.index.brand(catalog.brand_code(criteria["brand"].strip()))
+
+
+def _index_power(catalog, criteria):
+    """Строки из диапазона мощности по отсортированному индексу."""
+    low, high = criteria.get("min_power"), criteria.get("max_power")
+    if low is None and high is None:
+        return None
+    return catalog.index.power_range(low, high)
+
+
+def _index_text(catalog, criteria):
+    """Строки с id, найденными текстовым поиском."""
+    match = _text_match(criteria)
+    if match is None:
+        return None
+    return match.postings(catalog)
+
+
+def _sql_body_type(car, criteria):
+    """SQL-условие по типу кузова."""
+    if not criteria.get("body_type"):
+        return []
+    return [car.body_type == criteria["body_type"].strip()]
+
+
+def _sql_price(car, criteria):
+    """SQL-условия по диапазону цены (нулевые границы учитываются)."""
+    clauses = []
+    if criteria.get("min_price") is not None:
+        clauses.append(car.price >= criteria["min_price"])
+    if criteria.get("max_price") is not None:
+        clauses.append(car.price <= criteria["max_price"])
+    return clauses
+
+
+def _sql_brand(car, criteria):
+    """SQL-условие по марке."""
+    if not criteria.get("brand"):
+        return []
+    return [car.brand == criteria["brand"].strip()]
+
+
+def _sql_power(car, criteria):
+    """SQL-условия по диапазону мощности (нулевые границы учитываются)."""
+    clauses = []
+    if criteria.get("min_power") is not None:
+        clauses.append(car.power >= criteria["min_power"])
+    if criteria.get("max_power") is not None:
+        clauses.append(car.power <= criteria["max_power"])
+    return clauses
+
+
+def _sql_text(car, criteria):
+    """SQL-условие по текстовому запросу: подзапрос к полнотекстовому индексу."""
+    match = _text_match(criteria)
+    if match is None:
+        return []
+    return [match.sql_clause(car.id)]
+
+
+# Условия скомпилированного отбора по ключам критериев ({поле} — чтение поля записи)
+_PREDICATE_TERMS = {
+    "body_type": "{body_type} == body_type",
+    "min_price": "{price} >= min_price",
+    "max_price": "{price} <= max_price",
+    "brand": "{brand} == brand",
+    "min_power": "{power} >= min_power",
+    "max_power": "{power} <= max_power",
+    "text": "{id} in text",
+}
+# Обе границы диапазона проверяются одним сравнением — поле читается один раз
+_RANGE_TERMS = {
+    ("min_price", "max_price"): "min_price <= {price} <= max_price",
+    ("min_power", "max_power"): "min_power <= {power} <= max_power",
+}
+# Чтение полей: у словарей — через get, у CarRecord — атрибуты (быстрее)
+_DICT_FIELDS = {
+    "id": 'car.get("id")',
+    "body_type": 'car.get("body_type")',
+    "brand": 'car.get("brand")',
+    "price": 'car.get("price", 0)',
+    "power": 'car.get("power", 0)',
+}
+_RECORD_FIELDS = {name: f"car.{name}" for name in _DICT_FIELDS}
+# Ключи критериев, проверяемые каждым узлом
+NODE_CRITERIA = {
+    "body_type": ("body_type",),
+    "price": ("min_price", "max_price"),
+    "brand": ("brand",),
+    "power": ("min_power", "max_power"),
+    "text": ("text",),
+}
+
+
+def without_node(criteria, name):
+    """Копия критериев без ключей узла name (например, для подсчёта вариантов этого узла)."""
+    keys = NODE_CRITERIA[name]
+    return {key: value for key, value in criteria.items() if key not in keys}
+
+
+def _compile_plan(keys, records=False):
+    """
+    Сгенерировать фабрику отбора для набора заданных критериев.
+    Значения критериев передаются аргументами фабрики и связываются в замыкании,
+    в текст функции попадают только условия из _PREDICATE_TERMS и _RANGE_TERMS.
+
+    Args:
+        keys: ключи заданных критериев в порядке проверки
+        records: записи — CarRecord (поля читаются атрибутами), иначе словари
+
+    Returns:
+        функция (**values) -> (select, stream): select(cars) возвращает список,
+        stream(cars) — генератор подходящих записей
+    """
+    terms = []
+    for key in keys:
+        pair = next((pair for pair in _RANGE_TERMS if key in pair), None)
+        if pair is None or not set(pair) <= set(keys):
+            terms.append(_PREDICATE_TERMS[key])
+        elif key == pair[0]:
+            terms.append(_RANGE_TERMS[pair])
+    condition = " and ".join(terms).format_map(_RECORD_FIELDS if records else _DICT_FIELDS)
+    source = (
+        f"def make({', '.join(keys)}):\n"
+        f"    def select(cars):\n"
+        f"        return [car for car in cars if {condition}]\n"
+        f"    def stream(cars):\n"
+        f"        return (car for car in cars if {condition})\n"
+        f"    return select, stream\n"
+    )
+    namespace = {}
+    exec(compile(source, f"<predicate {'/'.join(keys)}{' records' if records else ''}>",
+                 "exec"), namespace)
+    return namespace["make"]
+
+
+def _estimate_body_type(statistics, criteria):
+    """Доля автомобилей выбранного типа кузова."""
+    if not criteria.get("body_type"):
+        return None
+    return statistics.value_fraction(statistics.body_type_counts, criteria["body_type"].strip())
+
+
+def _estimate_price(statistics, criteria):
+    """Доля автомобилей в диапазоне цены по гистограмме."""
+    low, high = criteria.get("min_price"), criteria.get("max_price")
+    if low is None and high is None:
+        return None
+    return statistics.price_histogram.fraction(low, high)
+
+
+def _estimate_brand(statistics, criteria):
+    """Доля автомобилей выбранной марки."""
+    if not criteria.get("brand"):
+        return None
+    return statistics.value_fraction(statistics.brand_counts, criteria["brand"].strip())
+
+
+def _estimate_power(statistics, criteria):
+    """Доля автомобилей в диапазоне мощности по гистограмме."""
+    low, high = criteria.get("min_power"), criteria.get("max_power")
+    if low is None and high is None:
+        return None
+    return statistics.power_histogram.fraction(low, high)
+
+
+def _estimate_text(statistics, criteria):
+    """Доля автомобилей, найденных текстовым поиском."""
+    match = _text_match(criteria)
+    if match is None:
+        return None
+    return len(match.ids) / statistics.total if statistics.total else 0.0
+
+
 def build_car_decision_tree():
     """
     Строит дерево решений для подбора автомобилей.
-    Порядок фильтров: тип кузова → цена → марка → мощность.
+    Порядок фильтров: тип кузова → цена → марка → мощность → текст.
 
     Returns:
         корневой FilterNode дерева
     """
-    power_node = FilterNode("power", _filter_power, next_node=None)
-    brand_node = FilterNode("brand", _filter_brand, next_node=power_node)
-    price_node = FilterNode("price", _filter_price, next_node=brand_node)
-    body_type_node = FilterNode("body_type", _filter_body_type, next_node=price_node)
+    text_node = FilterNode("text", _filter_text, next_node=None,
+                           rows_func=_rows_text, index_func=_index_text,
+                           sql_func=_sql_text, estimate_func=_estimate_text)
+    power_node = FilterNode("power", _filter_power, next_node=text_node,
+                            rows_func=_rows_power, index_func=_index_power,
+                            sql_func=_sql_power, estimate_func=_estimate_power)
+    brand_node = FilterNode("brand", _filter_brand, next_node=power_node,
+                            rows_func=_rows_brand, index_func=_index_brand,
+                            sql_func=_sql_brand, estimate_func=_estimate_brand)
+    price_node = FilterNode("price", _filter_price, next_node=brand_node,
+                            rows_func=_rows_price, index_func=_index_price,
+                            sql_func=_sql_price, estimate_func=_estimate_price)
+    body_type_node = FilterNode("body_type", _filter_body_type, next_node=price_node,
+                                rows_func=_rows_body_type, index_func=_index_body_type,
+                                sql_func=_sql_body_type,
+                                estimate_func=_estimate_body_type)
     return body_type_node
 
 
 class CarDecisionTree:
     """
     Дерево решений для подбора автомобилей по фильтрам.
-    Применяет фильтры в фиксированном порядке, соответствующем узлам дерева.
+    Без статистики применяет фильтры в фиксированном порядке, соответствующем узлам дерева;
+    со статистикой (analyze) — только заданные фильтры, начиная с самого селективного.
     """
 
-    def __init__(self):
+    def __init__(self, statistics=None):
         self.root = build_car_decision_tree()
+        # SelectivityStatistics для выбора порядка узлов над списком
+        self.statistics = statistics
+        # Хуки инструментирования: функции (NodeEvent) -> None
+        self.hooks = []
+        self._query_ids = count(1)
+        # Скомпилированные предикаты: (кортеж заданных ключей, записи CarRecord) -> фабрика
+        self._plans = {}
+
+    def add_hook(self, hook):
+        """Подключить хук, вызываемый после каждого узла (например, NodeStatsRecorder)."""
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """Отключить хук."""
+        self.hooks.remove(hook)
+
+    def _emit(self, query_id, node, mode, started, rows_in, rows_out):
+        event = NodeEvent(query_id, node.name, mode, time.perf_counter() - started,
+                          rows_in, rows_out)
+        for hook in self.hooks:
+            hook(event)
+
+    def analyze(self, cars):
+        """
+        Собрать статистику кардинальностей по списку автомобилей.
+        Статистика влияет только на порядок узлов, поэтому устаревшая статистика
+        не меняет результат — лишь делает порядок менее удачным.
+        """
+        self.statistics = SelectivityStatistics.from_cars(cars)
+
+    def analyze_catalog(self, catalog):
+        """
+        То же, что analyze, по колоночному каталогу: счётчики берутся из его индексов,
+        гистограммы — выборкой из отсортированных колонок (без прохода по строкам).
+        """
+        self.statistics = SelectivityStatistics.from_catalog(catalog) if len(catalog) else None
+
+    def plan_order(self, criteria):
+        """
+        Порядок выполнения узлов над списком: только заданные фильтры,
+        по возрастанию оценки доли оставшихся строк (при равенстве — логический порядок).
+
+        Returns:
+            список пар (FilterNode, оценка доли строк)
+        """
+        planned = []
+        node = self.root
+        while node:
+            estimate = node.estimate_func(self.statistics, criteria)
+            if estimate is not None:
+                planned.append((node, estimate))
+            node = node.next_node
+        planned.sort(key=lambda item: item[1])
+        return planned
+
+    def _nodes(self, criteria):
+        """Узлы для выполнения над списком: по статистике или в логическом порядке."""
+        if self.statistics is not None:
+            return [node for node, _ in self.plan_order(criteria)]
+        nodes = []
+        node = self.root
+        while node:
+            nodes.append(node)
+            node = node.next_node
+        return nodes
+
+    def compile_predicate(self, criteria, records=False):
+        """
+        Скомпилировать заданные критерии в один проход по записям.
+        Код генерируется один раз для каждого набора заданных ключей
+        (и порядка их проверки) и кэшируется; значения критериев связываются при вызове.
+
+        Args:
+            criteria: словарь критериев
+            records: True, если записи — CarRecord (поля читаются атрибутами, а не get)
+
+        Returns:
+            пара функций (select, stream) над списком записей
+            или None, если ни один фильтр не задан
+        """
+        values = {}
+        for node in self._nodes(criteria):
+            for key in NODE_CRITERIA[node.name]:
+                value = criteria.get(key)
+                if key in ("body_type", "brand"):
+                    if value:
+                        values[key] = value.strip()
+                elif key == "text":
+                    match = _text_match(criteria)
+                    if match is not None:
+                        values[key] = match.ids
+                elif value is not None:
+                    values[key] = value
+        if not values:
+            return None
+        keys = tuple(values)
+        make = self._plans.get((keys, records))
+        if make is None:
+            make = self._plans.setdefault((keys, records), _compile_plan(keys, records))
+        return make(**values)
+
+    def iter_matches(self, cars, criteria):
+        """
+        Потоковый отбор: каждая запись проверяется один раз, без промежуточных списков.
+
+        Args:
+            cars: итерируемое словарей или CarRecord
+            criteria: словарь критериев
+
+        Returns:
+            итератор подходящих записей в исходном порядке
+        """
+        compiled = self.compile_predicate(criteria)
+        if compiled is None:
+            return iter(cars)
+        return compiled[1](cars)
+
+    def refine(self, records, criteria):
+        """
+        Отфильтровать список CarRecord (например, предыдущий результат поиска)
+        скомпилированным предикатом с чтением полей через атрибуты. Порядок сохраняется.
+
+        Returns:
+            новый список CarRecord
+        """
+        compiled = self.compile_predicate(criteria, records=True)
+        return list(records) if compiled is None else compiled[0](records)
 
     def evaluate(self, cars, criteria):
         """
         Применить дерево решений к списку автомобилей и критериям.
+        Без хуков используется скомпилированный предикат (iter_matches),
+        с хуками узлы выполняются по очереди, чтобы измерить каждый.
 
         Args:
-            cars: список словарей с полями brand, model, body_type, price, power, description
-            criteria: словарь критериев (body_type, min_price, max_price, brand, min_power, max_power)
+            cars: список словарей или CarRecord с полями brand, model, body_type, price, power
+            criteria: словарь критериев (body_type, min_price, max_price, brand, min_power,
+                max_power; text — разобранный TextMatch)
 
         Returns:
             отфильтрованный список автомобилей
         """
         if not cars:
             return []
-        return self.root.evaluate(cars, criteria)
+        if not self.hooks:
+            compiled = self.compile_predicate(criteria)
+            return cars if compiled is None else compiled[0](cars)
+        query_id = next(self._query_ids)
+        for node in self._nodes(criteria):
+            if not cars:
+                break
+            started = time.perf_counter()
+            filtered = node.filter_func(cars, criteria)
+            self._emit(query_id, node, "list", started, len(cars), len(filtered))
+            cars = filtered
+        return cars
+
+    def plan(self, catalog, criteria):
+        """
+        Порядок выполнения узлов над каталогом: только заданные фильтры,
+        по возрастанию числа строк в их индексах.
+
+        Returns:
+            список пар (FilterNode, Postings)
+        """
+        planned = []
+        node = self.root
+        while node:
+            postings = node.index_func(catalog, criteria)
+            if postings is not None:
+                planned.append((node, postings))
+            node = node.next_node
+        planned.sort(key=lambda item: len(item[1]))
+        return planned
+
+    def evaluate_rows(self, catalog, criteria):
+        """
+        Применить дерево решений к колоночному каталогу.
+        Самый селективный фильтр даёт начальный набор строк из индекса,
+        остальные проверяют только эти строки — стоимость зависит от размера результата.
+
+        Args:
+            catalog: CarCatalog, загруженный один раз
+            criteria: словарь критериев (body_type, min_price, max_price, brand, min_power,
+                max_power; text — разобранный TextMatch)
+
+        Returns:
+            номера подходящих строк каталога
+        """
+        if not len(catalog):
+            return []
+        query_id = next(self._query_ids) if self.hooks else None
+        started = time.perf_counter()
+        planned = self.plan(catalog, criteria)
+        if not planned:
+            return range(len(catalog))
+        rows = planned[0][1].rows()
+        if query_id is not None:
+            self._emit(query_id, planned[0][0], "index", started, len(catalog), len(rows))
+        for node, _ in planned[1:]:
+            if not rows:
+                break
+            started = time.perf_counter()
+            rows_in = len(rows)
+            rows = node.rows_func(catalog, rows, criteria)
+            if query_id is not None:
+                self._emit(query_id, node, "index", started, rows_in, len(rows))
+        return rows
+
+    def iter_ordered_rows(self, catalog, criteria, field="price", descending=False,
+                          chunk_size=1000, sort_limit=50000):
+        """
+        Подходящие строки каталога в порядке сортировки пачками (для потоковой выгрузки):
+        память не растёт с размером результата. Если в самом селективном индексе не больше
+        sort_limit строк, они отбираются и сортируются целиком; иначе обходится индекс
+        поля сортировки (только диапазон, если по этому полю задан фильтр), и каждая
+        пачка проверяется остальными заданными фильтрами.
+
+        Args:
+            catalog: CarCatalog
+            criteria: словарь критериев (text — разобранный TextMatch)
+            field: "price" или "power"
+            descending: сортировка по убыванию
+            chunk_size: размер пачки
+            sort_limit: до какого размера выборка сортируется в памяти
+
+        Yields:
+            массивы номеров строк
+        """
+        if not len(catalog):
+            return
+        planned = self.plan(catalog, criteria)
+        if planned and len(planned[0][1]) <= sort_limit:
+            rows = catalog.order_rows(self.evaluate_rows(catalog, criteria), field, descending)
+            for start in range(0, len(rows), chunk_size):
+                yield rows[start:start + chunk_size]
+            return
+        low = high = None
+        nodes = []
+        for node, _ in planned:
+            if node.name == field:
+                # Фильтр по полю сортировки задаёт диапазон обхода индекса
+                low, high = criteria.get(f"min_{field}"), criteria.get(f"max_{field}")
+            else:
+                nodes.append(node)
+        for rows in catalog.ordered_chunks(field, descending, low, high, chunk_size):
+            for node in nodes:
+                if not rows:
+                    break
+                rows = node.rows_func(catalog, rows, criteria)
+            if rows:
+                yield rows
+
+    def compile_sql(self, car, criteria):
+        """
+        Скомпилировать цепочку узлов в условия WHERE одного параметризованного запроса.
+
+        Args:
+            car: модель или таблица с колонками brand, body_type, price, power
+            criteria: словарь критериев
+
+        Returns:
+            список SQL-условий (объединяются через AND)
+        """
+        clauses = []
+        node = self.root
+        while node:
+            clauses.extend(node.sql_func(car, criteria))
+            node = node.next_node
+        return clauses
 
     def get_filter_order(self):
         """Возвращает порядок применения фильтров (для отображения)."""
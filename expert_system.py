@@ -1,14 +1,152 @@
-from decision_tree import CarDecisionTree
+from itertools import chain
+import os
+import threading
+
+from cache import RecommendationCache
+from config import POWER_OPTIONS, PRICE_OPTIONS, RECOMMENDATION_CACHE_SIZE
+from decision_tree import CarDecisionTree, narrows, normalize_criteria, parse_order_by
+from facets import catalog_facets
+from scoring import rank_catalog
+from similarity import SimilarityIndex
+from snapshot import open_catalog
+from text_search import TextSearch, normalize_text
 
 
 class ExpertSystem:
     """Экспертная система для подбора автомобилей на основе дерева решений по фильтрам."""
 
-    def __init__(self, db):
+    # Режимы поиска: по колоночному каталогу в памяти или одним SQL-запросом
+    MODES = ("catalog", "sql")
+
+    def __init__(self, db, mode="catalog", cache_size=RECOMMENDATION_CACHE_SIZE,
+                 snapshot_path=None):
+        """
+        Args:
+            db: Database
+            mode: "catalog" — каталог в памяти с индексами, "sql" — дерево компилируется в SQL
+            cache_size: размер LRU-кэша результатов (0 — без кэша)
+            snapshot_path: файл снимка каталога (snapshot.py); если он есть и соответствует
+                версии данных БД, каталог отображается из него в память вместо загрузки из БД
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Неизвестный режим поиска: {mode}")
         self.db = db
+        self.mode = mode
+        self.snapshot_path = snapshot_path
         self.decision_tree = CarDecisionTree()
+        self.catalog = None
+        self.catalog_version = None
+        # Замена каталога и его версии из потоков поиска и фасетов (загрузка — один раз)
+        self._catalog_lock = threading.RLock()
+        # Номер замены каталога: входит в версию кэша вместе с Database.catalog_version
+        self._catalog_generation = 0
+        self.cache = RecommendationCache(cache_size)
+        # Индекс похожих автомобилей и версия каталога, для которой он построен
+        self._similarity = None
+        self._similarity_version = None
+        # Разбор текстовых запросов по полнотекстовому индексу БД
+        self.text_search = TextSearch(db)
+
+    def reload_catalog(self):
+        """Перечитать колоночный каталог из снимка или из БД (после изменения данных)."""
+        with self._catalog_lock:
+            version = self.db.catalog_version
+            catalog = self.load_catalog()
+            self._use_catalog(catalog, version)
+            return catalog
+
+    def load_catalog(self):
+        """
+        Прочитать каталог из снимка или из БД, не заменяя текущий
+        (например, в другом потоке, пока текущий каталог обслуживает запросы).
+
+        Returns:
+            CarCatalog
+        """
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            try:
+                catalog = open_catalog(self.snapshot_path, self.db.get_data_version())
+                catalog.description_loader = self.db.get_description
+                return catalog
+            except (OSError, ValueError) as e:
+                print(f"Снимок каталога не используется: {e}")
+        return self.db.load_catalog()
 
-    def recommend(self, criteria):
+    def _use_catalog(self, catalog, version):
+        """
+        Сделать каталог текущим (под _catalog_lock): статистика для порядка узлов
+        дерева над списками записей (refine) собирается по новому каталогу.
+        """
+        self.decision_tree.analyze_catalog(catalog)
+        # Другие потоки видят либо прежний каталог, либо новый вместе с его версией
+        self.catalog, self.catalog_version = catalog, version
+        self._catalog_generation += 1
+        # Результаты по прежнему каталогу, досчитанные после замены, в кэш не попадут
+        self.cache.clear(self.cache_version())
+
+    def cache_version(self):
+        """
+        Версия результатов подбора: меняется и при изменении данных в БД,
+        и при замене каталога в памяти (set_catalog, apply_changes).
+        """
+        return self.db.catalog_version, self._catalog_generation
+
+    def _remember(self, key, version, result):
+        """Сохранить результат в кэше, если версия не сменилась, пока он считался."""
+        if version == self.cache_version():
+            self.cache.put(key, version, result)
+
+    def set_catalog(self, catalog, version):
+        """
+        Заменить каталог заранее прочитанным (load_catalog); кэш результатов
+        и словарь текстового поиска сбрасываются.
+
+        Args:
+            catalog: CarCatalog
+            version: Database.catalog_version, прочитанная до загрузки каталога
+        """
+        with self._catalog_lock:
+            self._use_catalog(catalog, version)
+        self.text_search.reset()
+
+    def apply_changes(self, changes):
+        """
+        Применить изменения синхронизации (sync.ChangeSet) к каталогу в памяти.
+        Новый каталог (CarCatalog.with_changes) строится вместе с индексами, пока текущий
+        обслуживает запросы, и заменяет его под блокировкой. Если каталог не соответствует
+        версии, с которой начиналась синхронизация, или открыт из снимка, он будет перечитан
+        целиком при следующем запросе.
+
+        Returns:
+            True, если изменения применены без перезагрузки
+        """
+        with self._catalog_lock:
+            catalog = self.catalog
+            applicable = (catalog is not None and not catalog.read_only
+                          and self.catalog_version == changes.base_version)
+        applied = False
+        if applicable:
+            updated = catalog.with_changes(changes)
+            updated.index  # индексы строятся до замены, а не в потоках поиска
+            with self._catalog_lock:
+                # Пока строился новый каталог, текущий мог смениться (перезагрузка)
+                if self.catalog is catalog:
+                    self._use_catalog(updated, changes.version)
+                    applied = True
+        return applied
+
+    def get_catalog(self):
+        """Каталог в памяти; перечитывается, если версия данных в БД изменилась."""
+        catalog = self.catalog
+        if catalog is not None and self.catalog_version == self.db.catalog_version:
+            return catalog
+        with self._catalog_lock:
+            # Пока поток ждал блокировку, каталог мог перечитать другой поток
+            if self.catalog is None or self.catalog_version != self.db.catalog_version:
+                return self.reload_catalog()
+            return self.catalog
+
+    def recommend(self, criteria, limit=None, offset=0, order_by="price", after=None):
         """
         Получение рекомендаций по автомобилям на основе критериев.
         Фильтрация выполняется деревом решений в порядке:
@@ -22,27 +160,232 @@ class ExpertSystem:
                 - min_price: минимальная цена
                 - min_power: минимальная мощность
                 - max_power: максимальная мощность
+                - text: текстовый запрос по марке, модели и описанию
+                  (по началу слов, с исправлением опечаток)
+            limit: размер страницы; при заданном limit выполняется частичная
+                сортировка (heapq.nsmallest) или SQL LIMIT
+            offset: сколько строк пропустить
+            order_by: "price", "-price", "power" или "-power" (при равенстве — по id)
+            after: пара (значение поля сортировки, id) последней строки предыдущей
+                страницы — постраничный вывод по ключу для дальних страниц
+
+        Returns:
+            список CarRecord (поддерживают доступ по ключам, как словари)
+        """
+        field, descending = parse_order_by(order_by)
+        key = (normalize_criteria(criteria), limit, offset, order_by,
+               tuple(after) if after is not None else None)
+        version = self.cache_version()
+        cached = self.cache.get(key, version)
+        if cached is not None:
+            return list(cached)
+        result = self._recommend(criteria, order_by, field, descending, limit, offset, after)
+        self._remember(key, version, result)
+        return list(result)
+
+    def refine(self, criteria, previous_criteria, previous_results, previous_version):
+        """
+        Подбор сужением предыдущего полного результата recommend(previous_criteria)
+        без обращения к каталогу — если новые критерии не шире прежних
+        и данные с тех пор не менялись. Порядок (по цене) сохраняется.
+
+        Args:
+            criteria: новые критерии
+            previous_criteria: критерии предыдущего поиска
+            previous_results: его полный результат (без limit/offset)
+            previous_version: cache_version() на момент предыдущего поиска
+
+        Returns:
+            список CarRecord или None, если сужение неприменимо
+        """
+        if previous_version != self.cache_version() or not narrows(previous_criteria, criteria):
+            return None
+        key = (normalize_criteria(criteria), None, 0, "price", None)
+        cached = self.cache.get(key, previous_version)
+        if cached is not None:
+            return list(cached)
+        result = self.decision_tree.refine(previous_results, self.resolve_text(criteria))
+        self._remember(key, previous_version, result)
+        return list(result)
+
+    def text_match(self, text):
+        """
+        Разобранный текстовый запрос (text_search.TextMatch); кэшируется вместе
+        с результатами подбора, поэтому id кандидатов загружаются один раз.
 
         Returns:
-            список словарей с рекомендациями
+            TextMatch или None, если в запросе нет слов
         """
-        all_cars = self.db.get_all_cars()
-        if not all_cars:
+        key = ("text", normalize_text(text))
+        version = self.cache_version()
+        cached = self.cache.get(key, version)
+        if cached is not None:
+            return cached
+        match = self.text_search.match(text)
+        if match is not None:
+            self._remember(key, version, match)
+        return match
+
+    def resolve_text(self, criteria):
+        """
+        Критерии для дерева решений: текстовый запрос заменяется разобранным TextMatch
+        (пустой запрос отбрасывается). Без текстового запроса возвращается тот же словарь.
+        """
+        text = criteria.get("text")
+        if not isinstance(text, str):
+            return criteria
+        resolved = dict(criteria)
+        match = self.text_match(text)
+        if match is None:
+            del resolved["text"]
+        else:
+            resolved["text"] = match
+        return resolved
+
+    def _recommend(self, criteria, order_by, field, descending, limit, offset, after):
+        """Подбор без кэша."""
+        criteria = self.resolve_text(criteria)
+        if self.mode == "sql":
+            return self.db.get_cars(criteria, self.decision_tree, limit=limit, offset=offset,
+                                    order_by=order_by, after=after)
+
+        catalog = self.get_catalog()
+        if not len(catalog):
             return []
 
-        filtered_cars = self.decision_tree.evaluate(all_cars, criteria)
-        if not filtered_cars:
+        rows = self.decision_tree.evaluate_rows(catalog, criteria)
+        if not rows:
             return []
 
-        recommendations = sorted(filtered_cars, key=lambda x: x["price"])
-        result = []
-        for car in recommendations:
-            result.append({
-                "brand": car["brand"],
-                "model": car["model"],
-                "body_type": car["body_type"],
-                "price": car["price"],
-                "power": car["power"],
-                "description": car.get("description", ""),
-            })
+        ordered = catalog.order_rows(rows, field, descending, limit=limit, offset=offset,
+                                     after=after)
+        return catalog.to_records(ordered)
+
+    def facets(self, criteria, price_options=PRICE_OPTIONS, power_options=POWER_OPTIONS):
+        """
+        Сколько автомобилей подойдёт для каждого варианта выпадающих списков
+        (марка, тип кузова, диапазоны цены и мощности) при остальных текущих критериях.
+        Результат кэшируется вместе с результатами подбора.
+
+        Args:
+            criteria: текущие критерии
+            price_options, power_options: варианты диапазонов (название, min, max)
+
+        Returns:
+            facets.FacetCounts
+        """
+        key = ("facets", normalize_criteria(criteria), tuple(price_options),
+               tuple(power_options))
+        version = self.cache_version()
+        cached = self.cache.get(key, version)
+        if cached is not None:
+            return cached
+        criteria = self.resolve_text(criteria)
+        if self.mode == "sql":
+            result = self.db.get_facet_counts(criteria, price_options, power_options,
+                                              self.decision_tree)
+        else:
+            result = catalog_facets(self.decision_tree, self.get_catalog(), criteria,
+                                    price_options, power_options)
+        self._remember(key, version, result)
+        return result
+
+    def rank(self, criteria, limit=20, weights=None, min_results=1):
+        """
+        Лучшие автомобили по взвешенной оценке (scoring.py): мощность на рубль,
+        близость цены и мощности к центру выбранных диапазонов. Если подходящих
+        автомобилей меньше min_results, критерии ослабляются по шагам.
+        Считается по каталогу в памяти в обоих режимах; результат кэшируется.
+
+        Args:
+            criteria: критерии, как для recommend
+            limit: сколько лучших автомобилей вернуть
+            weights: веса оценок (по умолчанию scoring.DEFAULT_WEIGHTS)
+            min_results: сколько кандидатов нужно, чтобы не ослаблять критерии
+
+        Returns:
+            scoring.RankedResult
+        """
+        key = ("rank", normalize_criteria(criteria), limit,
+               tuple(sorted(weights.items())) if weights is not None else None, min_results)
+        version = self.cache_version()
+        cached = self.cache.get(key, version)
+        if cached is not None:
+            return cached
+        result = rank_catalog(self.decision_tree, self.get_catalog(), self.resolve_text(criteria),
+                              limit, weights, min_results)
+        self._remember(key, version, result)
         return result
+
+    def similarity_index(self):
+        """Индекс похожих автомобилей (similarity.py); строится заново для новой версии каталога."""
+        catalog = self.get_catalog()
+        with self._catalog_lock:
+            index = self._similarity
+            if (index is None or index.catalog is not catalog
+                    or self._similarity_version != self.catalog_version):
+                index = SimilarityIndex(catalog)
+                self._similarity, self._similarity_version = index, self.catalog_version
+            return index
+
+    def similar(self, car_id, limit=10):
+        """
+        Автомобили, похожие на автомобиль car_id по цене, мощности и типу кузова
+        (k ближайших соседей по сеточному индексу). Считается по каталогу в памяти
+        в обоих режимах.
+
+        Args:
+            car_id: id автомобиля
+            limit: сколько похожих автомобилей вернуть
+
+        Returns:
+            список CarRecord от самого похожего (без самого автомобиля);
+            пустой, если автомобиля нет в каталоге
+        """
+        index = self.similarity_index()
+        row = index.catalog.row_of(car_id)
+        if row is None:
+            return []
+        return index.catalog.to_records([row for _, row in index.nearest(row, limit)])
+
+    def export(self, criteria, path, fmt=None, order_by="price", progress=None, cancel=None):
+        """
+        Выгрузить все автомобили по критериям в CSV или XLSX потоком (export.py):
+        в режиме SQL — курсором БД пачками, в режиме каталога — по номерам строк
+        с подгрузкой описаний пачками. Записи CarRecord для всего результата не создаются.
+
+        Args:
+            criteria: критерии, как для recommend
+            path: файл выгрузки (.csv или .xlsx)
+            fmt: "csv" или "xlsx" (None — по расширению)
+            order_by: порядок строк, как в recommend
+            progress: функция (строк записано, всего или None) -> None
+            cancel: функция () -> bool; True — прервать выгрузку
+
+        Returns:
+            export.ExportReport
+        """
+        from export import EXPORT_CHUNK_SIZE, catalog_rows, export_rows
+        criteria = self.resolve_text(criteria)
+        if self.mode == "sql":
+            rows = self.db.iter_cars(criteria, self.decision_tree, order_by=order_by)
+            return export_rows(rows, path, fmt, progress, cancel)
+        field, descending = parse_order_by(order_by)
+        catalog = self.get_catalog()
+        chunks = self.decision_tree.iter_ordered_rows(catalog, criteria, field, descending,
+                                                      chunk_size=EXPORT_CHUNK_SIZE)
+        rows = catalog_rows(catalog, chain.from_iterable(chunks), self.db.get_descriptions)
+        return export_rows(rows, path, fmt, progress, cancel)
+
+    def recommend_batch(self, profiles, workers=None, limit=None, order_by="price",
+                        report=None, progress=None):
+        """
+        Пакетный подбор по множеству профилей критериев в нескольких процессах
+        (см. batch.recommend_batch). Результаты не кэшируются.
+
+        Yields:
+            пачки списков пар (номер профиля, список CarRecord) в порядке профилей
+        """
+        from batch import recommend_batch
+        return recommend_batch(self, profiles, workers=workers, limit=limit,
+                               order_by=order_by, report=report, progress=progress)
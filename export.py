@@ -0,0 +1,264 @@
+"""
+Потоковая выгрузка результатов подбора в CSV или XLSX.
+Строки поступают из генератора (курсор БД с yield_per или номера строк каталога
+в памяти с подгрузкой описаний пачками) и сразу записываются в файл, поэтому
+расход памяти не зависит от размера выгрузки. XLSX собирается средствами
+стандартной библиотеки (zipfile): лист пишется потоком, строки — встроенными
+(inlineStr), без общей таблицы строк. Файл пишется во временный и заменяет
+целевой только после успешного завершения.
+"""
+import csv
+import os
+import re
+import stat
+import tempfile
+import time
+from itertools import islice
+from xml.sax.saxutils import escape
+import zipfile
+
+# Права новой выгрузки, если маску процесса прочитать нельзя (mkstemp создаёт файл с 0600)
+DEFAULT_FILE_MODE = 0o644
+
+# Колонки выгрузки: поле и заголовок XLSX (в CSV заголовки — имена полей, как для importer.py)
+EXPORT_FIELDS = (
+    ("id", "ID"),
+    ("brand", "Марка"),
+    ("model", "Модель"),
+    ("body_type", "Тип кузова"),
+    ("price", "Цена, руб."),
+    ("power", "Мощность, л.с."),
+    ("description", "Описание"),
+)
+# Сколько строк каталога обрабатывается за раз (одним запросом описаний)
+EXPORT_CHUNK_SIZE = 1000
+# Как часто сообщать о прогрессе (строк)
+PROGRESS_EVERY = 5000
+FORMATS = ("csv", "xlsx")
+
+
+class ExportCancelled(Exception):
+    """Выгрузка остановлена по запросу (cancel() вернула True)."""
+
+
+class ExportReport:
+    """Итоги выгрузки: файл, число строк и скорость."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.rows = 0
+        self.seconds = 0.0
+        self.cancelled = False
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        if self.cancelled:
+            return f"Выгрузка в {self.path} отменена после {self.rows} строк"
+        return (f"Выгружено {self.rows} строк в {self.path} за {self.seconds:.2f} с "
+                f"({self.rows_per_second:.0f} строк/с)")
+
+
+def detect_format(path):
+    """Формат выгрузки по расширению (.csv, .xlsx)."""
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext not in FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки {path}: ожидается .csv или .xlsx")
+    return ext
+
+
+def catalog_rows(catalog, rows, description_loader=None):
+    """
+    Строки выгрузки по номерам строк каталога.
+    Описания (в каталоге они не хранятся) загружаются одним запросом на пачку.
+
+    Args:
+        catalog: CarCatalog
+        rows: номера строк в порядке выгрузки
+        description_loader: функция (ids) -> {id: описание}, например Database.get_descriptions
+
+    Yields:
+        кортежи (id, brand, model, body_type, price, power, description)
+    """
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, EXPORT_CHUNK_SIZE))
+        if not chunk:
+            return
+        ids = [catalog.ids[row] for row in chunk]
+        descriptions = description_loader(ids) if description_loader else {}
+        for row, car_id in zip(chunk, ids):
+            yield (car_id, catalog.brands[catalog.brand_codes[row]], catalog.models[row],
+                   catalog.body_types[catalog.body_type_codes[row]], catalog.prices[row],
+                   catalog.powers[row], descriptions.get(car_id))
+
+
+def record_rows(records):
+    """Строки выгрузки из готовых записей (CarRecord, словари)."""
+    for car in records:
+        yield tuple(car[field] for field, _ in EXPORT_FIELDS)
+
+
+def _tracked(rows, report, progress, cancel, total):
+    """Считать строки, сообщать о прогрессе и проверять отмену каждые PROGRESS_EVERY строк."""
+    for row in rows:
+        yield row
+        report.rows += 1
+        if report.rows % PROGRESS_EVERY == 0:
+            if cancel and cancel():
+                raise ExportCancelled()
+            if progress:
+                progress(report.rows, total)
+
+
+def write_csv(f, rows):
+    """Записать строки в CSV (заголовок — имена полей)."""
+    writer = csv.writer(f)
+    writer.writerow([field for field, _ in EXPORT_FIELDS])
+    writer.writerows(("" if value is None else value for value in row) for row in rows)
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" '
+    'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Автомобили" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetData>'
+)
+_SHEET_END = '</sheetData></worksheet>'
+_COLUMNS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+# Управляющие символы, недопустимые в XML
+_ILLEGAL_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _xlsx_row(number, values):
+    cells = []
+    for column, value in zip(_COLUMNS, values):
+        ref = f"{column}{number}"
+        if value is None:
+            continue
+        if isinstance(value, int):
+            cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        else:
+            text = escape(_ILLEGAL_XML.sub("", str(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t>{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+def write_xlsx(f, rows):
+    """Записать строки в XLSX (заголовки — русские названия колонок), лист пишется потоком."""
+    with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _ROOT_RELS)
+        archive.writestr("xl/workbook.xml", _WORKBOOK)
+        archive.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(_SHEET_START.encode("utf-8"))
+            sheet.write(_xlsx_row(1, [title for _, title in EXPORT_FIELDS]).encode("utf-8"))
+            for number, row in enumerate(rows, start=2):
+                sheet.write(_xlsx_row(number, row).encode("utf-8"))
+            sheet.write(_SHEET_END.encode("utf-8"))
+
+
+def _process_umask():
+    """
+    Маска прав процесса из /proc/self/status (Linux) или None.
+    os.umask не используется: прочитать маску можно только сменив её для всего процесса,
+    а выгрузка идёт в фоновом потоке, пока другие потоки могут создавать файлы.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _file_mode(path):
+    """Права файла выгрузки: как у заменяемого файла, иначе 0666 с учётом umask."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = _process_umask()
+        return DEFAULT_FILE_MODE if umask is None else 0o666 & ~umask
+
+
+def export_rows(rows, path, fmt=None, progress=None, cancel=None, total=None):
+    """
+    Записать поток строк в файл CSV или XLSX.
+
+    Args:
+        rows: итерируемое кортежей в порядке EXPORT_FIELDS (читается потоково)
+        path: путь к файлу
+        fmt: "csv" или "xlsx" (None — по расширению файла)
+        progress: функция (строк записано, всего или None) -> None
+        cancel: функция () -> bool; True — прервать выгрузку (файл не создаётся)
+        total: ожидаемое число строк, если известно (для прогресса)
+
+    Returns:
+        ExportReport
+    """
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+    report = ExportReport(path)
+    started = time.perf_counter()
+    tracked = _tracked(rows, report, progress, cancel, total)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        if fmt == "csv":
+            with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+                write_csv(f, tracked)
+        else:
+            with os.fdopen(fd, "wb") as f:
+                write_xlsx(f, tracked)
+        os.chmod(tmp_path, _file_mode(path))
+        os.replace(tmp_path, path)
+    except ExportCancelled:
+        os.unlink(tmp_path)
+        report.cancelled = True
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    report.seconds = time.perf_counter() - started
+    if progress and not report.cancelled:
+        progress(report.rows, total)
+    return report
@@ -0,0 +1,88 @@
+"""
+Счётчики вариантов (фасеты) для выпадающих списков критериев.
+Для каждой марки, типа кузова и диапазона цены и мощности считается, сколько автомобилей
+подойдёт, если выбрать этот вариант при остальных текущих критериях.
+Над каталогом в памяти — по одному проходу дерева решений на каждый список
+с подсчётом через Counter и bisect; в режиме SQL — одним запросом (Database.get_facet_counts).
+"""
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+from decision_tree import without_node
+
+
+class FacetCounts:
+    """Число подходящих автомобилей для каждого варианта каждого списка."""
+
+    def __init__(self):
+        # Совпадений по всем текущим критериям
+        self.total = 0
+        # значение → число автомобилей
+        self.body_type = {}
+        self.brand = {}
+        # Списки чисел в порядке вариантов (PRICE_OPTIONS, POWER_OPTIONS)
+        self.price = []
+        self.power = []
+
+    def __eq__(self, other):
+        if not isinstance(other, FacetCounts):
+            return NotImplemented
+        return vars(self) == vars(other)
+
+    def to_dict(self):
+        """Счётчики в виде словаря (для JSON)."""
+        return dict(vars(self))
+
+    def __repr__(self):
+        return (f"FacetCounts(total={self.total}, body_type={self.body_type}, "
+                f"brand={self.brand}, price={self.price}, power={self.power})")
+
+
+def _count_codes(rows, codes, values):
+    """Число строк по каждому значению словаря."""
+    counter = Counter(codes) if isinstance(rows, range) else Counter(map(codes.__getitem__, rows))
+    return {values[code]: count for code, count in counter.items()}
+
+
+def _count_bands(sorted_values, options):
+    """Число значений в каждом диапазоне [min, max] (None — без границы) через bisect."""
+    counts = []
+    for _, low, high in options:
+        start = 0 if low is None else bisect_left(sorted_values, low)
+        stop = len(sorted_values) if high is None else bisect_right(sorted_values, high)
+        counts.append(max(stop - start, 0))
+    return counts
+
+
+def catalog_facets(tree, catalog, criteria, price_options, power_options):
+    """
+    Счётчики вариантов по колоночному каталогу.
+    Для каждого списка дерево выполняется без его собственного критерия
+    (строки берутся из индексов), затем значения подсчитываются за один проход.
+
+    Args:
+        tree: CarDecisionTree
+        catalog: CarCatalog
+        criteria: текущие критерии
+        price_options, power_options: варианты диапазонов (название, min, max)
+
+    Returns:
+        FacetCounts
+    """
+    facets = FacetCounts()
+    facets.total = len(tree.evaluate_rows(catalog, criteria))
+    rows = tree.evaluate_rows(catalog, without_node(criteria, "body_type"))
+    facets.body_type = _count_codes(rows, catalog.body_type_codes, catalog.body_types)
+    rows = tree.evaluate_rows(catalog, without_node(criteria, "brand"))
+    facets.brand = _count_codes(rows, catalog.brand_codes, catalog.brands)
+
+    for name, column, options in (("price", catalog.prices, price_options),
+                                  ("power", catalog.powers, power_options)):
+        rows = tree.evaluate_rows(catalog, without_node(criteria, name))
+        if isinstance(rows, range):
+            # Все строки: отсортированная колонка уже есть в индексе
+            values = getattr(catalog.index, f"{name}_sorted")
+        else:
+            values = sorted(map(column.__getitem__, rows))
+        setattr(facets, name, _count_bands(values, options))
+    return facets
@@ -0,0 +1,298 @@
+"""
+Пакетный импорт каталога автомобилей из CSV или JSONL в SQLite.
+Строки читаются потоково (генераторы), проверяются и записываются пачками
+через Core insert() (executemany) в одной транзакции. При замене каталога и на больших
+фидах (от BULK_LOAD_THRESHOLD строк) вторичные индексы таблицы cars и триггеры
+полнотекстового индекса на время загрузки удаляются, затем индексы строятся,
+а полнотекстовый индекс перестраивается заново; небольшие фиды записываются
+при действующих индексах и триггерах.
+Строка с уже существующим естественным ключом (brand, model, body_type) обновляет его.
+
+Запуск из командной строки:
+    python importer.py feed.csv [--format csv|jsonl] [--batch-size 5000] [--replace]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from itertools import chain, islice
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import (Car, Database, NATURAL_KEY, cars_table, create_text_index,
+                      drop_text_triggers)
+
+# Количество строк в одной пачке executemany
+DEFAULT_BATCH_SIZE = 5000
+# Сколько сообщений об ошибках сохранять в отчёте
+MAX_REPORTED_ERRORS = 20
+# С какого числа строк фида индексы перестраиваются после загрузки, а не обновляются
+# при каждой вставке (перестройка стоит секунды на сотнях тысяч строк таблицы)
+BULK_LOAD_THRESHOLD = 10000
+
+REQUIRED_TEXT_FIELDS = ("brand", "model", "body_type")
+REQUIRED_INT_FIELDS = ("price", "power")
+
+
+class SourceRows:
+    """
+    Строки файла фида с номером текущей строки в файле (line) — для сообщений об ошибках:
+    заголовок CSV и пустые строки JSONL сдвигают номер записи относительно строки файла.
+    """
+
+    def __init__(self, numbered):
+        """
+        Args:
+            numbered: итерируемое пар (номер строки в файле, строка)
+        """
+        self._numbered = numbered
+        self.line = None
+
+    def __iter__(self):
+        for self.line, row in self._numbered:
+            yield row
+
+
+def _csv_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            # line_num — последняя прочитанная строка файла (запись может быть многострочной)
+            yield reader.line_num, row
+
+
+def read_csv(path):
+    """Строки CSV-файла в виде словарей (первая строка — заголовок)."""
+    return SourceRows(_csv_rows(path))
+
+
+class InvalidRow:
+    """Строка файла, которую не удалось прочитать; validate_row отклоняет её с причиной."""
+
+    def __init__(self, reason):
+        self.reason = reason
+
+
+def _jsonl_rows(path):
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, InvalidRow(f"некорректный JSON: {e.msg} (позиция {e.pos})")
+
+
+def read_jsonl(path):
+    """
+    Строки JSONL-файла (один JSON-объект на строку), пустые строки пропускаются.
+    Строка с некорректным JSON возвращается как InvalidRow и отклоняется при проверке,
+    не прерывая импорт.
+    """
+    return SourceRows(_jsonl_rows(path))
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+def detect_format(path):
+    """Формат файла по расширению (.csv, .jsonl, .ndjson)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError(f"Не удалось определить формат файла {path}, укажите --format")
+
+
+def validate_row(row):
+    """
+    Проверка и приведение одной строки к виду для вставки в таблицу cars.
+
+    Raises:
+        ValueError: если строка некорректна
+
+    Returns:
+        словарь с ключами brand, model, body_type, price, power, description
+    """
+    if isinstance(row, InvalidRow):
+        raise ValueError(row.reason)
+    if not isinstance(row, dict):
+        raise ValueError(f"строка должна быть объектом, а не {type(row).__name__}")
+    car = {}
+    for field in REQUIRED_TEXT_FIELDS:
+        value = row.get(field)
+        value = value.strip() if isinstance(value, str) else value
+        if value is None or value == "":
+            raise ValueError(f"не заполнено поле {field}")
+        if not isinstance(value, str):
+            raise ValueError(f"поле {field} должно быть строкой: {value!r}")
+        limit = cars_table.c[field].type.length
+        if len(value) > limit:
+            raise ValueError(f"поле {field} длиннее {limit} символов")
+        car[field] = value
+    for field in REQUIRED_INT_FIELDS:
+        value = row.get(field)
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"поле {field} должно быть целым числом: {value!r}")
+        if value < 0:
+            raise ValueError(f"поле {field} не может быть отрицательным")
+        car[field] = value
+    description = row.get("description")
+    car["description"] = (description.strip() or None) if isinstance(description, str) else None
+    return car
+
+
+def validate_rows(rows, report):
+    """
+    Генератор корректных строк; ошибки учитываются в report.
+    Для строк файла (SourceRows) в ошибке указывается строка файла, иначе — номер записи.
+    """
+    for number, row in enumerate(rows, start=1):
+        try:
+            yield validate_row(row)
+        except ValueError as e:
+            report.rejected += 1
+            if len(report.errors) < MAX_REPORTED_ERRORS:
+                line = getattr(rows, "line", None) or number
+                report.errors.append(f"строка {line}: {e}")
+
+
+def chunked(iterable, size):
+    """Разбить поток на списки длиной не более size."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ImportReport:
+    """Итоги импорта: количество строк, ошибки и скорость загрузки."""
+
+    def __init__(self):
+        self.inserted = 0
+        # Обновлённые строки (считает синхронизация; импорт их не отличает от вставленных)
+        self.updated = 0
+        self.rejected = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.inserted / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        summary = f"Импортировано {self.inserted} строк за {self.seconds:.2f} с"
+        # Для нескольких строк скорость не показательна (и округлилась бы до 0)
+        if self.rows_per_second >= 1:
+            rate = f"{self.rows_per_second:,.0f}".replace(",", " ")
+            summary += f" ({rate} строк/с)"
+        lines = [f"{summary}, отклонено {self.rejected}"]
+        lines.extend(self.errors)
+        return "\n".join(lines)
+
+
+def upsert_statement():
+    """INSERT ... ON CONFLICT (brand, model, body_type) DO UPDATE для пакетной записи."""
+    stmt = insert(cars_table)
+    return stmt.on_conflict_do_update(
+        index_elements=NATURAL_KEY,
+        set_={name: stmt.excluded[name] for name in ("price", "power", "description")},
+    )
+
+
+def import_cars(db, rows, batch_size=DEFAULT_BATCH_SIZE, replace=False, progress=None,
+                bulk_threshold=BULK_LOAD_THRESHOLD):
+    """
+    Загрузить строки в таблицу cars одной транзакцией.
+    Первые bulk_threshold корректных строк читаются заранее: если фид меньше и каталог
+    не заменяется, строки записываются при действующих индексах и триггерах.
+
+    Args:
+        db: Database
+        rows: итерируемое словарей (например, read_csv(path))
+        batch_size: размер пачки executemany
+        replace: удалить существующие строки перед загрузкой
+        progress: функция (inserted) -> None, вызывается после каждой пачки
+        bulk_threshold: с какого числа строк индексы перестраиваются после загрузки
+
+    Returns:
+        ImportReport
+    """
+    report = ImportReport()
+    started = time.perf_counter()
+    # Уникальный индекс естественного ключа нужен для ON CONFLICT и остаётся на месте
+    indexes = [index for index in Car.__table__.indexes if not index.unique]
+    statement = upsert_statement()
+    valid = validate_rows(rows, report)
+    head = list(islice(valid, bulk_threshold))
+    bulk = replace or len(head) >= bulk_threshold
+    with db.engine.connect() as conn:
+        synchronous = conn.exec_driver_sql("PRAGMA synchronous").scalar()
+        # Режимы журнала меняются только вне транзакции
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        conn.commit()
+        try:
+            with conn.begin():
+                if bulk:
+                    for index in indexes:
+                        index.drop(conn, checkfirst=True)
+                    if db.text_index:
+                        drop_text_triggers(conn)
+                if replace:
+                    conn.execute(delete(cars_table))
+                for batch in chunked(chain(head, valid), batch_size):
+                    conn.execute(statement, batch)
+                    report.inserted += len(batch)
+                    if progress:
+                        progress(report.inserted)
+                if bulk:
+                    # Индексы строятся один раз по загруженным данным
+                    for index in indexes:
+                        index.create(conn)
+                    if db.text_index:
+                        create_text_index(conn, rebuild=True)
+        finally:
+            conn.exec_driver_sql(f"PRAGMA synchronous={int(synchronous)}")
+            conn.commit()
+    report.seconds = time.perf_counter() - started
+    db.bump_catalog_version()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Импорт каталога автомобилей в cars.db")
+    parser.add_argument("path", help="файл CSV или JSONL")
+    parser.add_argument("--format", choices=sorted(READERS), help="формат файла")
+    parser.add_argument("--db", help="путь к базе данных (по умолчанию cars.db приложения)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--replace", action="store_true",
+                        help="заменить каталог целиком (удалить текущие строки)")
+    args = parser.parse_args(argv)
+
+    try:
+        fmt = args.format or detect_format(args.path)
+        db_path = os.path.abspath(args.db) if args.db else "cars.db"
+        # Пустая база не заполняется демонстрационным каталогом: в ней будет только фид
+        with Database(db_path, populate=False) as db:
+            report = import_cars(db, READERS[fmt](args.path), args.batch_size, args.replace)
+    except (OSError, ValueError, ConnectionError, SQLAlchemyError) as e:
+        print(f"Ошибка импорта: {e}", file=sys.stderr)
+        return 1
+    print(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Инструментирование узлов дерева решений.
+CarDecisionTree вызывает подключённые хуки после каждого узла с событием NodeEvent;
+NodeStatsRecorder собирает по узлам время, число строк на входе и выходе
+и гистограммы времени и селективности.
+"""
+from bisect import bisect_right
+import threading
+
+# Границы корзин гистограммы времени (секунды) и селективности (доля оставшихся строк)
+TIME_BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1)
+TIME_BUCKET_LABELS = ("<10мкс", "<100мкс", "<1мс", "<10мс", "<100мс", "≥100мс")
+SELECTIVITY_BUCKETS = (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.999)
+SELECTIVITY_BUCKET_LABELS = ("<1%", "<10%", "<25%", "<50%", "<75%", "<90%", "<100%", "100%")
+
+
+class NodeEvent:
+    """Результат выполнения одного узла в одном запросе."""
+
+    __slots__ = ("query_id", "node", "mode", "elapsed", "rows_in", "rows_out")
+
+    def __init__(self, query_id, node, mode, elapsed, rows_in, rows_out):
+        """
+        Args:
+            query_id: номер запроса в пределах дерева
+            node: имя узла
+            mode: "list" (список записей) или "index" (колоночный каталог)
+            elapsed: время выполнения узла, секунды
+            rows_in, rows_out: число строк на входе и выходе
+        """
+        self.query_id = query_id
+        self.node = node
+        self.mode = mode
+        self.elapsed = elapsed
+        self.rows_in = rows_in
+        self.rows_out = rows_out
+
+    @property
+    def selectivity(self):
+        """Доля строк, оставшихся после узла."""
+        return self.rows_out / self.rows_in if self.rows_in else 1.0
+
+
+class NodeStats:
+    """Накопленная статистика одного узла."""
+
+    def __init__(self):
+        self.calls = 0
+        self.elapsed = 0.0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.time_histogram = [0] * len(TIME_BUCKET_LABELS)
+        self.selectivity_histogram = [0] * len(SELECTIVITY_BUCKET_LABELS)
+
+    def add(self, event):
+        self.calls += 1
+        self.elapsed += event.elapsed
+        self.rows_in += event.rows_in
+        self.rows_out += event.rows_out
+        self.time_histogram[bisect_right(TIME_BUCKETS, event.elapsed)] += 1
+        self.selectivity_histogram[bisect_right(SELECTIVITY_BUCKETS, event.selectivity)] += 1
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "total_ms": self.elapsed * 1000,
+            "mean_ms": self.elapsed * 1000 / self.calls if self.calls else 0.0,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "selectivity": self.rows_out / self.rows_in if self.rows_in else 1.0,
+            "time_histogram": dict(zip(TIME_BUCKET_LABELS, self.time_histogram)),
+            "selectivity_histogram": dict(zip(SELECTIVITY_BUCKET_LABELS,
+                                              self.selectivity_histogram)),
+        }
+
+
+class NodeStatsRecorder:
+    """
+    Хук CarDecisionTree: агрегирует события узлов.
+    Потокобезопасен — запись идёт из фонового поиска, чтение из окна.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.nodes = {}
+        self.last_query = []
+
+    def __call__(self, event):
+        with self._lock:
+            if not self.last_query or self.last_query[-1].query_id != event.query_id:
+                self.last_query = []
+            self.last_query.append(event)
+            self.nodes.setdefault(event.node, NodeStats()).add(event)
+
+    def reset(self):
+        with self._lock:
+            self.nodes = {}
+            self.last_query = []
+
+    def summary(self):
+        """Статистика по узлам в виде словаря (для экспорта в JSON)."""
+        with self._lock:
+            return {name: stats.to_dict() for name, stats in self.nodes.items()}
+
+    def format_last_query(self):
+        """Краткая строка по последнему запросу: узел, доля строк, время."""
+        with self._lock:
+            events = list(self.last_query)
+        return " → ".join(
+            f"{e.node} {e.selectivity:.0%} {e.elapsed * 1000:.2f} мс" for e in events
+        )
+
+    def format_summary(self):
+        """Текстовый отчёт по всем узлам."""
+        lines = []
+        for name, stats in self.summary().items():
+            lines.append(
+                f"{name}: вызовов {stats['calls']}, всего {stats['total_ms']:.2f} мс, "
+                f"в среднем {stats['mean_ms']:.3f} мс, строк {stats['rows_in']} → "
+                f"{stats['rows_out']} ({stats['selectivity']:.1%})"
+            )
+            lines.append("  время: " + ", ".join(
+                f"{label} {count}" for label, count in stats["time_histogram"].items() if count))
+            lines.append("  селективность: " + ", ".join(
+                f"{label} {count}" for label, count in stats["selectivity_histogram"].items()
+                if count))
+        return "\n".join(lines)
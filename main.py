@@ -1,27 +1,91 @@
 import sys
-from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                             QHBoxLayout, QLabel, QPushButton, QComboBox, 
-                             QGroupBox, QTableWidget, QTableWidgetItem, QHeaderView, 
-                             QMessageBox, QStatusBar)
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QFont
-from database import Database
-from decision_tree import CarDecisionTree
+from timing import StartupTimer
 
-# Логика подбора строится на дереве решений (decision_tree.py): БД → все авто → дерево фильтров → результаты
+# Замер запуска начинается до импорта PyQt6 (отчёт: python main.py --startup-report)
+STARTUP_TIMER = StartupTimer()
+
+with STARTUP_TIMER.phase("импорт PyQt6"):
+    from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
+                                 QHBoxLayout, QLabel, QPushButton, QComboBox, 
+                                 QGroupBox, QTableView, QHeaderView, 
+                                 QMessageBox, QStatusBar, QDockWidget, QPlainTextEdit,
+                                 QMenu, QFileDialog, QLineEdit)
+    from PyQt6.QtCore import Qt, QElapsedTimer, QThreadPool, QTimer
+    from PyQt6.QtGui import QFont, QKeySequence, QShortcut
+# database (SQLAlchemy) и expert_system импортируются в фоне при открытии каталога (StartupTask)
+with STARTUP_TIMER.phase("импорт модулей приложения"):
+    from config import POWER_OPTIONS, PRICE_OPTIONS
+    from results_model import CarResultsModel
+    from workers import ExportTask, FacetTask, SearchTask, SimilarTask, StartupTask, SyncTask
+    from instrumentation import NodeStatsRecorder
+
+# Логика подбора строится на дереве решений (decision_tree.py): БД → каталог (catalog.py) → дерево фильтров → результаты
+# Поиск идёт через ExpertSystem, поэтому повторные запросы обслуживаются из LRU-кэша
+# Поиск выполняется в фоновом потоке (workers.py), окно не блокируется
+
+# Задержка перед запуском поиска после нажатия кнопки (мс) и период обновления статуса
+SEARCH_DEBOUNCE_MS = 150
+# Задержка живого поиска после смены критерия в выпадающем списке (мс)
+LIVE_SEARCH_DEBOUNCE_MS = 30
+# Задержка поиска после ввода в строке текстового поиска (мс): набор слова — один поиск
+TEXT_SEARCH_DEBOUNCE_MS = 200
+SEARCH_STATUS_INTERVAL_MS = 100
 
 class CarSelectionApp(QMainWindow):
     """Подбор автомобиля по дереву решений (PyQt6). Логика от decision_tree.py."""
     
-    def __init__(self):
+    def __init__(self, startup_timer=None, startup_report=False, db_path=None,
+                 trace_nodes=False):
         super().__init__()
+        # Путь к БД (None — cars.db рядом с приложением)
+        self.db_path = db_path
+        self.startup_timer = startup_timer or StartupTimer()
+        # Печатать отчёт о времени запуска, когда каталог будет готов
+        self.startup_report = startup_report
+        # Статистика узлов дерева решений (включается ключом --trace-nodes)
+        self.node_stats = NodeStatsRecorder() if trace_nodes else None
         self.db = None
-        self.decision_tree = None
+        self.expert_system = None
         self.brands = []
         self.body_types = []
         self.current_results = []
         
-        self.init_ui()
+        # Фоновый поиск: один поток, устаревшие задачи отбрасываются по номеру поиска
+        self.search_pool = QThreadPool(self)
+        self.search_pool.setMaxThreadCount(1)
+        self.search_generation = 0
+        self.search_clock = QElapsedTimer()
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.start_search)
+        self.search_status_timer = QTimer(self)
+        self.search_status_timer.setInterval(SEARCH_STATUS_INTERVAL_MS)
+        self.search_status_timer.timeout.connect(self.update_search_status)
+        self.search_stage = ""
+        # Критерии запущенного поиска и (критерии, результаты, версия каталога) последнего
+        # завершённого — более узкий поиск сужает его результат без обращения к каталогу
+        self.search_criteria = None
+        self.search_version = None
+        self.search_base = None
+        # Автомобиль, для которого показаны похожие
+        self.similar_to = None
+        # Счётчики вариантов в выпадающих списках пересчитываются в фоне после смены критериев
+        self.facet_pool = QThreadPool(self)
+        self.facet_pool.setMaxThreadCount(1)
+        self.facet_generation = 0
+        self.facet_timer = QTimer(self)
+        self.facet_timer.setSingleShot(True)
+        self.facet_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.facet_timer.timeout.connect(self.start_facets)
+        # Выгрузка результатов и синхронизация с фидом: отдельный поток, чтобы не задерживать
+        # поиск (по одной файловой операции за раз)
+        self.export_pool = QThreadPool(self)
+        self.export_pool.setMaxThreadCount(1)
+        self.export_cancelled = False
+        
+        with self.startup_timer.phase("построение окна"):
+            self.init_ui()
         self.init_database()
         
     def init_ui(self):
@@ -104,6 +168,48 @@ class CarSelectionApp(QMainWindow):
         self.clear_button.clicked.connect(self.clear_filters)
         buttons_layout.addWidget(self.clear_button)
         
+        self.export_button = QPushButton("📥 Экспорт")
+        self.export_button.setFont(QFont("Arial", 11))
+        self.export_button.setMinimumHeight(50)
+        self.export_button.setStyleSheet("""
+            QPushButton {
+                background-color: #2980b9;
+                color: white;
+                border: none;
+                border-radius: 8px;
+                padding: 12px 25px;
+            }
+            QPushButton:hover {
+                background-color: #2471a3;
+            }
+            QPushButton:pressed {
+                background-color: #1f618d;
+            }
+        """)
+        self.export_button.clicked.connect(self.export_results)
+        buttons_layout.addWidget(self.export_button)
+
+        self.sync_button = QPushButton("🔄 Синхронизация")
+        self.sync_button.setFont(QFont("Arial", 11))
+        self.sync_button.setMinimumHeight(50)
+        self.sync_button.setStyleSheet("""
+            QPushButton {
+                background-color: #8e44ad;
+                color: white;
+                border: none;
+                border-radius: 8px;
+                padding: 12px 25px;
+            }
+            QPushButton:hover {
+                background-color: #7d3c98;
+            }
+            QPushButton:pressed {
+                background-color: #6c3483;
+            }
+        """)
+        self.sync_button.clicked.connect(self.sync_feed)
+        buttons_layout.addWidget(self.sync_button)
+        
         buttons_layout.addStretch()
         main_layout.addLayout(buttons_layout)
         
@@ -113,11 +219,11 @@ class CarSelectionApp(QMainWindow):
         results_label.setStyleSheet("color: #2c3e50; margin-top: 10px;")
         main_layout.addWidget(results_label)
         
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(6)
-        self.results_table.setHorizontalHeaderLabels([
-            "№", "Марка", "Модель", "Тип кузова", "Цена (руб.)", "Мощность (л.с.)"
-        ])
+        # Модель форматирует ячейки лениво и подгружает строки порциями
+        self.results_model = CarResultsModel(self)
+        self.results_table = QTableView()
+        self.results_table.setModel(self.results_model)
+        self.results_table.verticalHeader().setVisible(False)
         
         # Настройка таблицы
         header = self.results_table.horizontalHeader()
@@ -129,14 +235,14 @@ class CarSelectionApp(QMainWindow):
         header.setSectionResizeMode(5, QHeaderView.ResizeMode.ResizeToContents)  # Мощность
         
         self.results_table.setAlternatingRowColors(False)
-        self.results_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.results_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
         self.results_table.setFont(QFont("Arial", 14))
         self.results_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 gridline-color: #bdc3c7;
                 background-color: white;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 8px;
                 color: black;
             }
@@ -147,15 +253,18 @@ class CarSelectionApp(QMainWindow):
                 font-weight: bold;
                 border: none;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #3498db;
                 color: black;
             }
-            QTableWidget::item:hover {
+            QTableView::item:hover {
                 background-color: #e8f4f8;
             }
         """)
         
+        # Контекстное меню строки: похожие автомобили
+        self.results_table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.results_table.customContextMenuRequested.connect(self.show_results_menu)
         main_layout.addWidget(self.results_table)
         
         # Статусная строка
@@ -170,6 +279,8 @@ class CarSelectionApp(QMainWindow):
         """)
         self.setStatusBar(self.status_bar)
         self.status_bar.showMessage("Готов к работе")
+        if self.node_stats:
+            self.init_node_stats_panel()
         
         # Применяем стиль к главному окну
         self.setStyleSheet("""
@@ -195,27 +306,32 @@ class CarSelectionApp(QMainWindow):
             }
         """)
         
-    # Диапазоны для выпадающих списков (отображаемое название, min, max)
-    PRICE_OPTIONS = [
-        ("Любая", None, None),
-        ("до 1 млн", None, 1_000_000),
-        ("1 – 2 млн", 1_000_000, 2_000_000),
-        ("2 – 3 млн", 2_000_000, 3_000_000),
-        ("3 – 5 млн", 3_000_000, 5_000_000),
-        ("5 – 10 млн", 5_000_000, 10_000_000),
-        ("10+ млн", 10_000_000, None),
-    ]
-    POWER_OPTIONS = [
-        ("Любая", None, None),
-        ("до 100 л.с.", None, 100),
-        ("100 – 150 л.с.", 100, 150),
-        ("150 – 200 л.с.", 150, 200),
-        ("200 – 300 л.с.", 200, 300),
-        ("300+ л.с.", 300, None),
-    ]
+    def init_node_stats_panel(self):
+        """Статистика узлов: последний запрос в статусной строке, сводка — в панели (F12)."""
+        self.node_stats_label = QLabel()
+        self.status_bar.addPermanentWidget(self.node_stats_label)
+        self.node_stats_text = QPlainTextEdit()
+        self.node_stats_text.setReadOnly(True)
+        self.node_stats_dock = QDockWidget("Статистика узлов дерева", self)
+        self.node_stats_dock.setWidget(self.node_stats_text)
+        self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, self.node_stats_dock)
+        self.node_stats_dock.hide()
+        shortcut = QShortcut(QKeySequence("F12"), self)
+        shortcut.activated.connect(
+            lambda: self.node_stats_dock.setVisible(not self.node_stats_dock.isVisible())
+        )
+
+    def update_node_stats(self):
+        self.node_stats_label.setText(self.node_stats.format_last_query())
+        self.node_stats_text.setPlainText(self.node_stats.format_summary())
+
+    # Диапазоны для выпадающих списков (отображаемое название, min, max) — из config.py
+    PRICE_OPTIONS = PRICE_OPTIONS
+    POWER_OPTIONS = POWER_OPTIONS
 
     def create_filters(self, layout):
-        """Четыре выпадающих списка по критериям (порядок дерева: тип кузова → цена → марка → мощность)."""
+        """Выпадающие списки по критериям (порядок дерева: тип кузова → цена → марка → мощность)
+        и строка текстового поиска по марке, модели и описанию."""
         def add_row(label_text, combo):
             row = QHBoxLayout()
             lbl = QLabel(label_text + ":")
@@ -242,136 +358,414 @@ class CarSelectionApp(QMainWindow):
             self.power_combo.addItem(name, (min_p, max_p))
         add_row("Мощность", self.power_combo)
 
+        self.text_edit = QLineEdit()
+        self.text_edit.setPlaceholderText("Марка, модель или описание, например: Camry")
+        self.text_edit.setClearButtonEnabled(True)
+        add_row("Поиск", self.text_edit)
+
+        for combo in (self.body_type_combo, self.price_combo, self.brand_combo,
+                      self.power_combo):
+            combo.currentIndexChanged.connect(self.on_criteria_changed)
+        self.text_edit.textChanged.connect(self.on_text_changed)
+
     def clear_filters(self):
-        """Сброс выбора во всех выпадающих списках."""
+        """Сброс выбора во всех выпадающих списках и текстового запроса."""
         self.body_type_combo.setCurrentIndex(0)
         self.price_combo.setCurrentIndex(0)
         self.brand_combo.setCurrentIndex(0)
         self.power_combo.setCurrentIndex(0)
-        self.results_table.setRowCount(0)
+        self.text_edit.clear()
+        # Живой поиск, запланированный сменой выбора, при сбросе не нужен
+        self.cancel_search()
+        self.search_base = None
+        self.show_results([])
         self.status_bar.showMessage("Критерии сброшены")
         
     def init_database(self):
-        """Инициализация БД и дерева решений."""
-        try:
-            self.db = Database()
-            self.decision_tree = CarDecisionTree()
-            self.brands = self.db.get_unique_brands()
-            self.body_types = self.db.get_unique_body_types()
-            self.body_type_combo.addItem("Любой")
-            self.body_type_combo.addItems(self.body_types)
-            self.brand_combo.addItem("Любая")
-            self.brand_combo.addItems(self.brands)
-            
-            from sqlalchemy import func
-            from database import Car
-            try:
-                count = self.db.session.query(func.count(Car.id)).scalar()
-            except Exception:
-                count = len(self.db.get_all_cars())
-            self.status_bar.showMessage(
-                f"БД подключена. Автомобилей: {count}. Подбор по критериям."
-            )
-            
-        except Exception as e:
-            error_msg = str(e)
-            detailed_msg = (f"Ошибка подключения к базе данных:\n{error_msg}\n\n"
-                          f"Убедитесь, что:\n"
-                          f"1. Файл cars.db существует или может быть создан\n"
-                          f"2. У приложения есть права на чтение/запись в директорию")
-            
-            QMessageBox.critical(self, "Ошибка подключения", detailed_msg)
-            self.status_bar.showMessage("Ошибка подключения к базе данных")
+        """Открытие БД и загрузка каталога в фоне; критерии станут доступны по готовности."""
+        self.set_controls_enabled(False)
+        self.status_bar.showMessage("Открытие каталога…")
+        self.startup_pool = QThreadPool(self)
+        task = StartupTask(self.startup_timer, self.db_path)
+        task.signals.ready.connect(self.on_database_ready)
+        task.signals.failed.connect(self.on_database_failed)
+        self.startup_pool.start(task)
+
+    def set_controls_enabled(self, enabled):
+        """Критерии и кнопки доступны только при открытом каталоге."""
+        for widget in (self.body_type_combo, self.price_combo, self.brand_combo,
+                       self.power_combo, self.text_edit, self.search_button,
+                       self.clear_button, self.export_button, self.sync_button):
+            widget.setEnabled(enabled)
+
+    def on_database_ready(self, db, expert_system, catalog):
+        """Заполнение выпадающих списков из загруженного каталога (без отдельных запросов)."""
+        with self.startup_timer.phase("заполнение выпадающих списков"):
+            self.db = db
+            self.expert_system = expert_system
+            if self.node_stats:
+                expert_system.decision_tree.add_hook(self.node_stats)
+            self.fill_choices(catalog)
+            self.set_controls_enabled(True)
+        self.startup_timer.mark("каталог готов")
+        if self.startup_report:
+            print(self.startup_timer.report(), file=sys.stderr)
+        self.start_facets()
+        
+        self.status_bar.showMessage(
+            f"БД подключена. Автомобилей: {len(catalog)}. Подбор по критериям."
+        )
+
+    def fill_choices(self, catalog):
+        """Заполнить списки марок и типов кузова из каталога, сохранив выбранные значения."""
+        self.brands = sorted(catalog.brands)
+        self.body_types = sorted(catalog.body_types)
+        # Текст пункта может содержать счётчик, значение критерия хранится в данных пункта.
+        # Заполнение списков не считается сменой критериев (живой поиск не запускается)
+        for combo, any_text, values in ((self.body_type_combo, "Любой", self.body_types),
+                                        (self.brand_combo, "Любая", self.brands)):
+            combo.blockSignals(True)
+            selected = combo.currentData()
+            combo.clear()
+            combo.addItem(any_text, None)
+            for value in values:
+                combo.addItem(value, value)
+            combo.setCurrentIndex(max(combo.findData(selected), 0) if selected else 0)
+            combo.blockSignals(False)
+
+    def on_database_failed(self, error_msg):
+        detailed_msg = (f"Ошибка подключения к базе данных:\n{error_msg}\n\n"
+                      f"Убедитесь, что:\n"
+                      f"1. Файл cars.db существует или может быть создан\n"
+                      f"2. У приложения есть права на чтение/запись в директорию")
+        
+        QMessageBox.critical(self, "Ошибка подключения", detailed_msg)
+        self.status_bar.showMessage("Ошибка подключения к базе данных")
             
+    def collect_criteria(self):
+        """Критерии из выпадающих списков и строки текстового поиска."""
+        criteria = {}
+        body_type = self.body_type_combo.currentData()
+        if body_type:
+            criteria["body_type"] = body_type
+        price_data = self.price_combo.currentData()
+        if price_data and (price_data[0] is not None or price_data[1] is not None):
+            if price_data[0] is not None:
+                criteria["min_price"] = price_data[0]
+            if price_data[1] is not None:
+                criteria["max_price"] = price_data[1]
+        brand = self.brand_combo.currentData()
+        if brand:
+            criteria["brand"] = brand
+        power_data = self.power_combo.currentData()
+        if power_data and (power_data[0] is not None or power_data[1] is not None):
+            if power_data[0] is not None:
+                criteria["min_power"] = power_data[0]
+            if power_data[1] is not None:
+                criteria["max_power"] = power_data[1]
+        text = self.text_edit.text().strip()
+        if text:
+            criteria["text"] = text
+        return criteria
+
     def get_recommendations(self):
-        """Подбор по выбранным критериям из выпадающих списков (дерево решений)."""
-        if not self.db or not self.decision_tree:
+        """Подбор по выбранным критериям из выпадающих списков (дерево решений).
+        Повторные нажатия в пределах SEARCH_DEBOUNCE_MS объединяются в один поиск."""
+        if not self.expert_system:
             QMessageBox.critical(self, "Ошибка", "БД или дерево решений не инициализированы.")
             return
-        try:
-            criteria = {}
-            body_type = self.body_type_combo.currentText()
-            if body_type and body_type != "Любой":
-                criteria["body_type"] = body_type
-            price_data = self.price_combo.currentData()
-            if price_data and (price_data[0] is not None or price_data[1] is not None):
-                if price_data[0] is not None:
-                    criteria["min_price"] = price_data[0]
-                if price_data[1] is not None:
-                    criteria["max_price"] = price_data[1]
-            brand = self.brand_combo.currentText()
-            if brand and brand != "Любая":
-                criteria["brand"] = brand
-            power_data = self.power_combo.currentData()
-            if power_data and (power_data[0] is not None or power_data[1] is not None):
-                if power_data[0] is not None:
-                    criteria["min_power"] = power_data[0]
-                if power_data[1] is not None:
-                    criteria["max_power"] = power_data[1]
-            
-            # Логика от decision_tree: все авто → дерево решений → отфильтрованный список
-            all_cars = self.db.get_all_cars()
-            filtered = self.decision_tree.evaluate(all_cars, criteria)
-            results = sorted(filtered, key=lambda x: x["price"])
-            results = [
-                {
-                    "brand": c["brand"],
-                    "model": c["model"],
-                    "body_type": c["body_type"],
-                    "price": c["price"],
-                    "power": c["power"],
-                    "description": c.get("description", ""),
-                }
-                for c in results
-            ]
-            
-            self.current_results = results
-            self.results_table.setRowCount(0)
-            if not results:
-                self.results_table.setRowCount(1)
-                no_item = QTableWidgetItem("Нет автомобилей по выбранным критериям")
-                no_item.setFlags(Qt.ItemFlag.NoItemFlags)
-                self.results_table.setItem(0, 0, no_item)
-                self.results_table.setSpan(0, 0, 1, 6)
-                self.status_bar.showMessage("Ничего не найдено")
-                self.current_results = []
-            else:
-                self.results_table.setRowCount(len(results))
-                for i, car in enumerate(results):
-                    self.results_table.setItem(i, 0, QTableWidgetItem(str(i + 1)))
-                    self.results_table.setItem(i, 1, QTableWidgetItem(car["brand"]))
-                    self.results_table.setItem(i, 2, QTableWidgetItem(car["model"]))
-                    self.results_table.setItem(i, 3, QTableWidgetItem(car["body_type"]))
-                    formatted_price = f"{car['price']:,}".replace(",", " ")
-                    price_item = QTableWidgetItem(formatted_price)
-                    price_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-                    self.results_table.setItem(i, 4, price_item)
-                    power_item = QTableWidgetItem(str(car["power"]))
-                    power_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-                    self.results_table.setItem(i, 5, power_item)
-                self.status_bar.showMessage(f"Найдено {len(results)} автомобилей")
-                    
-        except ValueError as e:
-            QMessageBox.critical(self, "Ошибка ввода", 
-                               f"Введите корректные числовые значения.\n{str(e)}")
-            self.status_bar.showMessage("Ошибка ввода данных")
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Произошла ошибка: {str(e)}")
-            self.status_bar.showMessage("Ошибка при выполнении поиска")
+        self.search_timer.start(SEARCH_DEBOUNCE_MS)
+
+    def on_criteria_changed(self):
+        """Смена выбора в выпадающем списке: живой поиск и пересчёт счётчиков вариантов."""
+        if not self.expert_system:
+            return
+        self.search_timer.start(LIVE_SEARCH_DEBOUNCE_MS)
+        self.schedule_facets()
+
+    def on_text_changed(self):
+        """Ввод в строке текстового поиска: поиск и пересчёт счётчиков после паузы в наборе."""
+        if not self.expert_system:
+            return
+        self.search_timer.start(TEXT_SEARCH_DEBOUNCE_MS)
+        self.schedule_facets()
+
+    def start_search(self):
+        """Запуск поиска в фоновом потоке; предыдущий незавершённый поиск отменяется."""
+        self.search_generation += 1
+        # Задачи, ещё не начавшие выполнение, больше не нужны
+        self.search_pool.clear()
+        self.search_criteria = self.collect_criteria()
+        # Версия до запуска: если данные или каталог изменятся во время поиска, сужение
+        # его результата будет отклонено
+        self.search_version = self.expert_system.cache_version()
+        task = SearchTask(self.search_generation, self.expert_system,
+                          self.search_criteria, self.is_search_stale, self.search_base)
+        task.signals.progress.connect(self.on_search_progress)
+        task.signals.finished.connect(self.on_search_finished)
+        task.signals.relaxed.connect(self.on_search_relaxed)
+        task.signals.failed.connect(self.on_search_failed)
+        self.search_stage = "Поиск…"
+        self.search_clock.start()
+        self.search_status_timer.start()
+        self.update_search_status()
+        self.search_pool.start(task)
+
+    def cancel_search(self):
+        """Отменить запланированный и выполняющийся поиск: его результат будет отброшен."""
+        self.search_timer.stop()
+        self.search_status_timer.stop()
+        self.search_generation += 1
+        self.search_pool.clear()
+
+    def is_search_stale(self, generation):
+        """True, если после поиска generation был запущен более новый."""
+        return generation != self.search_generation
+
+    def update_search_status(self):
+        """Этап и время выполнения текущего поиска в статусной строке."""
+        elapsed = self.search_clock.elapsed() / 1000
+        self.status_bar.showMessage(f"{self.search_stage} {elapsed:.1f} с")
+
+    def on_search_progress(self, generation, stage):
+        if self.is_search_stale(generation):
+            return
+        self.search_stage = stage
+        self.update_search_status()
+
+    def on_search_failed(self, generation, error):
+        if self.is_search_stale(generation):
+            return
+        self.search_status_timer.stop()
+        QMessageBox.critical(self, "Ошибка", f"Произошла ошибка: {error}")
+        self.status_bar.showMessage("Ошибка при выполнении поиска")
+
+    def on_search_finished(self, generation, results, elapsed):
+        """Вывод результатов поиска в таблицу (в потоке интерфейса)."""
+        if self.is_search_stale(generation):
+            return
+        self.search_status_timer.stop()
+        self.search_base = (self.search_criteria, results, self.search_version)
+        self.show_results(results, "Нет автомобилей по выбранным критериям")
+        if not results:
+            self.status_bar.showMessage(f"Ничего не найдено ({elapsed:.3f} с)")
+        else:
+            self.status_bar.showMessage(f"Найдено {len(results)} автомобилей ({elapsed:.3f} с)")
+        if self.node_stats:
+            self.update_node_stats()
+
+    def on_search_relaxed(self, generation, ranked, elapsed):
+        """Точных совпадений нет: вывод ближайших вариантов по оценке (scoring.py)."""
+        if self.is_search_stale(generation):
+            return
+        self.search_status_timer.stop()
+        # Ослабленный результат нельзя сужать как результат исходных критериев
+        self.search_base = None
+        self.show_results(ranked.records)
+        self.status_bar.showMessage(
+            f"Точных совпадений нет, показаны ближайшие варианты: {len(ranked.records)} "
+            f"({', '.join(ranked.relaxed)}; {elapsed:.3f} с)"
+        )
+        if self.node_stats:
+            self.update_node_stats()
+
+    def show_results_menu(self, pos):
+        """Контекстное меню строки таблицы результатов."""
+        car = self.results_model.car_at(self.results_table.indexAt(pos).row())
+        if car is None or not self.expert_system:
+            return
+        menu = QMenu(self)
+        action = menu.addAction("Показать похожие автомобили")
+        action.triggered.connect(lambda: self.start_similar(car))
+        menu.exec(self.results_table.viewport().mapToGlobal(pos))
+
+    def start_similar(self, car):
+        """Поиск автомобилей, похожих на car, вместо текущего поиска."""
+        self.cancel_search()
+        self.search_base = None
+        self.similar_to = car
+        task = SimilarTask(self.search_generation, self.expert_system, car.id,
+                           self.is_search_stale)
+        task.signals.progress.connect(self.on_search_progress)
+        task.signals.finished.connect(self.on_similar_finished)
+        task.signals.failed.connect(self.on_search_failed)
+        self.search_stage = "Поиск похожих…"
+        self.search_clock.start()
+        self.search_status_timer.start()
+        self.update_search_status()
+        self.search_pool.start(task)
+
+    def on_similar_finished(self, generation, results, elapsed):
+        """Вывод похожих автомобилей в таблицу (в потоке интерфейса)."""
+        if self.is_search_stale(generation):
+            return
+        self.search_status_timer.stop()
+        car = self.similar_to
+        self.show_results(results, f"Нет автомобилей, похожих на {car.brand} {car.model}")
+        self.status_bar.showMessage(f"Похожие на {car.brand} {car.model}: {len(results)} "
+                                    f"автомобилей ({elapsed:.3f} с)")
+
+    def export_results(self):
+        """
+        Выгрузка показанных результатов в CSV или XLSX в фоне.
+        Результат поиска выгружается заново по его критериям потоком (все строки,
+        без записей в памяти), похожие и ближайшие варианты — списком из таблицы.
+        """
+        if self.search_base is not None:
+            source = dict(self.search_base[0])
+        elif self.current_results:
+            source = list(self.current_results)
+        else:
+            self.status_bar.showMessage("Нет результатов для выгрузки")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Экспорт результатов", "cars.xlsx",
+                                              "Excel (*.xlsx);;CSV (*.csv)")
+        if not path:
+            return
+        if not path.lower().endswith((".xlsx", ".csv")):
+            path += ".xlsx"
+        self.export_cancelled = False
+        self.export_button.setEnabled(False)
+        task = ExportTask(self.expert_system, source, path, self.is_export_cancelled)
+        task.signals.progress.connect(self.on_export_progress)
+        task.signals.finished.connect(self.on_export_finished)
+        task.signals.failed.connect(self.on_export_failed)
+        self.status_bar.showMessage(f"Выгрузка в {path}…")
+        self.export_pool.start(task)
+
+    def is_export_cancelled(self):
+        """True, если выгрузку нужно прервать (окно закрывается)."""
+        return self.export_cancelled
+
+    def on_export_progress(self, rows, total):
+        if total:
+            self.status_bar.showMessage(f"Выгрузка: {rows} из {total} строк")
+        else:
+            self.status_bar.showMessage(f"Выгрузка: {rows} строк")
+
+    def on_export_finished(self, report):
+        self.export_button.setEnabled(True)
+        self.status_bar.showMessage(str(report))
+
+    def on_export_failed(self, error):
+        self.export_button.setEnabled(True)
+        QMessageBox.critical(self, "Ошибка", f"Не удалось выгрузить результаты: {error}")
+        self.status_bar.showMessage("Ошибка при выгрузке")
+
+    def sync_feed(self):
+        """Синхронизация каталога с фидом дилера (CSV или JSONL) в фоне."""
+        path, _ = QFileDialog.getOpenFileName(self, "Синхронизация с фидом", "",
+                                              "Фид (*.csv *.jsonl *.ndjson)")
+        if not path:
+            return
+        self.sync_button.setEnabled(False)
+        task = SyncTask(self.expert_system, path)
+        task.signals.finished.connect(self.on_sync_finished)
+        task.signals.failed.connect(self.on_sync_failed)
+        self.status_bar.showMessage(f"Синхронизация с {path}…")
+        self.export_pool.start(task)
+
+    def on_sync_finished(self, changes, catalog):
+        """Обновить списки и показанные результаты по изменённому каталогу."""
+        self.sync_button.setEnabled(True)
+        self.fill_choices(catalog)
+        self.status_bar.showMessage(str(changes).splitlines()[0])
+        if changes:
+            self.search_base = None
+            if self.current_results:
+                self.start_search()
+            self.start_facets()
+
+    def on_sync_failed(self, error):
+        self.sync_button.setEnabled(True)
+        QMessageBox.critical(self, "Ошибка", f"Не удалось синхронизировать каталог: {error}")
+        self.status_bar.showMessage("Ошибка синхронизации")
+
+    def schedule_facets(self):
+        """Пересчитать счётчики вариантов после смены критериев (с задержкой)."""
+        self.facet_timer.start()
+
+    def start_facets(self):
+        """Запуск подсчёта вариантов в фоне; предыдущий незавершённый подсчёт отменяется."""
+        self.facet_generation += 1
+        self.facet_pool.clear()
+        task = FacetTask(self.facet_generation, self.expert_system, self.collect_criteria(),
+                         self.is_facets_stale)
+        task.signals.finished.connect(self.on_facets_finished)
+        self.facet_pool.start(task)
+
+    def is_facets_stale(self, generation):
+        """True, если после подсчёта generation был запущен более новый."""
+        return generation != self.facet_generation
+
+    def on_facets_finished(self, generation, facets):
+        """Показать счётчики в пунктах списков и отключить варианты без автомобилей."""
+        if self.is_facets_stale(generation):
+            return
+        self.apply_facet_counts(self.body_type_combo, "Любой", self.body_types,
+                                [facets.body_type.get(value, 0) for value in self.body_types])
+        self.apply_facet_counts(self.brand_combo, "Любая", self.brands,
+                                [facets.brand.get(value, 0) for value in self.brands])
+        self.apply_facet_counts(self.price_combo, None,
+                                [name for name, _, _ in self.PRICE_OPTIONS], facets.price)
+        self.apply_facet_counts(self.power_combo, None,
+                                [name for name, _, _ in self.POWER_OPTIONS], facets.power)
+
+    def apply_facet_counts(self, combo, any_text, names, counts):
+        """
+        Обновить пункты выпадающего списка: «название (число)», пустые пункты недоступны.
+
+        Args:
+            combo: QComboBox
+            any_text: текст пункта «любой» в начале списка или None, если он входит в names
+            names: названия пунктов по порядку
+            counts: число автомобилей для каждого пункта
+        """
+        model = combo.model()
+        first = 0
+        if any_text is not None:
+            combo.setItemText(0, f"{any_text} ({sum(counts)})")
+            first = 1
+        for offset, (name, count) in enumerate(zip(names, counts)):
+            row = first + offset
+            combo.setItemText(row, f"{name} ({count})")
+            # Пункт «любой» и текущий выбор остаются доступными
+            model.item(row).setEnabled(bool(count) or row == 0 or row == combo.currentIndex())
+
+    def show_results(self, results, empty_text=None):
+        """Передать результаты модели таблицы (строки создаются по мере прокрутки)."""
+        self.current_results = results
+        self.results_table.clearSpans()
+        self.results_model.set_results(results, empty_text)
+        if self.results_model.is_placeholder():
+            self.results_table.setSpan(0, 0, 1, self.results_model.columnCount())
     
     def closeEvent(self, event):
         """Обработка закрытия окна"""
+        self.cancel_search()
+        self.facet_timer.stop()
+        self.facet_generation += 1
+        self.facet_pool.clear()
+        # Незавершённая выгрузка прерывается, временный файл удаляется
+        self.export_cancelled = True
+        self.search_pool.waitForDone()
+        self.facet_pool.waitForDone()
+        self.export_pool.waitForDone()
+        self.startup_pool.waitForDone()
         if self.db:
             self.db.close()
         event.accept()
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    
-    # Установка стиля приложения
-    app.setStyle('Fusion')
+    with STARTUP_TIMER.phase("QApplication"):
+        app = QApplication(sys.argv)
+        
+        # Установка стиля приложения
+        app.setStyle('Fusion')
     
-    window = CarSelectionApp()
+    window = CarSelectionApp(STARTUP_TIMER, startup_report="--startup-report" in sys.argv,
+                             trace_nodes="--trace-nodes" in sys.argv)
     window.show()
+    STARTUP_TIMER.mark("окно показано")
     
     sys.exit(app.exec())
@@ -0,0 +1,76 @@
+"""
+Статистика кардинальностей для адаптивного порядка узлов дерева решений.
+Хранит число автомобилей по каждой марке и типу кузова и гистограммы (по квантилям)
+цены и мощности; по ним оценивается доля строк, которую оставит каждый узел.
+"""
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+# Число точек в гистограммах цены и мощности
+HISTOGRAM_SIZE = 1024
+
+
+class ColumnHistogram:
+    """Гистограмма равной глубины: отсортированная выборка квантилей колонки."""
+
+    def __init__(self, values, size=HISTOGRAM_SIZE, presorted=False):
+        """
+        Args:
+            values: значения колонки
+            size: число точек
+            presorted: значения уже отсортированы (индекс каталога) — выборка без сортировки
+        """
+        if not presorted:
+            values = sorted(values)
+        step = max(1, len(values) // size)
+        self.points = list(values[::step])
+
+    def fraction(self, low=None, high=None):
+        """Оценка доли значений в диапазоне [low, high] (None — без границы)."""
+        if not self.points:
+            return 0.0
+        start = 0 if low is None else bisect_left(self.points, low)
+        stop = len(self.points) if high is None else bisect_right(self.points, high)
+        return max(stop - start, 0) / len(self.points)
+
+
+class SelectivityStatistics:
+    """Статистика каталога для оценки селективности узлов."""
+
+    def __init__(self, total, brand_counts, body_type_counts, price_histogram,
+                 power_histogram):
+        self.total = total
+        self.brand_counts = brand_counts
+        self.body_type_counts = body_type_counts
+        self.price_histogram = price_histogram
+        self.power_histogram = power_histogram
+
+    @classmethod
+    def from_cars(cls, cars):
+        """Собрать статистику по списку словарей или CarRecord."""
+        return cls(
+            len(cars),
+            Counter(car.get("brand") for car in cars),
+            Counter(car.get("body_type") for car in cars),
+            ColumnHistogram(car.get("price", 0) for car in cars),
+            ColumnHistogram(car.get("power", 0) for car in cars),
+        )
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        """Собрать статистику по колоночному каталогу (счётчики — по спискам индекса)."""
+        index = catalog.index
+        return cls(
+            len(catalog),
+            {brand: len(index.brand_postings[code]) for code, brand in enumerate(catalog.brands)},
+            {body_type: len(index.body_type_postings[code])
+             for code, body_type in enumerate(catalog.body_types)},
+            ColumnHistogram(index.price_sorted, presorted=True),
+            ColumnHistogram(index.power_sorted, presorted=True),
+        )
+
+    def value_fraction(self, counts, value):
+        """Доля строк с точным значением value."""
+        if not self.total:
+            return 0.0
+        return counts.get(value, 0) / self.total
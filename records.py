@@ -0,0 +1,75 @@
+"""
+Компактное представление строки таблицы cars.
+Заменяет ORM-объекты и словари в результатах поиска: без состояния сессии,
+с доступом как по атрибутам, так и по ключам (record["price"], record.get("brand")).
+Описание загружается лениво — оно нужно только для подсказок.
+"""
+
+# Маркер «описание ещё не загружено» (None — допустимое значение описания)
+UNLOADED = object()
+
+
+class CarRecord:
+    """Строка каталога автомобилей."""
+
+    __slots__ = ("id", "brand", "model", "body_type", "price", "power",
+                 "_description", "_loader")
+
+    FIELDS = ("id", "brand", "model", "body_type", "price", "power", "description")
+
+    def __init__(self, id, brand, model, body_type, price, power,
+                 description=UNLOADED, loader=None):
+        """
+        Args:
+            id, brand, model, body_type, price, power: поля строки
+            description: описание или UNLOADED, если его нужно загрузить позже
+            loader: функция (id) -> description для ленивой загрузки
+        """
+        self.id = id
+        self.brand = brand
+        self.model = model
+        self.body_type = body_type
+        self.price = price
+        self.power = power
+        self._description = description
+        self._loader = loader
+
+    @property
+    def description(self):
+        """Описание автомобиля (загружается при первом обращении)."""
+        if self._description is UNLOADED:
+            self._description = self._loader(self.id) if self._loader else None
+            self._loader = None
+        return self._description
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def get(self, key, default=None):
+        """Доступ по ключу, как у словаря."""
+        if key not in self.FIELDS:
+            return default
+        return getattr(self, key)
+
+    def to_dict(self):
+        """Преобразование записи в словарь"""
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __eq__(self, other):
+        if not isinstance(other, CarRecord):
+            return NotImplemented
+        return (self.id, self.brand, self.model, self.body_type, self.price, self.power) == (
+            other.id, other.brand, other.model, other.body_type, other.price, other.power
+        )
+
+    def __hash__(self):
+        return hash((self.id, self.brand, self.model))
+
+    def __repr__(self):
+        return (f"CarRecord(id={self.id!r}, brand={self.brand!r}, model={self.model!r}, "
+                f"body_type={self.body_type!r}, price={self.price!r}, power={self.power!r})")
@@ -0,0 +1,107 @@
+"""
+Модель таблицы результатов подбора для QTableView.
+Ячейки форматируются только при отрисовке (data()), строки подгружаются порциями
+(canFetchMore/fetchMore), поэтому стоимость вывода зависит от видимых строк, а не от числа результатов.
+"""
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+# Количество строк, добавляемых в представление за одну подгрузку
+FETCH_BATCH = 200
+
+
+class CarResultsModel(QAbstractTableModel):
+    """Табличная модель над списком результатов (CarRecord или словари)."""
+
+    HEADERS = ["№", "Марка", "Модель", "Тип кузова", "Цена (руб.)", "Мощность (л.с.)"]
+    FIELDS = [None, "brand", "model", "body_type", "price", "power"]
+    NUMERIC_COLUMNS = (4, 5)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.results = []
+        self.loaded = 0
+        self.empty_text = None
+
+    def set_results(self, results, empty_text=None):
+        """
+        Заменить результаты.
+
+        Args:
+            results: список автомобилей (не копируется)
+            empty_text: текст единственной строки, если результатов нет
+        """
+        self.beginResetModel()
+        self.results = results
+        self.loaded = min(FETCH_BATCH, len(results))
+        self.empty_text = empty_text
+        self.endResetModel()
+
+    def is_placeholder(self):
+        """True, если вместо результатов показана строка с сообщением."""
+        return not self.results and self.empty_text is not None
+
+    def car_at(self, row):
+        """Автомобиль в строке row (или None для строки-сообщения)."""
+        if self.is_placeholder() or not 0 <= row < self.loaded:
+            return None
+        return self.results[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        if self.is_placeholder():
+            return 1
+        return self.loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self.loaded < len(self.results)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(FETCH_BATCH, len(self.results) - self.loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def flags(self, index):
+        if self.is_placeholder():
+            return Qt.ItemFlag.NoItemFlags
+        return super().flags(index)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if self.is_placeholder():
+            if role == Qt.ItemDataRole.DisplayRole and column == 0:
+                return self.empty_text
+            return None
+        car = self.results[row]
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return str(row + 1)
+            value = car[self.FIELDS[column]]
+            if column == 4:
+                return f"{value:,}".replace(",", " ")
+            return str(value)
+        if role == Qt.ItemDataRole.TextAlignmentRole and column in self.NUMERIC_COLUMNS:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        if role == Qt.ItemDataRole.ToolTipRole:
+            # Описание загружается лениво — только для строки под курсором
+            return car.get("description") or None
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
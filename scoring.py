@@ -0,0 +1,218 @@
+"""
+Ранжирование автомобилей после фильтров дерева решений.
+Жёсткие критерии отбирают кандидатов (CarDecisionTree.evaluate_rows), затем каждому
+кандидату начисляется взвешенная сумма мягких оценок в [0, 1]: мощность на рубль
+и близость цены и мощности к центру выбранного диапазона. Оценки считаются по колонкам
+каталога одним проходом на оценку, сохраняются только k лучших (heapq.nlargest —
+ограниченная куча, O(n log k)).
+Если подходящих автомобилей нет, критерии ослабляются по шагам (сначала расширяются
+диапазоны, затем снимаются фильтры: цены и мощности — раньше явно выбранных марки и типа
+кузова, текстовый запрос — последним), а оценки
+по-прежнему считаются от исходных критериев — выше оказываются варианты,
+ближайшие к запрошенному.
+"""
+import heapq
+
+from decision_tree import NODE_CRITERIA, without_node
+
+# Веса мягких оценок по умолчанию (0 — оценка не учитывается)
+DEFAULT_WEIGHTS = {"value": 1.0, "price_fit": 1.0, "power_fit": 0.5}
+# На какую долю расширяются диапазоны цены и мощности на первом шаге ослабления
+RELAX_RANGE_FACTOR = 0.25
+
+
+class RankedResult:
+    """Лучшие автомобили с оценками и описанием ослабления критериев."""
+
+    def __init__(self):
+        # Номера строк каталога, записи и оценки по убыванию оценки
+        self.rows = []
+        self.records = []
+        self.scores = []
+        # Число кандидатов, прошедших фильтры, и критерии, по которым они отобраны
+        self.candidates = 0
+        self.criteria = {}
+        # Применённые шаги ослабления (пусто — исходные критерии)
+        self.relaxed = []
+
+    def __repr__(self):
+        return (f"RankedResult(rows={len(self.rows)}, candidates={self.candidates}, "
+                f"relaxed={self.relaxed})")
+
+
+def _band(criteria, name):
+    """
+    Центр и полуширина диапазона критерия (None — диапазон не задан).
+    Без нижней границы диапазон считается от нуля, без верхней — центром
+    считается нижняя граница.
+    """
+    low, high = criteria.get(f"min_{name}"), criteria.get(f"max_{name}")
+    if low is None and high is None:
+        return None
+    if high is None:
+        return low, max(low, 1)
+    low = low or 0
+    return (low + high) / 2, max((high - low) / 2, 1)
+
+
+def _value_scores(prices, powers, criteria):
+    """Мощность на рубль относительно лучшей среди кандидатов."""
+    ratios = [power / price if price > 0 else 0.0 for price, power in zip(prices, powers)]
+    best = max(ratios, default=0.0)
+    if best <= 0:
+        return None
+    scale = 1 / best
+    return [ratio * scale for ratio in ratios]
+
+
+def _fit_scores(values, band):
+    """Близость к центру диапазона: 1 в центре, 1/2 на расстоянии полуширины."""
+    if band is None:
+        return None
+    centre, scale = band
+    return [scale / (scale + abs(value - centre)) for value in values]
+
+
+def _price_fit_scores(prices, powers, criteria):
+    """Близость цены к центру выбранного диапазона цены."""
+    return _fit_scores(prices, _band(criteria, "price"))
+
+
+def _power_fit_scores(prices, powers, criteria):
+    """Близость мощности к центру выбранного диапазона мощности."""
+    return _fit_scores(powers, _band(criteria, "power"))
+
+
+# Мягкие оценки: имя → функция (цены, мощности, критерии) -> список оценок или None
+SCORERS = {
+    "value": _value_scores,
+    "price_fit": _price_fit_scores,
+    "power_fit": _power_fit_scores,
+}
+
+
+def _widen_ranges(criteria):
+    relaxed = dict(criteria)
+    for name in ("price", "power"):
+        low, high = criteria.get(f"min_{name}"), criteria.get(f"max_{name}")
+        if low is not None:
+            relaxed[f"min_{name}"] = int(low * (1 - RELAX_RANGE_FACTOR))
+        if high is not None:
+            relaxed[f"max_{name}"] = int(high * (1 + RELAX_RANGE_FACTOR))
+    return relaxed
+
+
+# Шаги ослабления критериев (применяются по очереди, каждый — к результату предыдущего)
+RELAXATION_STEPS = (
+    ("расширены диапазоны цены и мощности", _widen_ranges),
+    ("без фильтра мощности", lambda criteria: without_node(criteria, "power")),
+    ("без фильтра цены", lambda criteria: without_node(criteria, "price")),
+    ("без фильтра марки", lambda criteria: without_node(criteria, "brand")),
+    ("без фильтра типа кузова", lambda criteria: without_node(criteria, "body_type")),
+    ("без текстового поиска", lambda criteria: without_node(criteria, "text")),
+)
+# Явный выбор пользователя: снимается только после фильтров цены и мощности
+PREFERENCE_NODES = ("brand", "body_type")
+
+
+def _check_relaxation_order(steps):
+    """
+    Проверить порядок шагов ослабления: пока фильтр цены или мощности ещё можно снять,
+    марка и тип кузова остаются в критериях (иначе на запрос «Toyota до 100 ₽» вернулись бы
+    дешёвые автомобили других марок).
+
+    Raises:
+        ValueError: шаг снимает марку или тип кузова раньше цены или мощности
+    """
+    criteria = {"brand": "Toyota", "body_type": "Седан", "min_price": 100, "max_price": 200,
+                "min_power": 100, "max_power": 200}
+    ranges = [key for name in ("price", "power") for key in NODE_CRITERIA[name]]
+    for label, relax in steps:
+        criteria = relax(criteria)
+        if any(key in criteria for key in ranges):
+            lost = [name for name in PREFERENCE_NODES
+                    if not any(key in criteria for key in NODE_CRITERIA[name])]
+            if lost:
+                raise ValueError(f"Шаг ослабления «{label}» снимает {', '.join(lost)} "
+                                 "раньше фильтров цены и мощности")
+
+
+_check_relaxation_order(RELAXATION_STEPS)
+
+
+def score_rows(catalog, rows, criteria, weights=None):
+    """
+    Взвешенная сумма мягких оценок для каждой строки.
+
+    Args:
+        catalog: CarCatalog
+        rows: номера строк кандидатов
+        criteria: критерии, от которых считается близость к диапазонам
+        weights: веса оценок (по умолчанию DEFAULT_WEIGHTS)
+
+    Returns:
+        список оценок в порядке rows
+    """
+    weights = DEFAULT_WEIGHTS if weights is None else weights
+    if isinstance(rows, range):
+        prices, powers = catalog.prices[rows.start:rows.stop], catalog.powers[rows.start:rows.stop]
+    else:
+        prices = list(map(catalog.prices.__getitem__, rows))
+        powers = list(map(catalog.powers.__getitem__, rows))
+    total = None
+    for name, weight in weights.items():
+        if not weight:
+            continue
+        scores = SCORERS[name](prices, powers, criteria)
+        if scores is None:
+            continue
+        if total is None:
+            total = [weight * score for score in scores]
+        else:
+            total = [value + weight * score for value, score in zip(total, scores)]
+    return total if total is not None else [0.0] * len(rows)
+
+
+def rank_catalog(tree, catalog, criteria, limit=20, weights=None, min_results=1):
+    """
+    Отобрать кандидатов деревом решений и вернуть limit лучших по оценке.
+    Если кандидатов меньше min_results, критерии ослабляются по RELAXATION_STEPS.
+    При равной оценке выше строка, раньше идущая в каталоге.
+
+    Args:
+        tree: CarDecisionTree
+        catalog: CarCatalog
+        criteria: критерии (жёсткие фильтры и центры диапазонов для оценок)
+        limit: сколько лучших автомобилей вернуть
+        weights: веса мягких оценок (по умолчанию DEFAULT_WEIGHTS)
+        min_results: сколько кандидатов нужно, чтобы не ослаблять критерии
+
+    Returns:
+        RankedResult
+    """
+    result = RankedResult()
+    effective = criteria
+    rows = tree.evaluate_rows(catalog, effective)
+    steps = iter(RELAXATION_STEPS)
+    while len(rows) < min_results:
+        step = next(steps, None)
+        if step is None:
+            break
+        label, relax = step
+        relaxed = relax(effective)
+        if relaxed == effective:
+            continue
+        effective = relaxed
+        result.relaxed.append(label)
+        rows = tree.evaluate_rows(catalog, effective)
+    result.candidates = len(rows)
+    result.criteria = dict(effective)
+    if not rows:
+        return result
+
+    scores = score_rows(catalog, rows, criteria, weights)
+    best = heapq.nlargest(limit, range(len(scores)), key=scores.__getitem__)
+    result.rows = [rows[position] for position in best]
+    result.scores = [scores[position] for position in best]
+    result.records = catalog.to_records(result.rows)
+    return result
@@ -0,0 +1,499 @@
+"""
+HTTP-сервис подбора автомобилей (JSON) для витрины и чат-бота на asyncio без сторонних библиотек.
+Каталог держится в памяти; подбор по нему (работа процессора) и чтение из БД (загрузка
+каталога, проверка версии данных, запросы в режиме SQL и текстовый поиск) выполняются
+в пуле потоков, цикл событий только принимает и отдаёт запросы. ExpertSystem общий
+для потоков пула: кэш результатов и замена каталога защищены блокировками. Каталог перечитывается в фоне,
+когда меняется версия данных в БД (PRAGMA user_version), и заменяется целиком после загрузки.
+
+Запросы (критерии — как в ExpertSystem.recommend):
+    GET  /recommend?body_type=Седан&max_price=3000000&limit=20&offset=0&order_by=-power
+    POST /recommend  {"brand": "Toyota", "min_power": 150, "limit": 20}
+    GET  /facets?brand=Toyota   (и POST с JSON)
+    GET  /catalog — размер каталога, версия данных, марки, типы кузова, диапазоны
+    GET  /metrics — число запросов и ошибок, задержки p50/p99 по маршрутам, кэш
+
+Запуск из командной строки:
+    python server.py [--host 127.0.0.1] [--port 8080] [--db cars.db] [--mode catalog]
+"""
+import argparse
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+import json
+import math
+import os
+import sys
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from config import CATALOG_SNAPSHOT_PATH, POWER_OPTIONS, PRICE_OPTIONS
+from decision_tree import CRITERIA_KEYS, ORDER_FIELDS, parse_order_by
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+# Размер страницы по умолчанию и наибольший допустимый
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 1000
+# Период проверки версии данных в БД (с)
+REFRESH_INTERVAL = 5.0
+# Сколько последних задержек хранить на маршрут для расчёта перцентилей
+LATENCY_WINDOW = 10_000
+# Ограничения на размер запроса
+MAX_HEADER_LINES = 100
+MAX_BODY_SIZE = 64 * 1024
+# Поля автомобиля в ответе (описание загружается из БД по одному и в списки не входит)
+CAR_FIELDS = ("id", "brand", "model", "body_type", "price", "power")
+# Строковые критерии; остальные — целые числа
+TEXT_CRITERIA = ("body_type", "brand", "text")
+# Параметры страницы результатов
+PAGE_PARAMS = ("limit", "offset", "order_by")
+
+
+class HTTPError(Exception):
+    """Ошибка запроса с кодом ответа HTTP."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def percentile(values, q):
+    """Перцентиль q (0–100) по методу ближайшего ранга; None для пустой выборки."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class RouteMetrics:
+    """Счётчики и последние задержки одного маршрута."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, seconds, failed=False):
+        self.requests += 1
+        self.errors += failed
+        self.latencies.append(seconds)
+
+    def to_dict(self):
+        """Счётчики и задержки p50/p99/max (мс) по последним LATENCY_WINDOW запросам."""
+        latencies = list(self.latencies)
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 3)
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "p50_ms": ms(percentile(latencies, 50)),
+            "p99_ms": ms(percentile(latencies, 99)),
+            "max_ms": ms(max(latencies, default=None)),
+        }
+
+
+class ServiceMetrics:
+    """Метрики сервиса по маршрутам."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.routes = {}
+
+    def add(self, route, seconds, failed=False):
+        self.routes.setdefault(route, RouteMetrics()).add(seconds, failed)
+
+    def to_dict(self):
+        return {
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "routes": {route: metrics.to_dict() for route, metrics in sorted(self.routes.items())},
+        }
+
+
+def parse_criteria(params):
+    """
+    Критерии подбора из параметров запроса или полей JSON.
+    Пустые значения пропускаются, числовые критерии приводятся к int.
+
+    Raises:
+        HTTPError: неизвестный критерий или значение не того типа (400)
+
+    Returns:
+        словарь критериев
+    """
+    criteria = {}
+    for key, value in params.items():
+        if key not in CRITERIA_KEYS:
+            raise HTTPError(400, f"Неизвестный параметр: {key}")
+        if value is None or value == "":
+            continue
+        if key in TEXT_CRITERIA:
+            if not isinstance(value, str):
+                raise HTTPError(400, f"Критерий {key} должен быть строкой")
+            criteria[key] = value
+        else:
+            if isinstance(value, (bool, float)):
+                raise HTTPError(400, f"Критерий {key} должен быть целым числом")
+            try:
+                criteria[key] = int(value)
+            except (TypeError, ValueError):
+                raise HTTPError(400, f"Критерий {key} должен быть целым числом") from None
+    return criteria
+
+
+def _int_param(params, name, default, low, high):
+    value = params.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        if isinstance(value, (bool, float)):
+            raise ValueError(value)
+        value = int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"Параметр {name} должен быть целым числом") from None
+    if not low <= value <= high:
+        raise HTTPError(400, f"Параметр {name} должен быть от {low} до {high}")
+    return value
+
+
+def parse_page(params):
+    """
+    Критерии и параметры страницы (limit, offset, order_by) запроса /recommend.
+
+    Returns:
+        кортеж (критерии, limit, offset, order_by)
+    """
+    limit = _int_param(params, "limit", DEFAULT_LIMIT, 1, MAX_LIMIT)
+    offset = _int_param(params, "offset", 0, 0, sys.maxsize)
+    order_by = params.get("order_by") or "price"
+    try:
+        parse_order_by(order_by)
+    except (AttributeError, ValueError):
+        raise HTTPError(400, f"Параметр order_by: одно из {', '.join(ORDER_FIELDS)} "
+                             f"(с «-» — по убыванию)") from None
+    criteria = parse_criteria({key: value for key, value in params.items()
+                               if key not in PAGE_PARAMS})
+    return criteria, limit, offset, order_by
+
+
+def car_to_json(car):
+    """Автомобиль в ответе (без описания)."""
+    return {field: car[field] for field in CAR_FIELDS}
+
+
+def _options_to_json(options):
+    return [{"name": name, "min": low, "max": high} for name, low, high in options]
+
+
+class RecommendationService:
+    """
+    Сервис подбора поверх ExpertSystem: тёплый каталог в памяти, фоновое
+    обновление при изменении данных и HTTP-обработчики маршрутов.
+    """
+
+    def __init__(self, expert_system, refresh_interval=REFRESH_INTERVAL, executor=None):
+        """
+        Args:
+            expert_system: ExpertSystem (режим "catalog" или "sql")
+            refresh_interval: период проверки версии данных в БД (с)
+            executor: пул потоков для подбора и чтения из БД (по умолчанию — по размеру пула
+                читателей Database без одного соединения, которое остаётся у потока
+                цикла событий; у каждого потока своё соединение)
+        """
+        self.expert_system = expert_system
+        self.db = expert_system.db
+        self.refresh_interval = refresh_interval
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=max(self.db.reader_pool_size - 1, 1), thread_name_prefix="db"
+        )
+        self.metrics = ServiceMetrics()
+        self.data_version = None
+        self.loaded_at = None
+        self._refresh_lock = asyncio.Lock()
+        self._refresher = None
+        self._server = None
+        # Открытые соединения: задача обработчика → writer
+        self._connections = {}
+        # Маршрут → (обработчик, допустимые методы)
+        self.routes = {
+            "/recommend": (self.recommend, ("GET", "POST")),
+            "/facets": (self.facets, ("GET", "POST")),
+            "/catalog": (self.catalog_info, ("GET",)),
+            "/metrics": (self.metrics_info, ("GET",)),
+        }
+
+    async def _blocking(self, func, *args):
+        """Выполнить блокирующую функцию (подбор, работу с БД) в пуле потоков."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _load(self, known_version):
+        """
+        Прочитать каталог, если версия данных в БД отличается от known_version
+        (выполняется в пуле потоков; текущий каталог продолжает обслуживать запросы).
+
+        Returns:
+            кортеж (версия данных, Database.catalog_version, каталог или None)
+        """
+        data_version = self.db.get_data_version()
+        if data_version == known_version:
+            return data_version, None, None
+        version = self.db.catalog_version
+        catalog = self.expert_system.load_catalog()
+        # Индексы и номера строк по id (для текстового поиска) строятся до того, как каталог
+        # начнёт обслуживать запросы, а не одновременно в нескольких потоках пула
+        catalog.index
+        catalog.row_of(None)
+        return data_version, version, catalog
+
+    async def refresh(self):
+        """Перечитать каталог, если данные в БД изменились."""
+        async with self._refresh_lock:
+            data_version, version, catalog = await self._blocking(self._load, self.data_version)
+            if catalog is not None:
+                self.expert_system.set_catalog(catalog, version)
+                self.loaded_at = time.time()
+            self.data_version = data_version
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except (OSError, SQLAlchemyError) as e:
+                print(f"Ошибка обновления каталога: {e}", file=sys.stderr)
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """
+        Загрузить каталог и начать принимать соединения.
+
+        Returns:
+            asyncio.Server (port=0 — свободный порт, см. server.sockets)
+        """
+        await self.refresh()
+        self._server = await asyncio.start_server(self.handle_connection, host, port)
+        self._refresher = asyncio.create_task(self._refresh_periodically())
+        return self._server
+
+    async def close(self):
+        """Остановить приём соединений, фоновое обновление и пул потоков."""
+        if self._refresher:
+            self._refresher.cancel()
+        if self._server:
+            self._server.close()
+        # Соединения keep-alive закрываются, обработчики завершаются сами
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self._server:
+            await self._server.wait_closed()
+        self.executor.shutdown(wait=True)
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Обслуживать запросы до отмены."""
+        server = await self.start(host, port)
+        address = ", ".join(str(sock.getsockname()[:2]) for sock in server.sockets)
+        print(f"Сервис подбора слушает {address}, каталог: {len(self.expert_system.catalog)} "
+              f"строк", file=sys.stderr)
+        try:
+            await server.serve_forever()
+        finally:
+            await self.close()
+
+    # Обработчики маршрутов: params — параметры запроса (и поля JSON для POST)
+
+    async def recommend(self, params):
+        criteria, limit, offset, order_by = parse_page(params)
+        # Подбор по каталогу на сотнях тысяч строк занимает миллисекунды процессора:
+        # в цикле событий он задерживал бы все остальные соединения
+        cars = await self._blocking(self.expert_system.recommend, criteria, limit, offset,
+                                    order_by)
+        return {
+            "criteria": criteria,
+            "limit": limit,
+            "offset": offset,
+            "order_by": order_by,
+            "count": len(cars),
+            "cars": [car_to_json(car) for car in cars],
+        }
+
+    async def facets(self, params):
+        criteria = parse_criteria(params)
+        facets = await self._blocking(self.expert_system.facets, criteria)
+        return {
+            "criteria": criteria,
+            "facets": facets.to_dict(),
+            "price_options": _options_to_json(PRICE_OPTIONS),
+            "power_options": _options_to_json(POWER_OPTIONS),
+        }
+
+    async def catalog_info(self, params):
+        catalog = self.expert_system.catalog
+        index = catalog.index
+
+        def value_range(values):
+            return {"min": values[0], "max": values[-1]} if len(values) else None
+
+        return {
+            "mode": self.expert_system.mode,
+            "rows": len(catalog),
+            "data_version": self.data_version,
+            "loaded_at": self.loaded_at,
+            "snapshot": catalog.read_only,
+            "brands": sorted(catalog.brands),
+            "body_types": sorted(catalog.body_types),
+            "price": value_range(index.price_sorted),
+            "power": value_range(index.power_sorted),
+            "price_options": _options_to_json(PRICE_OPTIONS),
+            "power_options": _options_to_json(POWER_OPTIONS),
+        }
+
+    async def metrics_info(self, params):
+        return dict(self.metrics.to_dict(), cache=self.expert_system.cache.stats())
+
+    # HTTP/1.1 поверх asyncio streams
+
+    async def handle_connection(self, reader, writer):
+        """Обслужить соединение: запросы читаются по одному, соединение держится (keep-alive)."""
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    self._write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                status, payload = await self._dispatch(method, target, body)
+                keep_alive = (version == "HTTP/1.1"
+                              and headers.get("connection", "").lower() != "close")
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self._connections[task]
+            writer.close()
+
+    async def _read_request(self, reader):
+        """
+        Прочитать строку запроса, заголовки и тело.
+
+        Returns:
+            кортеж (метод, путь, версия HTTP, заголовки, тело) или None, если клиент закрыл соединение
+        """
+        try:
+            line = await reader.readline()
+            if not line:
+                return None
+            try:
+                method, target, version = line.decode("latin-1").split()
+            except ValueError:
+                raise HTTPError(400, "Некорректная строка запроса") from None
+            headers = {}
+            for _ in range(MAX_HEADER_LINES):
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            else:
+                raise HTTPError(431, "Слишком много заголовков")
+        except ValueError:
+            # Строка длиннее буфера StreamReader
+            raise HTTPError(431, "Слишком длинная строка запроса или заголовок") from None
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HTTPError(400, "Некорректный Content-Length") from None
+        if not 0 <= length <= MAX_BODY_SIZE:
+            raise HTTPError(413, "Слишком большое тело запроса")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, version.upper(), headers, body
+
+    async def _dispatch(self, method, target, body):
+        """Вызвать обработчик маршрута и учесть задержку в метриках."""
+        started = time.perf_counter()
+        url = urlsplit(target)
+        route = self.routes.get(url.path)
+        failed = True
+        try:
+            if route is None:
+                raise HTTPError(404, f"Неизвестный путь: {url.path}")
+            handler, methods = route
+            if method not in methods:
+                raise HTTPError(405, f"Метод {method} не поддерживается для {url.path}")
+            params = dict(parse_qsl(url.query, keep_blank_values=True))
+            if method == "POST" and body:
+                try:
+                    data = json.loads(body)
+                except ValueError:
+                    raise HTTPError(400, "Тело запроса не является JSON") from None
+                if not isinstance(data, dict):
+                    raise HTTPError(400, "Тело запроса должно быть объектом JSON")
+                params.update(data)
+            payload = await handler(params)
+            failed = False
+            return HTTPStatus.OK, payload
+        except HTTPError as e:
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            print(f"Ошибка обработки {method} {target}: {e!r}", file=sys.stderr)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Внутренняя ошибка сервиса"}
+        finally:
+            if route is not None:
+                self.metrics.add(url.path, time.perf_counter() - started, failed)
+
+    @staticmethod
+    def _write_response(writer, status, payload, keep_alive=True):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        status = HTTPStatus(status)
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+
+
+def main(argv=None):
+    from database import Database
+    from expert_system import ExpertSystem
+
+    parser = argparse.ArgumentParser(description="HTTP-сервис подбора автомобилей (JSON)")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--db", help="путь к базе данных (по умолчанию cars.db приложения)")
+    parser.add_argument("--mode", choices=ExpertSystem.MODES, default="catalog",
+                        help="каталог в памяти или SQL-запрос на каждый подбор")
+    parser.add_argument("--refresh-interval", type=float, default=REFRESH_INTERVAL,
+                        help="период проверки изменений в БД (с)")
+    args = parser.parse_args(argv)
+
+    try:
+        db_path = os.path.abspath(args.db) if args.db else "cars.db"
+        with Database(db_path) as db:
+            snapshot_path = os.path.join(os.path.dirname(db.db_path), CATALOG_SNAPSHOT_PATH)
+            expert_system = ExpertSystem(db, mode=args.mode, snapshot_path=snapshot_path)
+            service = RecommendationService(expert_system, args.refresh_interval)
+            asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    except (OSError, ConnectionError, SQLAlchemyError) as e:
+        print(f"Ошибка сервиса подбора: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
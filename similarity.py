@@ -0,0 +1,136 @@
+"""
+Поиск похожих автомобилей (k ближайших соседей) по цене, мощности и типу кузова.
+Цена и мощность переводятся в логарифмическую шкалу (важна относительная разница)
+и нормируются на стандартное отклонение по каталогу; другой тип кузова добавляет
+к расстоянию постоянный штраф. Для каждого типа кузова строится равномерная сетка
+(ячейка → номера строк); запрос обходит ячейки кольцами от ячейки автомобиля
+и останавливается, как только k-е найденное расстояние не больше расстояния
+до ещё не просмотренных ячеек. Индекс строится один раз для версии каталога.
+"""
+from array import array
+import heapq
+import math
+from statistics import pstdev
+
+# Среднее число автомобилей в ячейке сетки
+CELL_SIZE_TARGET = 8
+# Штраф к расстоянию за другой тип кузова (в стандартных отклонениях)
+BODY_TYPE_PENALTY = 1.0
+
+
+def _scale(values):
+    """Множитель нормировки на стандартное отклонение (1 для вырожденной колонки)."""
+    deviation = pstdev(values) if len(values) > 1 else 0.0
+    return 1 / deviation if deviation else 1.0
+
+
+def _ring(cx, cy, radius):
+    """Ячейки на расстоянии radius от (cx, cy) по Чебышёву."""
+    if radius == 0:
+        yield cx, cy
+        return
+    for x in range(cx - radius, cx + radius + 1):
+        yield x, cy - radius
+        yield x, cy + radius
+    for y in range(cy - radius + 1, cy + radius):
+        yield cx - radius, y
+        yield cx + radius, y
+
+
+class SimilarityIndex:
+    """Сеточный индекс каталога в нормированном пространстве (цена, мощность) по типам кузова."""
+
+    def __init__(self, catalog, body_type_penalty=BODY_TYPE_PENALTY):
+        """
+        Args:
+            catalog: CarCatalog
+            body_type_penalty: штраф к расстоянию за другой тип кузова
+        """
+        self.catalog = catalog
+        self.body_type_penalty = body_type_penalty
+        log_prices = [math.log(max(price, 1)) for price in catalog.prices]
+        log_powers = [math.log(max(power, 1)) for power in catalog.powers]
+        self.price_scale = _scale(log_prices)
+        self.power_scale = _scale(log_powers)
+        self.xs = array("d", [value * self.price_scale for value in log_prices])
+        self.ys = array("d", [value * self.power_scale for value in log_powers])
+
+        self.x0 = min(self.xs, default=0.0)
+        self.y0 = min(self.ys, default=0.0)
+        width = max(self.xs, default=0.0) - self.x0
+        height = max(self.ys, default=0.0) - self.y0
+        cells = max(len(catalog) / CELL_SIZE_TARGET, 1)
+        if width * height > 0:
+            self.side = math.sqrt(width * height / cells)
+        else:
+            self.side = max(width, height) / cells or 1.0
+        # Число ячеек сетки по осям (за их пределами автомобилей нет)
+        self.columns = int(width // self.side) + 1
+        self.rows = int(height // self.side) + 1
+
+        self.grids = [{} for _ in catalog.body_types]
+        for row, (x, y, code) in enumerate(zip(self.xs, self.ys, catalog.body_type_codes)):
+            self.grids[code].setdefault(self._cell(x, y), []).append(row)
+
+    def _cell(self, x, y):
+        return int((x - self.x0) // self.side), int((y - self.y0) // self.side)
+
+    def nearest(self, row, k=10):
+        """
+        k строк, ближайших к строке row (сама строка не входит).
+
+        Returns:
+            список пар (расстояние, номер строки) по возрастанию расстояния
+        """
+        return self._search(self.xs[row], self.ys[row], self.catalog.body_type_codes[row], k,
+                            exclude=row)
+
+    def nearest_to(self, price, power, body_type=None, k=10):
+        """
+        k строк, ближайших к заданным цене, мощности и типу кузова
+        (None — тип кузова не учитывается).
+
+        Returns:
+            список пар (расстояние, номер строки) по возрастанию расстояния
+        """
+        x = math.log(max(price, 1)) * self.price_scale
+        y = math.log(max(power, 1)) * self.power_scale
+        code = self.catalog.body_type_code(body_type) if body_type is not None else None
+        return self._search(x, y, code, k, penalize=body_type is not None)
+
+    def _search(self, x, y, code, k, exclude=None, penalize=True):
+        if k <= 0:
+            return []
+        xs, ys, side = self.xs, self.ys, self.side
+        cx, cy = self._cell(x, y)
+        # Кольцо, за которым ячеек сетки уже нет
+        max_radius = max(abs(cx), abs(cx - self.columns), abs(cy), abs(cy - self.rows))
+        # Максимальная куча k лучших: (-квадрат расстояния, -строка)
+        best = []
+        codes = sorted(range(len(self.grids)), key=lambda other: other != code)
+        for other in codes:
+            grid = self.grids[other]
+            extra = self.body_type_penalty ** 2 if penalize and other != code else 0.0
+            if not grid or (len(best) == k and -best[0][0] <= extra):
+                continue
+            for radius in range(max_radius + 1):
+                if radius and len(best) == k:
+                    # Необработанные ячейки не ближе (radius - 1) сторон ячейки
+                    reach = (radius - 1) * side
+                    if -best[0][0] <= reach * reach + extra:
+                        break
+                for cell in _ring(cx, cy, radius):
+                    rows = grid.get(cell)
+                    if not rows:
+                        continue
+                    for row in rows:
+                        if row == exclude:
+                            continue
+                        dx = xs[row] - x
+                        dy = ys[row] - y
+                        item = (-(dx * dx + dy * dy + extra), -row)
+                        if len(best) < k:
+                            heapq.heappush(best, item)
+                        elif item > best[0]:
+                            heapq.heapreplace(best, item)
+        return [(math.sqrt(-distance), -row) for distance, row in sorted(best, reverse=True)]
@@ -0,0 +1,288 @@
+"""
+Двоичный снимок каталога автомобилей для отображения в память (mmap).
+Файл содержит колонки фиксированной ширины (id, цена, мощность, коды марки и типа кузова),
+словари строк и готовые индексы CatalogIndex. Процессы открывают его через mmap
+и работают с колонками через memoryview без копирования: запуск не зависит от размера
+каталога, а страницы файла разделяются всеми процессами через кэш ОС.
+Снимок помечен версией данных БД (PRAGMA user_version) и перестаёт использоваться,
+если данные в БД изменились.
+
+Запуск из командной строки:
+    python snapshot.py [--db cars.db] [--output cars.snapshot]
+"""
+import argparse
+from array import array
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+from catalog import CarCatalog, CatalogIndex
+from records import UNLOADED
+
+MAGIC = b"CARSNAP\0"
+# Версия формата файла; снимки другой версии не открываются
+FORMAT_VERSION = 1
+# Заголовок: сигнатура, версия формата, порядок байт (1 — little-endian), версия данных, строк
+HEADER = struct.Struct("<8sHHqq")
+# Запись таблицы разделов: смещение и длина в байтах
+SECTION = struct.Struct("<qq")
+# Разделы файла и формат их элементов (для memoryview.cast)
+SECTIONS = (
+    ("ids", "q"),
+    ("prices", "q"),
+    ("powers", "q"),
+    ("brand_codes", "i"),
+    ("body_type_codes", "i"),
+    ("model_offsets", "q"),
+    ("model_data", "B"),
+    ("brand_offsets", "q"),
+    ("brand_data", "B"),
+    ("body_type_offsets", "q"),
+    ("body_type_data", "B"),
+    ("brand_posting_offsets", "q"),
+    ("brand_postings", "q"),
+    ("body_type_posting_offsets", "q"),
+    ("body_type_postings", "q"),
+    ("price_order", "q"),
+    ("price_sorted", "q"),
+    ("power_order", "q"),
+    ("power_sorted", "q"),
+)
+# Выравнивание разделов в файле
+ALIGNMENT = 8
+
+
+class SnapshotError(ValueError):
+    """Файл не является снимком подходящей версии или устарел."""
+
+
+class StringColumn:
+    """Колонка строк снимка: смещения и UTF-8 данные, строка декодируется при обращении."""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return str(self.data[self.offsets[row]:self.offsets[row + 1]], "utf-8")
+
+
+class UnloadedColumn:
+    """Колонка описаний снимка: описания в файл не входят и загружаются из БД лениво."""
+
+    def __init__(self, length):
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, row):
+        if not 0 <= row < self.length:
+            raise IndexError(row)
+        return UNLOADED
+
+
+def _encode_strings(values):
+    """Строки в виде (смещения, данные UTF-8)."""
+    offsets = array("q", [0])
+    data = bytearray()
+    for value in values:
+        data += value.encode("utf-8")
+        offsets.append(len(data))
+    return offsets.tobytes(), bytes(data)
+
+
+def _encode_postings(postings):
+    """Списки строк по кодам в виде (смещения, строки подряд)."""
+    offsets = array("q", [0])
+    rows = array("q")
+    for posting in postings:
+        rows.extend(array("q", posting))
+        offsets.append(len(rows))
+    return offsets.tobytes(), rows.tobytes()
+
+
+def write_snapshot(db, path):
+    """
+    Выгрузить таблицу cars в файл снимка.
+    Файл записывается во временный и атомарно заменяет старый: процессы,
+    уже отобразившие прежний снимок, продолжают работать с ним.
+
+    Args:
+        db: Database
+        path: путь к файлу снимка
+
+    Returns:
+        число строк в снимке
+    """
+    data_version = db.get_data_version()
+    catalog = db.load_catalog()
+    index = catalog.index
+    sections = {
+        "ids": catalog.ids.tobytes(),
+        "prices": catalog.prices.tobytes(),
+        "powers": catalog.powers.tobytes(),
+        "brand_codes": array("i", catalog.brand_codes).tobytes(),
+        "body_type_codes": array("i", catalog.body_type_codes).tobytes(),
+        "price_order": array("q", index.price_order).tobytes(),
+        "price_sorted": index.price_sorted.tobytes(),
+        "power_order": array("q", index.power_order).tobytes(),
+        "power_sorted": index.power_sorted.tobytes(),
+    }
+    sections["model_offsets"], sections["model_data"] = _encode_strings(catalog.models)
+    sections["brand_offsets"], sections["brand_data"] = _encode_strings(catalog.brands)
+    sections["body_type_offsets"], sections["body_type_data"] = _encode_strings(
+        catalog.body_types
+    )
+    sections["brand_posting_offsets"], sections["brand_postings"] = _encode_postings(
+        index.brand_postings
+    )
+    sections["body_type_posting_offsets"], sections["body_type_postings"] = _encode_postings(
+        index.body_type_postings
+    )
+
+    byte_order = 1 if sys.byteorder == "little" else 0
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, byte_order, data_version, len(catalog))
+    offset = HEADER.size + SECTION.size * len(SECTIONS)
+    table = []
+    for name, _ in SECTIONS:
+        offset += -offset % ALIGNMENT
+        table.append((offset, len(sections[name])))
+        offset += len(sections[name])
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            for entry in table:
+                f.write(SECTION.pack(*entry))
+            for (name, _), (offset, _) in zip(SECTIONS, table):
+                f.write(b"\0" * (offset - f.tell()))
+                f.write(sections[name])
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(catalog)
+
+
+class CatalogSnapshot:
+    """Файл снимка, отображённый в память только для чтения."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse()
+        except (struct.error, TypeError, ValueError) as e:
+            # Отображение закрывается сборщиком мусора вместе с созданными memoryview
+            raise SnapshotError(f"{path}: {e}") from e
+
+    def _parse(self):
+        magic, format_version, byte_order, self.data_version, self.rows = HEADER.unpack_from(
+            self._mmap
+        )
+        if magic != MAGIC:
+            raise SnapshotError("файл не является снимком каталога")
+        if format_version != FORMAT_VERSION:
+            raise SnapshotError(f"неподдерживаемая версия формата {format_version}")
+        if byte_order != (1 if sys.byteorder == "little" else 0):
+            raise SnapshotError("снимок записан на платформе с другим порядком байт")
+        view = memoryview(self._mmap)
+        self.sections = {}
+        for number, (name, fmt) in enumerate(SECTIONS):
+            offset, length = SECTION.unpack_from(self._mmap, HEADER.size + SECTION.size * number)
+            self.sections[name] = view[offset:offset + length].cast(fmt)
+
+    def _strings(self, name):
+        return StringColumn(self.sections[f"{name}_offsets"], self.sections[f"{name}_data"])
+
+    def _postings(self, name):
+        offsets = self.sections[f"{name}_posting_offsets"]
+        rows = self.sections[f"{name}_postings"]
+        return [rows[offsets[code]:offsets[code + 1]] for code in range(len(offsets) - 1)]
+
+    def catalog(self):
+        """
+        Каталог над отображёнными колонками (без копирования) с готовыми индексами.
+        Каталог доступен только для чтения и держит снимок открытым.
+
+        Returns:
+            CarCatalog
+        """
+        sections = self.sections
+        catalog = CarCatalog()
+        catalog.ids = sections["ids"]
+        catalog.prices = sections["prices"]
+        catalog.powers = sections["powers"]
+        catalog.brand_codes = sections["brand_codes"]
+        catalog.body_type_codes = sections["body_type_codes"]
+        catalog.models = self._strings("model")
+        catalog.descriptions = UnloadedColumn(self.rows)
+        catalog.brands = list(self._strings("brand"))
+        catalog.body_types = list(self._strings("body_type"))
+        catalog._brand_codes = {brand: code for code, brand in enumerate(catalog.brands)}
+        catalog._body_type_codes = {
+            body_type: code for code, body_type in enumerate(catalog.body_types)
+        }
+        catalog._index = CatalogIndex.from_parts(
+            self._postings("brand"), self._postings("body_type"),
+            sections["price_order"], sections["price_sorted"],
+            sections["power_order"], sections["power_sorted"],
+        )
+        catalog.snapshot = self
+        return catalog
+
+
+def open_catalog(path, data_version=None):
+    """
+    Открыть снимок и вернуть каталог над ним.
+
+    Args:
+        path: путь к файлу снимка
+        data_version: ожидаемая версия данных БД (Database.get_data_version());
+            None — не проверять
+
+    Raises:
+        OSError: файл не открывается
+        SnapshotError: файл повреждён, другой версии формата или устарел
+
+    Returns:
+        CarCatalog только для чтения
+    """
+    snapshot = CatalogSnapshot(path)
+    if data_version is not None and snapshot.data_version != data_version:
+        raise SnapshotError(f"снимок устарел (версия данных {snapshot.data_version}, "
+                            f"в БД {data_version})")
+    return snapshot.catalog()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Выгрузка каталога в файл снимка для mmap")
+    parser.add_argument("--db", help="путь к базе данных (по умолчанию cars.db приложения)")
+    parser.add_argument("--output", default="cars.snapshot", help="файл снимка")
+    args = parser.parse_args(argv)
+
+    from sqlalchemy.exc import SQLAlchemyError
+    from database import Database
+
+    try:
+        db_path = os.path.abspath(args.db) if args.db else "cars.db"
+        with Database(db_path) as db:
+            rows = write_snapshot(db, args.output)
+    except (OSError, ConnectionError, SQLAlchemyError) as e:
+        print(f"Ошибка выгрузки снимка: {e}", file=sys.stderr)
+        return 1
+    print(f"Снимок {args.output}: {rows} строк, {os.path.getsize(args.output)} байт")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Инкрементальная синхронизация таблицы cars с фидом дилера.
+Фид сравнивается с таблицей по естественному ключу (brand, model, body_type):
+новые и изменённые строки записываются пачками INSERT ... ON CONFLICT DO UPDATE,
+исчезнувшие из фида — удаляются (если в фиде нет отклонённых строк: строка
+с ошибкой не означает, что автомобиль снят с продажи). Результат — набор изменений (ChangeSet),
+который каталоги в памяти применяют без полной перезагрузки.
+
+Запуск из командной строки:
+    python sync.py feed.csv [--format csv|jsonl] [--keep-missing] [--force]
+"""
+import argparse
+from functools import lru_cache
+import os
+import sys
+import time
+
+from sqlalchemy import delete
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import Database, cars_table
+from importer import (DEFAULT_BATCH_SIZE, READERS, ImportReport, chunked, detect_format,
+                      upsert_statement, validate_rows)
+from records import CarRecord
+
+
+class ChangeSet:
+    """Изменения каталога после синхронизации."""
+
+    def __init__(self, base_version=None, version=None):
+        # Версии каталога Database до и после синхронизации
+        self.base_version = base_version
+        self.version = version
+        self.inserted = []
+        self.updated = []
+        self.deleted = []
+        self.unchanged = 0
+        # Удаление пропущено: в фиде есть отклонённые строки
+        self.deletion_skipped = False
+        self.report = ImportReport()
+
+    def __bool__(self):
+        return bool(self.inserted or self.updated or self.deleted)
+
+    def __str__(self):
+        text = (f"Добавлено {len(self.inserted)}, обновлено {len(self.updated)}, "
+                f"удалено {len(self.deleted)}, без изменений {self.unchanged}, "
+                f"отклонено {self.report.rejected} ({self.report.seconds:.2f} с)")
+        if self.deletion_skipped:
+            text += ("\nОтсутствующие в фиде строки не удалены: в фиде есть отклонённые строки "
+                     "(--force — удалить всё равно)")
+        return text
+
+
+# Сколько ключей искать в таблице одним запросом (3 параметра на ключ)
+LOOKUP_CHUNK_SIZE = 300
+# Временная таблица id строк, встреченных в фиде (для удаления отсутствующих)
+SEEN_TABLE = "sync_seen"
+
+
+@lru_cache(maxsize=None)
+def _lookup_sql(count):
+    """
+    Запрос строк по count ключам. Ключи объединяются через OR: каждый ищется по уникальному
+    индексу (IN по кортежам SQLite выполняет полным просмотром индекса). Текст запроса
+    собирается строкой — построение выражений SQLAlchemy на каждый ключ дороже самого поиска.
+    """
+    condition = " OR ".join(["(brand = ? AND model = ? AND body_type = ?)"] * count)
+    return ("SELECT brand, model, body_type, id, price, power, description FROM cars "
+            f"WHERE {condition}")
+
+
+def _existing_rows(conn, keys):
+    """Строки таблицы с данными естественными ключами: ключ → (id, price, power, description)."""
+    found = {}
+    for chunk in chunked(keys, LOOKUP_CHUNK_SIZE):
+        params = tuple(value for key in chunk for value in key)
+        rows = conn.exec_driver_sql(_lookup_sql(len(chunk)), params)
+        found.update(((brand, model, body_type), rest) for brand, model, body_type, *rest in rows)
+    return found
+
+
+def _missing_ids(conn, batch_size):
+    """id строк таблицы, которых не было в фиде (пачками)."""
+    result = conn.exec_driver_sql(
+        f"SELECT id FROM cars WHERE id NOT IN (SELECT id FROM temp.{SEEN_TABLE}) ORDER BY id"
+    )
+    while True:
+        ids = [car_id for car_id, in result.fetchmany(batch_size)]
+        if not ids:
+            return
+        yield ids
+
+
+def sync_cars(db, rows, batch_size=DEFAULT_BATCH_SIZE, delete_missing=True, force=False):
+    """
+    Синхронизировать таблицу cars с фидом.
+    Фид обрабатывается пачками: для каждой пачки из таблицы читаются только строки с её
+    ключами, а id встреченных строк копятся во временной таблице SQLite, поэтому память
+    зависит от размера пачки и числа изменений, а не от размеров таблицы и фида.
+
+    Args:
+        db: Database
+        rows: итерируемое словарей фида (например, importer.read_csv(path))
+        batch_size: размер пачки upsert/delete
+        delete_missing: удалить строки, которых нет в фиде
+        force: удалять и тогда, когда часть строк фида отклонена (иначе автомобиль
+            с ошибкой в строке фида был бы удалён из каталога)
+
+    Returns:
+        ChangeSet с записями CarRecord для добавленных и изменённых строк и id удалённых
+    """
+    changes = ChangeSet(base_version=db.catalog_version)
+    started = time.perf_counter()
+    statement = upsert_statement()
+    # id новых строк возвращаются из той же пачки (RETURNING в порядке параметров)
+    returning = statement.returning(cars_table.c.id, sort_by_parameter_order=True)
+    # id → CarRecord: ключ, повторённый в фиде, даёт одну запись (побеждает последняя строка)
+    inserted = {}
+    updated = {}
+    with db.engine.begin() as conn:
+        if delete_missing:
+            conn.exec_driver_sql(
+                f"CREATE TEMP TABLE IF NOT EXISTS {SEEN_TABLE} (id INTEGER PRIMARY KEY)"
+            )
+            conn.exec_driver_sql(f"DELETE FROM temp.{SEEN_TABLE}")
+        for batch in chunked(validate_rows(rows, changes.report), batch_size):
+            pending = {}
+            for car in batch:
+                # При повторе ключа в пачке побеждает последняя строка
+                pending[(car["brand"], car["model"], car["body_type"])] = car
+            existing = _existing_rows(conn, list(pending))
+            seen = []
+            new_keys = []
+            updates = []
+            for key, car in pending.items():
+                current = existing.get(key)
+                if current is None:
+                    new_keys.append(key)
+                    continue
+                car_id = current[0]
+                seen.append(car_id)
+                if tuple(current[1:]) == (car["price"], car["power"], car["description"]):
+                    changes.unchanged += 1
+                    continue
+                updates.append(car)
+                record = CarRecord(car_id, *key, car["price"], car["power"], car["description"])
+                # Строка, добавленная раньше в этой же синхронизации, остаётся добавленной
+                (inserted if car_id in inserted else updated)[car_id] = record
+            for chunk in chunked(updates, batch_size):
+                conn.execute(statement, chunk)
+                changes.report.updated += len(chunk)
+            if new_keys:
+                cars = [pending[key] for key in new_keys]
+                ids = conn.execute(returning, cars).scalars().all()
+                for key, car, car_id in zip(new_keys, cars, ids):
+                    inserted[car_id] = CarRecord(car_id, *key, car["price"], car["power"],
+                                                 car["description"])
+                    seen.append(car_id)
+                changes.report.inserted += len(new_keys)
+            if delete_missing and seen:
+                conn.exec_driver_sql(f"INSERT OR IGNORE INTO temp.{SEEN_TABLE} (id) VALUES (?)",
+                                     [(car_id,) for car_id in seen])
+        changes.deletion_skipped = delete_missing and changes.report.rejected > 0 and not force
+        if delete_missing and not changes.deletion_skipped:
+            # Список id собирается до удаления: курсор не читает таблицу, которую меняет
+            changes.deleted = [car_id for ids in _missing_ids(conn, batch_size) for car_id in ids]
+            for chunk in chunked(changes.deleted, batch_size):
+                conn.execute(delete(cars_table).where(cars_table.c.id.in_(chunk)))
+        if delete_missing:
+            conn.exec_driver_sql(f"DROP TABLE temp.{SEEN_TABLE}")
+    changes.inserted = list(inserted.values())
+    changes.updated = list(updated.values())
+    changes.report.seconds = time.perf_counter() - started
+    changes.version = db.bump_catalog_version() if changes else db.catalog_version
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Синхронизация cars.db с фидом дилера")
+    parser.add_argument("path", help="файл CSV или JSONL")
+    parser.add_argument("--format", choices=sorted(READERS), help="формат файла")
+    parser.add_argument("--db", help="путь к базе данных (по умолчанию cars.db приложения)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--keep-missing", action="store_true",
+                        help="не удалять строки, которых нет в фиде")
+    parser.add_argument("--force", action="store_true",
+                        help="удалять отсутствующие строки, даже если часть строк фида отклонена")
+    args = parser.parse_args(argv)
+
+    try:
+        fmt = args.format or detect_format(args.path)
+        db_path = os.path.abspath(args.db) if args.db else "cars.db"
+        # Пустая база не заполняется демонстрационным каталогом: в ней будет только фид
+        with Database(db_path, populate=False) as db:
+            changes = sync_cars(db, READERS[fmt](args.path), args.batch_size,
+                                delete_missing=not args.keep_missing, force=args.force)
+    except (OSError, ValueError, ConnectionError, SQLAlchemyError) as e:
+        print(f"Ошибка синхронизации: {e}", file=sys.stderr)
+        return 1
+    print(changes)
+    for error in changes.report.errors:
+        print(error)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+Текстовый поиск по марке, модели и описанию через полнотекстовый индекс FTS5
+(таблица cars_fts в database.py, синхронизируется с cars триггерами).
+Запрос разбивается на слова, каждое ищется по началу слова ("cam" находит Camry),
+слова объединяются через AND. Если по запросу ничего не найдено, слова, которых нет
+в словаре индекса, заменяются ближайшими словами словаря ("camri" → camry): кандидаты
+отбираются по общим триграммам, затем проверяется расстояние Левенштейна.
+Словарь и триграммный индекс строятся один раз для версии данных.
+Результат (TextMatch) — множество id автомобилей, которое узел "text" дерева решений
+пересекает с остальными фильтрами; в режиме SQL запрос FTS5 становится подзапросом.
+"""
+from array import array
+from collections import Counter
+import re
+import threading
+
+from catalog import Postings
+from database import text_match_clause
+
+# Слова короче не исправляются (слишком много близких слов)
+FUZZY_MIN_LENGTH = 4
+# Допустимое расстояние редактирования: 1, для слов от FUZZY_LONG_WORD символов — 2
+FUZZY_LONG_WORD = 7
+# Сколько ближайших слов словаря подставляется вместо слова с опечаткой
+FUZZY_MAX_TERMS = 5
+
+# Слово — последовательность букв и цифр (как в токенизаторе unicode61)
+_WORD = re.compile(r"[^\W_]+")
+
+
+def tokenize(text):
+    """Слова запроса в нижнем регистре."""
+    return _WORD.findall(text.casefold())
+
+
+def normalize_text(text):
+    """Каноническая форма текстового запроса (для ключей кэша и сравнения запросов)."""
+    return " ".join(tokenize(text))
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def match_expression(groups):
+    """
+    Запрос FTS5 MATCH: группы слов через AND, слова внутри группы через OR.
+    Первое слово группы (из запроса) ищется по началу слова, замены — целиком.
+
+    Args:
+        groups: список списков слов
+    """
+    parts = []
+    for terms in groups:
+        alternatives = [_quote(terms[0]) + "*"] + [_quote(term) for term in terms[1:]]
+        parts.append(alternatives[0] if len(alternatives) == 1
+                     else "(" + " OR ".join(alternatives) + ")")
+    return " AND ".join(parts)
+
+
+def trigrams(word):
+    """Триграммы слова с границами ("$cam", ...)."""
+    padded = f"${word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """
+    Расстояние Левенштейна между a и b или limit + 1, если оно больше limit
+    (строки DP обрываются, как только все значения превышают limit).
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char != other)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class TextVocabulary:
+    """Словарь полнотекстового индекса с триграммным индексом для поиска похожих слов."""
+
+    def __init__(self, terms):
+        """
+        Args:
+            terms: пары (слово, число автомобилей) из Database.get_text_vocabulary
+        """
+        self.counts = {}
+        # Триграмма → номера слов в self.words
+        self.postings = {}
+        self.words = []
+        for term, count in terms:
+            # Числа (номера моделей, годы) не исправляются
+            if len(term) < FUZZY_MIN_LENGTH - 1 or term.isdigit():
+                continue
+            self.counts[term] = count
+            number = len(self.words)
+            self.words.append(term)
+            for gram in trigrams(term):
+                self.postings.setdefault(gram, []).append(number)
+
+    def __len__(self):
+        return len(self.words)
+
+    def has_prefix(self, prefix):
+        """Есть ли в словаре слово, начинающееся с prefix (проверяется по триграммам)."""
+        if prefix in self.counts:
+            return True
+        grams = trigrams(prefix)
+        grams.discard(prefix[-2:] + "$")
+        candidates = None
+        for gram in grams:
+            numbers = set(self.postings.get(gram, ()))
+            candidates = numbers if candidates is None else candidates & numbers
+            if not candidates:
+                return False
+        return any(self.words[number].startswith(prefix) for number in candidates or ())
+
+    def nearest(self, word, limit=FUZZY_MAX_TERMS):
+        """
+        Слова словаря на минимальном расстоянии редактирования от word (не больше
+        допустимого для его длины); при равенстве выше слова, чаще встречающиеся в каталоге.
+
+        Returns:
+            список слов (пустой, если близких слов нет)
+        """
+        if len(word) < FUZZY_MIN_LENGTH or word.isdigit():
+            return []
+        max_distance = 1 if len(word) < FUZZY_LONG_WORD else 2
+        grams = trigrams(word)
+        # Правка меняет не больше 3 триграмм — у близкого слова остаётся хотя бы столько общих
+        required = max(len(grams) - 3 * max_distance, 1)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        found = []
+        best = max_distance
+        for number, common in shared.items():
+            if common < required:
+                continue
+            term = self.words[number]
+            distance = edit_distance(word, term, best)
+            if distance <= best:
+                if distance < best:
+                    best, found = distance, [item for item in found if item[0] <= distance]
+                found.append((distance, -self.counts[term], term))
+        found.sort()
+        return [term for _, _, term in found[:limit]]
+
+
+class TextMatch:
+    """Разобранный текстовый запрос: выражение FTS5, исправления и id автомобилей."""
+
+    def __init__(self, text, expression, id_loader, corrections=None):
+        """
+        Args:
+            text: исходный запрос
+            expression: запрос FTS5 MATCH
+            id_loader: функция (expression) -> array id (Database.match_text_ids)
+            corrections: слово запроса → список слов, которыми оно заменено
+        """
+        self.text = text
+        self.expression = expression
+        self.corrections = corrections or {}
+        self._id_loader = id_loader
+        # id по возрастанию (как их возвращает индекс) и то же множеством
+        self._sorted_ids = None
+        self._ids = None
+        # Каталог и строки, соответствующие ids (для узла дерева над каталогом)
+        self._rows = None
+
+    @property
+    def fuzzy(self):
+        """Запрос исправлен по словарю."""
+        return bool(self.corrections)
+
+    @property
+    def sorted_ids(self):
+        """id подходящих автомобилей по возрастанию (загружаются при первом обращении)."""
+        if self._sorted_ids is None:
+            self._sorted_ids = self._id_loader(self.expression)
+        return self._sorted_ids
+
+    @property
+    def ids(self):
+        """Множество id подходящих автомобилей."""
+        if self._ids is None:
+            self._ids = frozenset(self.sorted_ids)
+        return self._ids
+
+    def postings(self, catalog):
+        """Строки каталога с подходящими id (Postings по возрастанию номеров строк)."""
+        cached = self._rows
+        if cached is not None and cached[0] is catalog:
+            return cached[1]
+        # Строки каталога обычно идут по возрастанию id — сортировка почти упорядоченного
+        rows = array("l", sorted(row for row in map(catalog.row_of, self.sorted_ids)
+                                 if row is not None))
+        postings = Postings(rows)
+        self._rows = (catalog, postings)
+        return postings
+
+    def detached(self):
+        """
+        Копия с загруженными id без загрузчика и каталога — её можно передать
+        в другой процесс (pickle), например в пакетный подбор batch.py.
+        """
+        match = TextMatch(self.text, self.expression, None, self.corrections)
+        match._sorted_ids = self.sorted_ids
+        match._ids = self._ids
+        return match
+
+    def sql_clause(self, id_column):
+        """SQL-условие по колонке id: подзапрос к полнотекстовому индексу."""
+        return text_match_clause(id_column, self.expression)
+
+    def __repr__(self):
+        return f"TextMatch({self.text!r}, {self.expression!r})"
+
+
+class TextSearch:
+    """Разбор текстовых запросов по полнотекстовому индексу БД."""
+
+    def __init__(self, db):
+        """
+        Args:
+            db: Database с полнотекстовым индексом (Database.text_index)
+        """
+        self.db = db
+        self._vocabulary = None
+        self._vocabulary_version = None
+        self._lock = threading.Lock()
+
+    def vocabulary(self):
+        """
+        Словарь индекса; перечитывается после изменения данных, в том числе другим
+        процессом (импорт и синхронизация меняют PRAGMA user_version).
+        """
+        with self._lock:
+            version = self.db.get_data_version()
+            if self._vocabulary is None or self._vocabulary_version != version:
+                self._vocabulary = TextVocabulary(self.db.get_text_vocabulary())
+                self._vocabulary_version = version
+            return self._vocabulary
+
+    def reset(self):
+        """Сбросить словарь (перечитается при следующем исправлении опечаток)."""
+        with self._lock:
+            self._vocabulary = None
+            self._vocabulary_version = None
+
+    def match(self, text):
+        """
+        Разобрать запрос: поиск по началу слов, а если ничего не найдено —
+        с заменой неизвестных слов ближайшими словами словаря.
+
+        Raises:
+            ValueError: в БД нет полнотекстового индекса
+
+        Returns:
+            TextMatch или None, если в запросе нет слов
+        """
+        if not self.db.text_index:
+            raise ValueError("Текстовый поиск недоступен: SQLite собран без FTS5")
+        words = tokenize(text)
+        if not words:
+            return None
+        expression = match_expression([[word] for word in words])
+        if self.db.has_text_match(expression):
+            return TextMatch(text, expression, self.db.match_text_ids)
+        vocabulary = self.vocabulary()
+        groups = []
+        corrections = {}
+        for word in words:
+            replacements = [] if vocabulary.has_prefix(word) else vocabulary.nearest(word)
+            if replacements:
+                corrections[word] = replacements
+            groups.append([word] + replacements)
+        if corrections:
+            expression = match_expression(groups)
+        return TextMatch(text, expression, self.db.match_text_ids, corrections)
@@ -0,0 +1,40 @@
+"""
+Замер времени запуска приложения по этапам (в духе python -X importtime).
+Отчёт выводится при запуске main.py с ключом --startup-report.
+"""
+from contextlib import contextmanager
+import threading
+import time
+
+
+class StartupTimer:
+    """Длительности этапов запуска относительно момента создания таймера."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+        self.marks = []
+
+    @contextmanager
+    def phase(self, name):
+        """Замерить этап: with timer.phase("импорт PyQt6"): ..."""
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.phases.append((name, begin - self.started, end - begin,
+                                threading.current_thread().name))
+
+    def mark(self, name):
+        """Отметить момент (например, «окно показано») от начала запуска."""
+        self.marks.append((name, time.perf_counter() - self.started))
+
+    def report(self):
+        """Текстовый отчёт: начало и длительность каждого этапа, затем отметки."""
+        lines = ["Время запуска (мс):", f"{'начало':>9} | {'длит.':>9} | поток | этап"]
+        for name, offset, duration, thread in sorted(self.phases, key=lambda p: p[1]):
+            lines.append(f"{offset * 1000:9.1f} | {duration * 1000:9.1f} | {thread} | {name}")
+        for name, offset in self.marks:
+            lines.append(f"{offset * 1000:9.1f} | {'':>9} | - | {name}")
+        return "\n".join(lines)
@@ -0,0 +1,292 @@
+"""
+Фоновые задачи для окна приложения (QThreadPool/QRunnable).
+Результаты возвращаются в поток интерфейса через сигналы.
+"""
+import os
+import time
+
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from config import RELAXED_RESULTS_LIMIT, SIMILAR_CARS_LIMIT
+
+
+class SearchSignals(QObject):
+    """Сигналы задачи поиска (QRunnable не является QObject)."""
+
+    # номер поиска, текст этапа
+    progress = pyqtSignal(int, str)
+    # номер поиска, результаты, затраченное время в секундах
+    finished = pyqtSignal(int, object, float)
+    # номер поиска, scoring.RankedResult (точных совпадений нет), затраченное время
+    relaxed = pyqtSignal(int, object, float)
+    # номер поиска, текст ошибки
+    failed = pyqtSignal(int, str)
+
+
+class SearchTask(QRunnable):
+    """
+    Подбор автомобилей вне потока интерфейса.
+    Работает со своей сессией SQLAlchemy (Database.session — scoped_session по потокам).
+    """
+
+    def __init__(self, generation, expert_system, criteria, is_stale, previous=None):
+        """
+        Args:
+            generation: номер поиска, по нему окно отбрасывает устаревшие ответы
+            expert_system: ExpertSystem
+            criteria: словарь критериев
+            is_stale: функция (generation) -> bool, True если запущен более новый поиск
+            previous: (критерии, результаты, cache_version()) предыдущего поиска —
+                если новые критерии не шире, результат получается его сужением
+        """
+        super().__init__()
+        self.generation = generation
+        self.expert_system = expert_system
+        self.criteria = criteria
+        self.is_stale = is_stale
+        self.previous = previous
+        self.signals = SearchSignals()
+
+    def run(self):
+        if self.is_stale(self.generation):
+            return
+        started = time.perf_counter()
+        db = self.expert_system.db
+        try:
+            results = None
+            if self.previous is not None:
+                results = self.expert_system.refine(self.criteria, *self.previous)
+            if results is None:
+                if self.expert_system.mode == "catalog":
+                    self.signals.progress.emit(self.generation, "Загрузка каталога…")
+                    self.expert_system.get_catalog()
+                    if self.is_stale(self.generation):
+                        return
+                self.signals.progress.emit(self.generation, "Подбор по дереву решений…")
+                results = self.expert_system.recommend(self.criteria)
+            if not results and not self.is_stale(self.generation):
+                # Точных совпадений нет — ближайшие варианты с ослабленными критериями
+                self.signals.progress.emit(self.generation, "Поиск близких вариантов…")
+                ranked = self.expert_system.rank(self.criteria, RELAXED_RESULTS_LIMIT)
+                if ranked.records:
+                    self.signals.relaxed.emit(self.generation, ranked,
+                                              time.perf_counter() - started)
+                    return
+            self.signals.finished.emit(self.generation, results,
+                                       time.perf_counter() - started)
+        except Exception as e:
+            self.signals.failed.emit(self.generation, str(e))
+        finally:
+            db.session.remove()
+
+
+class SimilarTask(QRunnable):
+    """
+    Поиск автомобилей, похожих на выбранный (ExpertSystem.similar), вне потока интерфейса.
+    Сигналы — как у поиска, результат заменяет результаты поиска в таблице.
+    """
+
+    def __init__(self, generation, expert_system, car_id, is_stale):
+        """
+        Args:
+            generation: номер поиска, по нему окно отбрасывает устаревшие ответы
+            expert_system: ExpertSystem
+            car_id: id автомобиля, для которого ищутся похожие
+            is_stale: функция (generation) -> bool, True если запущен более новый поиск
+        """
+        super().__init__()
+        self.generation = generation
+        self.expert_system = expert_system
+        self.car_id = car_id
+        self.is_stale = is_stale
+        self.signals = SearchSignals()
+
+    def run(self):
+        if self.is_stale(self.generation):
+            return
+        started = time.perf_counter()
+        try:
+            # Индекс строится один раз для версии каталога, дальше запрос — доли миллисекунды
+            self.signals.progress.emit(self.generation, "Поиск похожих автомобилей…")
+            results = self.expert_system.similar(self.car_id, SIMILAR_CARS_LIMIT)
+            self.signals.finished.emit(self.generation, results,
+                                       time.perf_counter() - started)
+        except Exception as e:
+            self.signals.failed.emit(self.generation, str(e))
+        finally:
+            self.expert_system.db.session.remove()
+
+
+class ExportSignals(QObject):
+    """Сигналы задачи выгрузки."""
+
+    # строк записано, всего строк или None
+    progress = pyqtSignal(int, object)
+    # export.ExportReport
+    finished = pyqtSignal(object)
+    # текст ошибки
+    failed = pyqtSignal(str)
+
+
+class ExportTask(QRunnable):
+    """
+    Выгрузка результатов в CSV/XLSX (export.py) вне потока интерфейса.
+    Результат поиска выгружается заново по критериям потоком, без записей в памяти;
+    готовый список (похожие, ближайшие варианты) — как есть.
+    """
+
+    def __init__(self, expert_system, source, path, is_cancelled):
+        """
+        Args:
+            expert_system: ExpertSystem
+            source: словарь критериев или список записей для выгрузки
+            path: файл выгрузки (.csv или .xlsx)
+            is_cancelled: функция () -> bool, True — выгрузку нужно прервать
+        """
+        super().__init__()
+        self.expert_system = expert_system
+        self.source = source
+        self.path = path
+        self.is_cancelled = is_cancelled
+        self.signals = ExportSignals()
+
+    def run(self):
+        try:
+            if isinstance(self.source, dict):
+                report = self.expert_system.export(self.source, self.path,
+                                                   progress=self.signals.progress.emit,
+                                                   cancel=self.is_cancelled)
+            else:
+                from export import export_rows, record_rows
+                report = export_rows(record_rows(self.source), self.path,
+                                     progress=self.signals.progress.emit,
+                                     cancel=self.is_cancelled, total=len(self.source))
+            self.signals.finished.emit(report)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        finally:
+            self.expert_system.db.session.remove()
+
+
+class SyncSignals(QObject):
+    """Сигналы задачи синхронизации с фидом."""
+
+    # sync.ChangeSet, CarCatalog после изменений
+    finished = pyqtSignal(object, object)
+    # текст ошибки
+    failed = pyqtSignal(str)
+
+
+class SyncTask(QRunnable):
+    """
+    Синхронизация таблицы cars с фидом дилера (sync.py) вне потока интерфейса.
+    Изменения применяются к каталогу в памяти без полной перезагрузки
+    (ExpertSystem.apply_changes): поиски идут по прежнему каталогу, пока новый не готов.
+    """
+
+    def __init__(self, expert_system, path):
+        """
+        Args:
+            expert_system: ExpertSystem
+            path: файл фида (.csv или .jsonl)
+        """
+        super().__init__()
+        self.expert_system = expert_system
+        self.path = path
+        self.signals = SyncSignals()
+
+    def run(self):
+        try:
+            from importer import READERS, detect_format
+            from sync import sync_cars
+            reader = READERS[detect_format(self.path)]
+            changes = sync_cars(self.expert_system.db, reader(self.path))
+            self.expert_system.apply_changes(changes)
+            # Если изменения не применились, каталог перечитывается целиком здесь же
+            self.signals.finished.emit(changes, self.expert_system.get_catalog())
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        finally:
+            self.expert_system.db.session.remove()
+
+
+class FacetSignals(QObject):
+    """Сигналы задачи подсчёта вариантов."""
+
+    # номер подсчёта, facets.FacetCounts
+    finished = pyqtSignal(int, object)
+
+
+class FacetTask(QRunnable):
+    """Подсчёт вариантов выпадающих списков (ExpertSystem.facets) вне потока интерфейса."""
+
+    def __init__(self, generation, expert_system, criteria, is_stale):
+        """
+        Args:
+            generation: номер подсчёта, по нему окно отбрасывает устаревшие ответы
+            expert_system: ExpertSystem
+            criteria: словарь критериев
+            is_stale: функция (generation) -> bool, True если запущен более новый подсчёт
+        """
+        super().__init__()
+        self.generation = generation
+        self.expert_system = expert_system
+        self.criteria = criteria
+        self.is_stale = is_stale
+        self.signals = FacetSignals()
+
+    def run(self):
+        if self.is_stale(self.generation):
+            return
+        try:
+            facets = self.expert_system.facets(self.criteria)
+            self.signals.finished.emit(self.generation, facets)
+        except Exception as e:
+            # Счётчики вспомогательные: без них списки остаются как есть
+            print(f"Ошибка при подсчёте вариантов: {e}")
+        finally:
+            self.expert_system.db.session.remove()
+
+
+class StartupSignals(QObject):
+    """Сигналы задачи открытия каталога."""
+
+    # Database, ExpertSystem, CarCatalog
+    ready = pyqtSignal(object, object, object)
+    # текст ошибки
+    failed = pyqtSignal(str)
+
+
+class StartupTask(QRunnable):
+    """
+    Открытие БД и загрузка каталога после показа окна.
+    SQLAlchemy импортируется здесь, а не при запуске приложения.
+    """
+
+    def __init__(self, timer, db_path=None):
+        """
+        Args:
+            timer: StartupTimer для отчёта о времени запуска
+            db_path: путь к БД (None — cars.db по умолчанию)
+        """
+        super().__init__()
+        self.timer = timer
+        self.db_path = db_path
+        self.signals = StartupSignals()
+
+    def run(self):
+        try:
+            with self.timer.phase("импорт database/expert_system (SQLAlchemy)"):
+                from config import CATALOG_SNAPSHOT_PATH
+                from database import Database
+                from expert_system import ExpertSystem
+            with self.timer.phase("Database(): create_all и проверка данных"):
+                db = Database(self.db_path) if self.db_path else Database()
+            with self.timer.phase("загрузка каталога (снимок или один запрос)"):
+                snapshot_path = os.path.join(os.path.dirname(db.db_path), CATALOG_SNAPSHOT_PATH)
+                expert_system = ExpertSystem(db, snapshot_path=snapshot_path)
+                catalog = expert_system.get_catalog()
+            db.session.remove()
+            self.signals.ready.emit(db, expert_system, catalog)
+        except Exception as e:
+            self.signals.failed.emit(str(e))